@@ -8,6 +8,12 @@ APP_NAME = "SAM Tool"
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODELS_DIR = os.path.join(BASE_DIR, "models")
 TEMP_DIR = os.path.join(BASE_DIR, "temp")
+EMBEDDINGS_DIR = os.path.join(BASE_DIR, "embeddings")
+
+# База аннотаций проекта (создается в папке с изображениями)
+ANNOTATION_DB_NAME = "annotations.sqlite"
+# Журнал автосохранения (рядом с базой аннотаций)
+ANNOTATION_JOURNAL_NAME = "annotations.journal"
 
 # Поддерживаемые форматы изображений
 SUPPORTED_IMAGE_FORMATS = (".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".tif")
@@ -34,6 +40,9 @@ SAM_MODELS = {
     },
 }
 
+# Длинная сторона входа энкодера SAM (одинакова для всех моделей)
+SAM_IMAGE_SIZE = 1024
+
 # Предустановленные классы объектов
 DEFAULT_CLASSES = [
     "car",
@@ -82,10 +91,51 @@ EXPORT_CONFIG = {
 }
 
 
+# Настройки кэша эмбеддингов SAM
+EMBEDDING_CACHE_CONFIG = {
+    "memory_items": 16,  # эмбеддингов в памяти (~4 МБ каждый)
+    "disk_limit_gb": 20,  # предел размера кэша на диске, 0 - без ограничения
+}
+
+# Фоновое кодирование соседних изображений
+EMBEDDING_PREFETCH_CONFIG = {
+    "next_images": 3,
+    "previous_images": 1,
+}
+
+
+# Энкодер изображений на CPU
+ENCODER_CONFIG = {
+    "mode": "fp32",  # fp32, int8 (квантизация линейных слоев) или bf16
+    "threads": 0,  # потоков torch, 0 - по умолчанию
+    "benchmark_on_load": False,  # сравнить режимы после загрузки модели
+}
+
+# Декодер масок на onnxruntime (CPU) вместо PyTorch
+ONNX_DECODER_CONFIG = {
+    "enabled": False,  # требует onnx и onnxruntime
+    "quantize": False,  # int8-квантизация декодера: быстрее, чуть менее точно
+    "threads": 0,  # потоков onnxruntime, 0 - по числу ядер
+}
+
+# Автосохранение: журнал переносится в базу аннотаций
+AUTOSAVE_CONFIG = {
+    "compact_records": 200,  # записей журнала до переноса в базу
+    "compact_interval_s": 30,  # или через столько секунд после последнего переноса
+}
+
+# Предпросмотр маски под курсором в режиме SAM по клику
+HOVER_PREVIEW_CONFIG = {
+    "enabled": True,
+    "delay_ms": 50,  # пауза движения мыши перед запросом (~20 запросов/с)
+    "alpha": 0.35,  # прозрачность заливки
+}
+
+
 # Создание необходимых директорий
 def create_directories():
     """Создание необходимых директорий"""
-    dirs = [MODELS_DIR, TEMP_DIR]
+    dirs = [MODELS_DIR, TEMP_DIR, EMBEDDINGS_DIR]
     for dir_path in dirs:
         if not os.path.exists(dir_path):
             os.makedirs(dir_path)
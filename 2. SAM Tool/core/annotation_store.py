@@ -0,0 +1,283 @@
+import json
+import os
+import sqlite3
+import threading
+
+from utils.mask_codec import CompactMask, as_compact_mask
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    filename TEXT NOT NULL UNIQUE,
+    width INTEGER,
+    height INTEGER,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS annotations (
+    id INTEGER PRIMARY KEY,
+    image_id INTEGER NOT NULL REFERENCES images(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    class TEXT NOT NULL,
+    type TEXT NOT NULL,
+    points TEXT,
+    x_min INTEGER,
+    y_min INTEGER,
+    x_max INTEGER,
+    y_max INTEGER,
+    area INTEGER,
+    sam_score REAL,
+    timestamp TEXT,
+    mask_rle BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_annotations_image ON annotations(image_id, position);
+CREATE INDEX IF NOT EXISTS idx_annotations_class ON annotations(class);
+CREATE INDEX IF NOT EXISTS idx_annotations_type ON annotations(type);
+"""
+
+
+class AnnotationStore:
+    """Хранилище аннотаций проекта (папки изображений) в одной базе SQLite.
+
+    Для каждой аннотации в таблице хранятся класс, тип, точки, рамка,
+    площадь и оценка SAM, а маска - строкой COCO RLE. Рамки и размеры
+    изображений лежат в отдельных столбцах, поэтому экспорт и статистика
+    по всему набору выполняются запросами, без чтения изображений и масок.
+    Аннотации изображения перезаписываются одной транзакцией.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+            self._connection.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', ?)",
+                (str(SCHEMA_VERSION),),
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        return row["value"] if row is not None else default
+
+    def save_image(self, filename, annotations, image_shape=None):
+        """Замена всех аннотаций изображения (одна транзакция)"""
+        self.save_images({filename: annotations}, {filename: image_shape})
+
+    def save_images(self, images, image_shapes=None, meta=None):
+        """Замена аннотаций нескольких изображений и значений meta одной транзакцией.
+
+        images - {имя файла: список аннотаций}, image_shapes - {имя файла: (высота, ширина)}.
+        """
+        image_shapes = image_shapes or {}
+        prepared = {
+            filename: self._prepare_rows(annotations, image_shapes.get(filename))
+            for filename, annotations in images.items()
+        }
+
+        with self._lock, self._connection:
+            for filename, (rows, width, height) in prepared.items():
+                self._write_image(filename, rows, width, height)
+            for key, value in (meta or {}).items():
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value))
+                )
+
+    def _prepare_rows(self, annotations, image_shape):
+        """Строки таблицы annotations и размер изображения (ширина, высота)"""
+        height, width = image_shape[:2] if image_shape is not None else (None, None)
+
+        rows = []
+        for position, ann in enumerate(annotations):
+            mask = ann.get("mask")
+            mask_rle = None
+            if mask is not None:
+                mask = as_compact_mask(mask)
+                height, width = mask.shape
+                mask_rle = mask.to_rle()["counts"].encode("ascii")
+                bbox, area = mask.bbox, mask.area
+            else:
+                bbox, area = _points_bbox(ann.get("points")), None
+
+            rows.append(
+                (
+                    position,
+                    ann["class"],
+                    ann["type"],
+                    json.dumps([list(p) for p in ann.get("points") or []]),
+                    *bbox,
+                    area,
+                    ann.get("sam_score"),
+                    ann.get("timestamp"),
+                    mask_rle,
+                )
+            )
+
+        return rows, width, height
+
+    def _write_image(self, filename, rows, width, height):
+        """Запись аннотаций изображения (внутри транзакции)"""
+        self._connection.execute(
+            """
+            INSERT INTO images (filename, width, height, updated_at)
+            VALUES (?, ?, ?, datetime('now'))
+            ON CONFLICT(filename) DO UPDATE SET
+                width = COALESCE(excluded.width, width),
+                height = COALESCE(excluded.height, height),
+                updated_at = excluded.updated_at
+            """,
+            (filename, width, height),
+        )
+        image_id = self._connection.execute(
+            "SELECT id FROM images WHERE filename = ?", (filename,)
+        ).fetchone()["id"]
+        self._connection.execute("DELETE FROM annotations WHERE image_id = ?", (image_id,))
+        self._connection.executemany(
+            """
+            INSERT INTO annotations (
+                image_id, position, class, type, points,
+                x_min, y_min, x_max, y_max, area, sam_score, timestamp, mask_rle
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(image_id, *row) for row in rows],
+        )
+
+    def load_image(self, filename):
+        """Аннотации изображения в формате приложения (маски - CompactMask)"""
+        with self._lock:
+            rows = self._connection.execute(
+                """
+                SELECT a.*, i.width, i.height FROM annotations a
+                JOIN images i ON i.id = a.image_id
+                WHERE i.filename = ?
+                ORDER BY a.position
+                """,
+                (filename,),
+            ).fetchall()
+
+        annotations = []
+        for row in rows:
+            ann = {
+                "class": row["class"],
+                "points": [tuple(p) for p in json.loads(row["points"] or "[]")],
+                "mask": None,
+                "type": row["type"],
+            }
+            if row["mask_rle"] is not None:
+                ann["mask"] = CompactMask.from_rle(
+                    {
+                        "size": [row["height"], row["width"]],
+                        "counts": row["mask_rle"].decode("ascii"),
+                    }
+                )
+            if row["timestamp"] is not None:
+                ann["timestamp"] = row["timestamp"]
+            if row["sam_score"] is not None:
+                ann["sam_score"] = row["sam_score"]
+            annotations.append(ann)
+
+        return annotations
+
+    def has_image(self, filename):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM images WHERE filename = ?", (filename,)
+            ).fetchone()
+        return row is not None
+
+    def bbox_rows(self, class_name=None, annotation_type=None):
+        """Рамки всех аннотаций проекта с размерами изображений (без масок)"""
+        query = """
+            SELECT i.filename, i.width AS image_width, i.height AS image_height,
+                   a.class, a.type AS annotation_type,
+                   a.x_min, a.y_min, a.x_max, a.y_max, a.sam_score, a.timestamp
+            FROM annotations a JOIN images i ON i.id = a.image_id
+        """
+        conditions, params = [], []
+        if class_name is not None:
+            conditions.append("a.class = ?")
+            params.append(class_name)
+        if annotation_type is not None:
+            conditions.append("a.type = ?")
+            params.append(annotation_type)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY i.filename, a.position"
+
+        with self._lock:
+            return [dict(row) for row in self._connection.execute(query, params)]
+
+    def statistics(self):
+        """Сводка по проекту: изображения, аннотации по классам и типам"""
+        with self._lock:
+            execute = self._connection.execute
+            images = execute("SELECT COUNT(*) FROM images").fetchone()[0]
+            annotated = execute(
+                "SELECT COUNT(DISTINCT image_id) FROM annotations"
+            ).fetchone()[0]
+            total = execute("SELECT COUNT(*) FROM annotations").fetchone()[0]
+            by_class = dict(
+                execute(
+                    "SELECT class, COUNT(*) FROM annotations GROUP BY class ORDER BY COUNT(*) DESC"
+                ).fetchall()
+            )
+            by_type = dict(
+                execute("SELECT type, COUNT(*) FROM annotations GROUP BY type").fetchall()
+            )
+            mean_score = execute(
+                "SELECT AVG(sam_score) FROM annotations WHERE sam_score IS NOT NULL"
+            ).fetchone()[0]
+
+        return {
+            "images": images,
+            "annotated_images": annotated,
+            "annotations": total,
+            "by_class": by_class,
+            "by_type": by_type,
+            "mean_sam_score": mean_score,
+        }
+
+    def import_json_sidecars(self, folder_path, image_files, file_manager):
+        """Перенос старых файлов <изображение>_annotations.json в базу.
+
+        Импортируются только изображения, которых еще нет в базе;
+        JSON-файлы не удаляются. Возвращает число импортированных изображений.
+        """
+        imported = 0
+        for filename in image_files:
+            json_path = os.path.join(folder_path, f"{filename}_annotations.json")
+            if not os.path.exists(json_path) or self.has_image(filename):
+                continue
+
+            annotations = file_manager.load_annotations_json(folder_path, filename)
+            if annotations:
+                self.save_image(filename, annotations)
+                imported += 1
+
+        return imported
+
+
+def _points_bbox(points):
+    """Рамка по точкам (как XMLUtils._points_to_bbox)"""
+    if not points:
+        return [0, 0, 1, 1]
+    x_coords = [p[0] for p in points]
+    y_coords = [p[1] for p in points]
+    return [min(x_coords), min(y_coords), max(x_coords), max(y_coords)]
@@ -4,13 +4,19 @@ import numpy as np
 import cv2
 from datetime import datetime
 import os
+import sqlite3
 from config import *
 from ui.main_window import MainWindow
 from core.sam_integration import SAMIntegration
+from core.embedding_prefetcher import EmbeddingPrefetcher
+from core.inference_service import InferenceService
+from core.annotation_store import AnnotationStore
+from core.autosave_journal import AutosaveJournal
 from core.file_manager import FileManager
 from core.export_manager import ExportManager
 from utils.image_utils import ImageUtils
 from utils.annotation_utils import AnnotationUtils
+from utils.mask_codec import CompactMask
 
 
 class SAMSegmentationApp:
@@ -24,6 +30,10 @@ class SAMSegmentationApp:
         self.file_manager = FileManager()
         self.export_manager = ExportManager()
         self.sam_integration = SAMIntegration()
+        self.embedding_prefetcher = EmbeddingPrefetcher(self.sam_integration)
+        self.inference_service = InferenceService(
+            root, busy_callback=self.on_inference_busy
+        )
         self.image_utils = ImageUtils()
         self.annotation_utils = AnnotationUtils()
 
@@ -33,9 +43,13 @@ class SAMSegmentationApp:
         self.current_image_index = 0
         self.current_image = None
         self.annotations = {}
+        self.annotation_store = None
+        self.autosave_journal = None
         self.available_classes = DEFAULT_CLASSES.copy()
         self.manual_points = []
         self.canvas_scale = 1.0
+        self.hover_preview_job = None
+        self.hover_preview_point = None
 
         # Создание интерфейса
         self.ui = MainWindow(root, self)
@@ -61,9 +75,11 @@ class SAMSegmentationApp:
                 "next_image": self.next_image,
                 "save_xml": self.save_current_xml,
                 "export_csv": self.export_to_csv,
+                "show_statistics": self.show_statistics,
                 "canvas_click": self.on_canvas_click,
                 "canvas_right_click": self.on_canvas_right_click,
                 "canvas_motion": self.on_canvas_motion,
+                "canvas_leave": self.on_canvas_leave,
                 "delete_annotation": self.delete_annotation,
                 "clear_annotations": self.clear_all_annotations,
                 "add_class": self.add_new_class,
@@ -84,14 +100,78 @@ class SAMSegmentationApp:
         """Загрузка списка изображений из папки"""
         self.image_files = self.file_manager.get_image_files(self.current_folder)
 
-        if self.image_files:
-            self.current_image_index = 0
-            self.load_current_image()
-            self.ui.update_status(f"Загружено {len(self.image_files)} изображений")
-        else:
+        if not self.image_files:
+            # База и журнал создаются только в папках с изображениями
+            self.close_annotation_store()
             messagebox.showwarning(
                 "Предупреждение", "В выбранной папке нет поддерживаемых изображений"
             )
+            return
+
+        if not self.open_annotation_store():
+            self.image_files = []
+            return
+
+        self.current_image_index = 0
+        self.load_current_image()
+        self.ui.update_status(f"Загружено {len(self.image_files)} изображений")
+
+    def open_annotation_store(self):
+        """Открытие базы аннотаций папки (с переносом старых JSON-файлов).
+
+        Возвращает False, если базу открыть не удалось (например, папка только для чтения).
+        """
+        self.close_annotation_store()
+
+        self.annotations = {}
+        try:
+            self.annotation_store = AnnotationStore(
+                os.path.join(self.current_folder, ANNOTATION_DB_NAME)
+            )
+            self.autosave_journal = AutosaveJournal(
+                os.path.join(self.current_folder, ANNOTATION_JOURNAL_NAME),
+                self.annotation_store,
+                error_callback=self.on_autosave_error,
+            )
+            imported = self.annotation_store.import_json_sidecars(
+                self.current_folder, self.image_files, self.file_manager
+            )
+        except (sqlite3.Error, OSError) as e:
+            self.close_annotation_store()
+            messagebox.showerror("Ошибка", f"Не удалось открыть базу аннотаций папки: {e}")
+            return False
+
+        if self.autosave_journal.replayed:
+            messagebox.showinfo(
+                "Автосохранение",
+                "Восстановлены несохраненные изменения аннотаций: "
+                f"{self.autosave_journal.replayed}",
+            )
+        if imported:
+            self.ui.update_status(f"Перенесено в базу JSON-файлов аннотаций: {imported}")
+        return True
+
+    def on_autosave_error(self, error):
+        """Сообщение об ошибке автосохранения (вызывается из фонового потока журнала)"""
+
+        def show():
+            self.ui.update_status("Ошибка автосохранения аннотаций")
+            messagebox.showerror(
+                "Ошибка",
+                f"Не удалось автосохранить аннотации: {error}\n"
+                "Изменения сохранены в памяти, запись будет повторена.",
+            )
+
+        self.inference_service.call_soon(show)
+
+    def close_annotation_store(self):
+        """Перенос журнала автосохранения в базу и закрытие базы проекта"""
+        if self.autosave_journal is not None:
+            self.autosave_journal.close()
+            self.autosave_journal = None
+        if self.annotation_store is not None:
+            self.annotation_store.close()
+            self.annotation_store = None
 
     def load_current_image(self):
         """Загрузка текущего изображения"""
@@ -105,9 +185,9 @@ class SAMSegmentationApp:
             # Загрузка изображения
             self.current_image = self.image_utils.load_image(filepath)
 
-            # Загрузка для SAM если модель загружена
+            # Загрузка для SAM если модель загружена (в потоке запросов SAM)
             if self.sam_integration.is_loaded():
-                self.sam_integration.set_image(self.current_image)
+                self.set_sam_image(filepath, self.current_image)
 
             # Отображение
             self.display_image()
@@ -128,6 +208,36 @@ class SAMSegmentationApp:
                 "Ошибка", f"Не удалось загрузить изображение: {str(e)}"
             )
 
+    def set_sam_image(self, filepath, image):
+        """Установка изображения в SAM вне потока Tk; клики ждут ее в очереди"""
+        self.inference_service.cancel("click")
+        self.inference_service.cancel("prompt")
+        self.clear_hover_preview()
+
+        def set_image():
+            # Если это изображение уже кодируется в фоне, ждем готовый эмбеддинг
+            self.embedding_prefetcher.wait(filepath)
+            key = self.sam_integration.embedding_cache.file_key(filepath, image)
+            self.sam_integration.set_image(image, key)
+
+        def on_error(error):
+            messagebox.showerror("Ошибка", f"Ошибка кодирования изображения SAM: {error}")
+
+        self.inference_service.submit(
+            "image", set_image, lambda _: self.schedule_prefetch(), on_error
+        )
+
+    def on_inference_busy(self, busy):
+        """Индикатор выполнения запросов SAM"""
+        self.ui.set_busy(busy)
+
+    def schedule_prefetch(self):
+        """Фоновое кодирование эмбеддингов соседних изображений"""
+        image_paths = [
+            os.path.join(self.current_folder, filename) for filename in self.image_files
+        ]
+        self.embedding_prefetcher.schedule(image_paths, self.current_image_index)
+
     def display_image(self):
         """Отображение изображения на Canvas"""
         if self.current_image is None:
@@ -147,7 +257,9 @@ class SAMSegmentationApp:
         # Наложение аннотаций
         display_image = self.overlay_annotations(display_image)
 
-        # Отображение на Canvas
+        # Отображение на Canvas (маска-кандидат при этом удаляется)
+        self.cancel_hover_preview()
+        self.hover_preview_point = None
         self.ui.display_image_on_canvas(display_image)
 
     def overlay_annotations(self, image):
@@ -202,6 +314,7 @@ class SAMSegmentationApp:
             self.ui.update_status(f"Добавлена {point_type} точка: ({orig_x}, {orig_y})")
 
         elif mode == "sam_auto" and self.sam_integration.is_loaded():
+            self.clear_hover_preview()
             self.run_sam_auto_segmentation(orig_x, orig_y)
 
     def on_canvas_right_click(self, event):
@@ -217,6 +330,67 @@ class SAMSegmentationApp:
         orig_coords = self.ui.canvas_to_image_coords(event, self.canvas_scale)
         if orig_coords:
             self.ui.update_status(f"Координаты: ({orig_coords[0]}, {orig_coords[1]})")
+            self.schedule_hover_preview(*orig_coords)
+
+    def on_canvas_leave(self, event):
+        """Курсор покинул Canvas"""
+        self.clear_hover_preview()
+
+    def schedule_hover_preview(self, x, y):
+        """Отложенный запрос маски под курсором: каждое движение мыши переносит его"""
+        height, width = self.current_image.shape[:2]
+        if (
+            not HOVER_PREVIEW_CONFIG["enabled"]
+            or self.ui.get_current_mode() != "sam_auto"
+            or not self.sam_integration.is_loaded()
+            or not (0 <= x < width and 0 <= y < height)
+        ):
+            self.clear_hover_preview()
+            return
+
+        # Маска для этой точки уже показана
+        if (x, y) == self.hover_preview_point:
+            return
+
+        self.cancel_hover_preview()
+        self.hover_preview_job = self.root.after(
+            HOVER_PREVIEW_CONFIG["delay_ms"], lambda: self.request_hover_preview(x, y)
+        )
+
+    def request_hover_preview(self, x, y):
+        """Запрос маски под курсором в потоке SAM (маска в размере изображения на экране)"""
+        self.hover_preview_job = None
+        height, width = self.current_image.shape[:2]
+        output_size = (int(height * self.canvas_scale), int(width * self.canvas_scale))
+        color = CLASS_COLORS.get(self.ui.get_selected_class(), (255, 255, 255))
+
+        def on_result(result):
+            mask, score = result
+            self.hover_preview_point = (x, y)
+            self.ui.show_hover_preview(mask, color, HOVER_PREVIEW_CONFIG["alpha"])
+
+        self.inference_service.submit(
+            "preview",
+            lambda: self.sam_integration.preview_point(x, y, output_size),
+            on_result,
+            # Предпросмотр необязателен: ошибки (например, эмбеддинг еще
+            # не готов) не показываются
+            lambda error: None,
+        )
+
+    def cancel_hover_preview(self):
+        """Отмена отложенного и выполняемого запросов предпросмотра"""
+        if self.hover_preview_job is not None:
+            self.root.after_cancel(self.hover_preview_job)
+            self.hover_preview_job = None
+        self.inference_service.cancel("preview")
+
+    def clear_hover_preview(self):
+        """Отмена запросов и удаление показанной маски-кандидата"""
+        self.cancel_hover_preview()
+        if self.hover_preview_point is not None:
+            self.hover_preview_point = None
+            self.ui.clear_hover_preview()
 
     def create_manual_annotation(self):
         """Создание ручной аннотации из точек"""
@@ -228,7 +402,7 @@ class SAMSegmentationApp:
 
         current_filename = self.image_files[self.current_image_index]
 
-        # Создание маски из точек
+        # Создание маски из точек (только в рамке многоугольника)
         mask = self.annotation_utils.points_to_mask(
             self.manual_points, self.current_image.shape[:2]
         )
@@ -248,16 +422,16 @@ class SAMSegmentationApp:
         if not self.sam_integration.is_loaded() or not self.manual_points:
             return
 
-        try:
-            mask, score = self.sam_integration.segment_with_points(self.manual_points)
+        current_filename = self.image_files[self.current_image_index]
+        selected_class = self.ui.get_selected_class()
+        manual_points = list(self.manual_points)
 
-            current_filename = self.image_files[self.current_image_index]
-            points_coords = [
-                (p[0], p[1]) if len(p) == 3 else p for p in self.manual_points
-            ]
+        def on_result(result):
+            mask, score = result
+            points_coords = [(p[0], p[1]) if len(p) == 3 else p for p in manual_points]
 
             annotation = {
-                "class": self.ui.get_selected_class(),
+                "class": selected_class,
                 "points": points_coords,
                 "mask": mask,
                 "type": "sam_points",
@@ -268,8 +442,20 @@ class SAMSegmentationApp:
             self.add_annotation(current_filename, annotation)
             self.ui.update_status(f"SAM сегментация выполнена (score: {score:.3f})")
 
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Ошибка SAM сегментации: {str(e)}")
+        def on_error(error):
+            messagebox.showerror("Ошибка", f"Ошибка SAM сегментации: {str(error)}")
+
+        def segment():
+            mask, score = self.sam_integration.segment_with_points(manual_points)
+            return CompactMask.from_array(mask), score
+
+        # Новый набор точек заменяет еще не обработанный предыдущий
+        self.inference_service.submit(
+            "prompt",
+            segment,
+            on_result,
+            on_error,
+        )
 
     def run_sam_auto_segmentation(self, x, y):
         """Запуск автоматической SAM сегментации"""
@@ -277,13 +463,14 @@ class SAMSegmentationApp:
             messagebox.showwarning("Предупреждение", "Модель SAM не загружена")
             return
 
-        try:
-            mask, score = self.sam_integration.segment_point(x, y)
+        current_filename = self.image_files[self.current_image_index]
+        selected_class = self.ui.get_selected_class()
 
-            current_filename = self.image_files[self.current_image_index]
+        def on_result(result):
+            mask, score = result
 
             annotation = {
-                "class": self.ui.get_selected_class(),
+                "class": selected_class,
                 "points": [(x, y)],
                 "mask": mask,
                 "type": "sam_auto",
@@ -294,8 +481,23 @@ class SAMSegmentationApp:
             self.add_annotation(current_filename, annotation)
             self.ui.update_status(f"SAM автосегментация выполнена (score: {score:.3f})")
 
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Ошибка SAM автосегментации: {str(e)}")
+        def on_error(error):
+            messagebox.showerror("Ошибка", f"Ошибка SAM автосегментации: {str(error)}")
+
+        def segment():
+            # Маска сжимается еще в потоке SAM
+            mask, score = self.sam_integration.segment_point(x, y)
+            return CompactMask.from_array(mask), score
+
+        # Каждый клик - отдельный объект, поэтому клики не заменяют друг друга
+        self.inference_service.submit(
+            "click",
+            segment,
+            on_result,
+            on_error,
+            coalesce=False,
+        )
+        self.ui.update_status(f"SAM: сегментация по точке ({x}, {y})...")
 
     def add_annotation(self, filename, annotation):
         """Добавление аннотации"""
@@ -303,6 +505,7 @@ class SAMSegmentationApp:
             self.annotations[filename] = []
 
         self.annotations[filename].append(annotation)
+        self.autosave_journal.add(filename, annotation)
 
         # Очистка точек и обновление отображения
         self.manual_points.clear()
@@ -320,46 +523,49 @@ class SAMSegmentationApp:
     def load_sam_model(self):
         """Загрузка модели SAM"""
 
-        def load_callback(success, message):
+        def on_loaded(success, message):
             if success:
                 self.ui.update_status("Модель SAM загружена успешно")
+                if self.image_files and self.current_image is not None:
+                    filename = self.image_files[self.current_image_index]
+                    self.set_sam_image(
+                        os.path.join(self.current_folder, filename), self.current_image
+                    )
                 messagebox.showinfo("Успех", message)
             else:
                 self.ui.update_status("Ошибка загрузки SAM")
                 messagebox.showerror("Ошибка", message)
             self.ui.set_progress(0)
 
+        # Загрузка идет в отдельном потоке: обновления окна передаются в поток Tk
+        def load_callback(success, message):
+            self.inference_service.call_soon(lambda: on_loaded(success, message))
+
         def progress_callback(progress):
-            self.ui.set_progress(progress)
+            self.inference_service.call_soon(lambda: self.ui.set_progress(progress))
 
         self.sam_integration.load_model(load_callback, progress_callback)
 
     def prev_image(self):
         """Переход к предыдущему изображению"""
         if self.image_files and self.current_image_index > 0:
-            self.save_current_annotations()
             self.current_image_index -= 1
             self.load_current_image()
 
     def next_image(self):
         """Переход к следующему изображению"""
         if self.image_files and self.current_image_index < len(self.image_files) - 1:
-            self.save_current_annotations()
             self.current_image_index += 1
             self.load_current_image()
 
-    def save_current_annotations(self):
-        """Сохранение аннотаций текущего изображения"""
-        if not self.image_files:
-            return
+    def save_annotations(self):
+        """Перенос журнала автосохранения в базу проекта (ожидание записи).
 
-        current_filename = self.image_files[self.current_image_index]
-        if current_filename in self.annotations and self.annotations[current_filename]:
-            self.file_manager.save_annotations_json(
-                self.current_folder,
-                current_filename,
-                self.annotations[current_filename],
-            )
+        Изменения аннотаций сохраняются журналом по мере их внесения,
+        явное сохранение нужно только перед запросами ко всей базе.
+        """
+        if self.autosave_journal is not None:
+            self.autosave_journal.checkpoint()
 
     def load_annotations_for_current_image(self):
         """Загрузка аннотаций для текущего изображения"""
@@ -367,14 +573,10 @@ class SAMSegmentationApp:
             return
 
         current_filename = self.image_files[self.current_image_index]
-        annotations = self.file_manager.load_annotations_json(
-            self.current_folder, current_filename
-        )
-
-        if annotations:
-            self.annotations[current_filename] = annotations
-        elif current_filename not in self.annotations:
-            self.annotations[current_filename] = []
+        if current_filename not in self.annotations:
+            self.annotations[current_filename] = self.annotation_store.load_image(
+                current_filename
+            )
 
         self.ui.update_annotations_list(self.get_current_annotations())
 
@@ -407,15 +609,22 @@ class SAMSegmentationApp:
             messagebox.showerror("Ошибка", f"Не удалось сохранить XML: {str(e)}")
 
     def export_to_csv(self):
-        """Экспорт всех аннотаций в CSV файл"""
-        if not self.annotations:
+        """Экспорт всех аннотаций проекта в CSV файл"""
+        if self.annotation_store is None:
+            messagebox.showwarning("Предупреждение", "Нет аннотаций для экспорта")
+            return
+
+        self.save_annotations()
+        if not self.annotation_store.statistics()["annotations"]:
             messagebox.showwarning("Предупреждение", "Нет аннотаций для экспорта")
             return
 
         try:
             csv_path = self.export_manager.export_to_csv(
-                self.annotations, self.current_folder, self.available_classes
+                self.annotation_store, self.current_folder, self.available_classes
             )
+            if not csv_path:
+                return
 
             messagebox.showinfo(
                 "Успех", f"CSV файл сохранен: {os.path.basename(csv_path)}"
@@ -424,6 +633,29 @@ class SAMSegmentationApp:
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось создать CSV: {str(e)}")
 
+    def show_statistics(self):
+        """Статистика аннотаций по всей папке (запросы к базе проекта)"""
+        if self.annotation_store is None:
+            messagebox.showwarning("Предупреждение", "Папка с изображениями не выбрана")
+            return
+
+        self.save_annotations()
+        stats = self.annotation_store.statistics()
+
+        lines = [
+            f"Изображений: {len(self.image_files)}, размечено: {stats['annotated_images']}",
+            f"Аннотаций: {stats['annotations']}",
+            "",
+            "По классам:",
+        ]
+        lines += [f"  {name}: {count}" for name, count in stats["by_class"].items()]
+        lines += ["", "По типам:"]
+        lines += [f"  {name}: {count}" for name, count in stats["by_type"].items()]
+        if stats["mean_sam_score"] is not None:
+            lines += ["", f"Средняя оценка SAM: {stats['mean_sam_score']:.3f}"]
+
+        messagebox.showinfo("Статистика", "\n".join(lines))
+
     # Остальные методы (delete_annotation, clear_all_annotations, и т.д.)
     def delete_annotation(self):
         """Удаление выбранной аннотации"""
@@ -435,6 +667,9 @@ class SAMSegmentationApp:
         current_annotations = self.get_current_annotations()
         if selection_index < len(current_annotations):
             deleted_ann = current_annotations.pop(selection_index)
+            self.autosave_journal.delete(
+                self.image_files[self.current_image_index], selection_index
+            )
             self.ui.update_annotations_list(current_annotations)
             self.display_image()
             self.ui.update_status(f"Удалена аннотация класса '{deleted_ann['class']}'")
@@ -452,6 +687,7 @@ class SAMSegmentationApp:
             if current_filename in self.annotations:
                 count = len(self.annotations[current_filename])
                 self.annotations[current_filename] = []
+                self.autosave_journal.clear(current_filename)
                 self.ui.update_annotations_list([])
                 self.display_image()
                 self.ui.update_status(f"Удалено {count} аннотаций")
@@ -497,6 +733,7 @@ class SAMSegmentationApp:
         current_annotations = self.get_current_annotations()
         if current_annotations:
             removed_ann = current_annotations.pop()
+            self.autosave_journal.undo(self.image_files[self.current_image_index])
             self.ui.update_annotations_list(current_annotations)
             self.display_image()
             self.ui.update_status(f"Отменена аннотация класса '{removed_ann['class']}'")
@@ -0,0 +1,258 @@
+import json
+import os
+import queue
+import threading
+import time
+
+from config import AUTOSAVE_CONFIG
+from utils.mask_codec import CompactMask, as_compact_mask
+
+# Номер последней записи журнала, уже перенесенной в базу (таблица meta)
+JOURNAL_SEQUENCE_KEY = "journal_sequence"
+
+
+class AutosaveJournal:
+    """Журнал изменений аннотаций с фоновой записью для автосохранения.
+
+    Каждое действие (add, delete, undo, clear) ставится в очередь без
+    задержки для окна; фоновый поток дописывает его строкой JSON в файл
+    журнала и сбрасывает файл на диск. Раз в compact_records записей,
+    после паузы compact_interval секунд и по checkpoint журнал переносится
+    в базу аннотаций одной транзакцией вместе с номером последней
+    записи и очищается. При открытии журнал, оставшийся после сбоя,
+    переносится в базу; записи, которые уже были в ней, пропускаются.
+
+    Записи, которые не удалось дописать в файл, остаются в памяти и
+    повторяются в следующем цикле, а при checkpoint и закрытии переносятся
+    прямо в базу. О первой ошибке подряд сообщается через error_callback
+    (вызывается в фоновом потоке).
+    """
+
+    def __init__(
+        self,
+        journal_path,
+        annotation_store,
+        compact_records=None,
+        compact_interval=None,
+        error_callback=None,
+    ):
+        self.journal_path = journal_path
+        self.store = annotation_store
+        self.compact_records = (
+            AUTOSAVE_CONFIG["compact_records"] if compact_records is None else compact_records
+        )
+        self.compact_interval = (
+            AUTOSAVE_CONFIG["compact_interval_s"] if compact_interval is None else compact_interval
+        )
+
+        self.error_callback = error_callback
+
+        self._file = None
+        self._uncompacted = 0
+        # Записи, не дописанные в файл из-за ошибки, и признак серии ошибок
+        self._pending = []
+        self._failing = False
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+
+        # Восстановление после сбоя: оставшиеся записи переносятся в базу
+        self.replayed = self._compact()
+        self._sequence = int(self.store.get_meta(JOURNAL_SEQUENCE_KEY, 0))
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, filename, annotation):
+        self._record("add", filename, annotation=annotation)
+
+    def delete(self, filename, index):
+        self._record("delete", filename, index=index)
+
+    def undo(self, filename):
+        """Отмена последней аннотации изображения"""
+        self._record("undo", filename)
+
+    def clear(self, filename):
+        self._record("clear", filename)
+
+    def checkpoint(self):
+        """Перенос всех записей в базу (ожидание фонового потока)"""
+        self._command("checkpoint")
+
+    def close(self):
+        """Перенос записей в базу и остановка фонового потока"""
+        self._command("stop")
+        self._thread.join()
+
+    def _record(self, op, filename, **payload):
+        with self._lock:
+            self._sequence += 1
+            self._queue.put({"seq": self._sequence, "op": op, "image": filename, **payload})
+
+    def _command(self, name):
+        if not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put((name, done))
+        done.wait()
+
+    def _run(self):
+        last_compact = time.monotonic()
+        while True:
+            timeout = None
+            if self._uncompacted or self._pending:
+                timeout = max(0.0, last_compact + self.compact_interval - time.monotonic())
+            try:
+                batch = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = self._pending + [item for item in batch if isinstance(item, dict)]
+            commands = [item for item in batch if not isinstance(item, dict)]
+            self._pending = []
+
+            try:
+                if records:
+                    self._append(records)
+            except Exception as e:
+                # Записи остаются в памяти до следующей попытки
+                self._pending = records
+                self._report_error(e)
+
+            try:
+                if (self._uncompacted or self._pending) and (
+                    not batch or commands or self._uncompacted >= self.compact_records
+                ):
+                    # Недописанные в файл записи переносятся прямо в базу
+                    self._compact(self._pending)
+                    self._pending = []
+                    last_compact = time.monotonic()
+            except Exception as e:
+                # Журнал на диске сохраняется, перенос повторится позже
+                self._report_error(e)
+            else:
+                if not self._pending:
+                    self._failing = False
+
+            for name, done in commands:
+                if name == "stop" and self._file is not None:
+                    try:
+                        self._file.close()
+                    except OSError as e:
+                        print(f"Ошибка автосохранения аннотаций: {e}")
+                done.set()
+            if any(name == "stop" for name, _ in commands):
+                return
+
+    def _report_error(self, error):
+        print(f"Ошибка автосохранения аннотаций: {error}")
+        if not self._failing and self.error_callback:
+            self.error_callback(error)
+        self._failing = True
+
+    def _append(self, records):
+        """Дописывание записей в журнал со сбросом на диск"""
+        lines = [json.dumps(_encode_record(record), ensure_ascii=False) for record in records]
+        text = "\n".join(lines) + "\n"
+        if self._file is None:
+            # После ошибки файл открывается заново; возможный обрывок
+            # прошлой записи отделяется переводом строки
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+            text = "\n" + text
+        try:
+            self._file.write(text)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+            raise
+        self._uncompacted += len(records)
+
+    def _read_records(self):
+        if not os.path.exists(self.journal_path):
+            return []
+
+        records = []
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Строка, недописанная при сбое или ошибке записи
+                    continue
+        return records
+
+    def _compact(self, pending=()):
+        """Перенос журнала и записей pending в базу; возвращает число перенесенных записей"""
+        sequence = int(self.store.get_meta(JOURNAL_SEQUENCE_KEY, 0))
+        records = []
+        # Повторно дописанные после ошибки записи применяются один раз
+        for record in [*self._read_records(), *map(_encode_record, pending)]:
+            if record["seq"] > sequence:
+                records.append(record)
+                sequence = record["seq"]
+
+        if records:
+            images = {}
+            for record in records:
+                filename = record["image"]
+                if filename not in images:
+                    images[filename] = self.store.load_image(filename)
+                _apply_record(images[filename], record)
+
+            self.store.save_images(images, meta={JOURNAL_SEQUENCE_KEY: records[-1]["seq"]})
+
+        if self._file is not None:
+            self._file.truncate(0)
+        elif os.path.exists(self.journal_path):
+            open(self.journal_path, "w").close()
+        self._uncompacted = 0
+
+        return len(records)
+
+
+def _apply_record(annotations, record):
+    """Применение записи журнала к списку аннотаций изображения"""
+    op = record["op"]
+    if op == "add":
+        annotations.append(_decode_annotation(record["annotation"]))
+    elif op == "delete":
+        if 0 <= record["index"] < len(annotations):
+            annotations.pop(record["index"])
+    elif op == "undo":
+        if annotations:
+            annotations.pop()
+    elif op == "clear":
+        annotations.clear()
+
+
+def _encode_record(record):
+    """Запись для журнала: маска аннотации - в COCO RLE (кодируется в фоновом потоке)"""
+    if "annotation" not in record:
+        return record
+
+    annotation = dict(record["annotation"])
+    annotation["points"] = [list(p) for p in annotation.get("points") or []]
+    if annotation.get("mask") is not None:
+        annotation["mask"] = as_compact_mask(annotation["mask"]).to_rle()
+    return {**record, "annotation": annotation}
+
+
+def _decode_annotation(data):
+    annotation = dict(data)
+    annotation["points"] = [tuple(p) for p in annotation.get("points") or []]
+    if annotation.get("mask") is not None:
+        annotation["mask"] = CompactMask.from_rle(annotation["mask"])
+    return annotation
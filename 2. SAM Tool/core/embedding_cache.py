@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config import EMBEDDINGS_DIR, EMBEDDING_CACHE_CONFIG
+
+
+class EmbeddingCache:
+    """Кэш эмбеддингов изображений SAM: LRU в памяти и файлы .npy на диске.
+
+    Ключ - хэш содержимого изображения, тип модели и размер входа энкодера,
+    поэтому переименование или перенос файла не сбрасывает кэш, а эмбеддинги
+    разных моделей не смешиваются. Файлы читаются через memory-map.
+    Индекс ``file_keys.json`` запоминает хэш каждого файла (по пути, размеру
+    и времени изменения), чтобы не читать и не хэшировать файл повторно.
+    """
+
+    def __init__(self, cache_dir=EMBEDDINGS_DIR, memory_items=None, disk_limit_gb=None):
+        self.cache_dir = cache_dir
+        self.memory_items = (
+            EMBEDDING_CACHE_CONFIG["memory_items"]
+            if memory_items is None
+            else memory_items
+        )
+        self.disk_limit_gb = (
+            EMBEDDING_CACHE_CONFIG["disk_limit_gb"]
+            if disk_limit_gb is None
+            else disk_limit_gb
+        )
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._file_keys = None
+
+    @staticmethod
+    def image_key(image):
+        """Хэш содержимого изображения (пиксели и размер)"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str(image.shape).encode())
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+
+    @property
+    def _file_keys_path(self):
+        return os.path.join(self.cache_dir, "file_keys.json")
+
+    def _load_file_keys(self):
+        if self._file_keys is None:
+            try:
+                with open(self._file_keys_path, "r", encoding="utf-8") as f:
+                    self._file_keys = json.load(f)
+            except (OSError, ValueError):
+                self._file_keys = {}
+        return self._file_keys
+
+    @staticmethod
+    def _file_signature(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def lookup_file_key(self, path):
+        """Хэш содержимого файла из индекса или None, если файл новый или изменился"""
+        with self._lock:
+            entry = self._load_file_keys().get(os.path.abspath(path))
+        try:
+            if entry and entry[:2] == self._file_signature(path):
+                return entry[2]
+        except OSError:
+            pass
+        return None
+
+    def remember_file_key(self, path, key, save=True):
+        """Запись хэша содержимого файла в индекс"""
+        try:
+            entry = self._file_signature(path) + [key]
+        except OSError:
+            return
+        with self._lock:
+            self._load_file_keys()[os.path.abspath(path)] = entry
+        if save:
+            self.save_file_keys()
+
+    def file_key(self, path, image):
+        """Хэш содержимого файла: из индекса или по уже загруженному изображению"""
+        key = self.lookup_file_key(path)
+        if key is None:
+            key = self.image_key(image)
+            self.remember_file_key(path, key)
+        return key
+
+    def save_file_keys(self):
+        """Запись индекса хэшей файлов (атомарной заменой)"""
+        with self._lock:
+            data = json.dumps(self._load_file_keys(), ensure_ascii=False)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self._file_keys_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self._file_keys_path)
+        except OSError as e:
+            print(f"Не удалось сохранить индекс эмбеддингов: {e}")
+
+    def _path(self, key, model_type, input_size):
+        return os.path.join(self.cache_dir, f"{model_type}_{input_size}", f"{key}.npy")
+
+    def _remember(self, cache_key, features):
+        with self._lock:
+            self._memory[cache_key] = features
+            self._memory.move_to_end(cache_key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key, model_type, input_size):
+        """Эмбеддинг изображения или None, если его нет в кэше"""
+        cache_key = (key, model_type, input_size)
+        with self._lock:
+            features = self._memory.get(cache_key)
+            if features is not None:
+                self._memory.move_to_end(cache_key)
+                return features
+
+        path = self._path(key, model_type, input_size)
+        try:
+            features = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+        try:
+            # Время изменения файла - время последнего использования для prune
+            os.utime(path)
+        except OSError:
+            pass
+
+        self._remember(cache_key, features)
+        return features
+
+    def contains(self, key, model_type, input_size):
+        """Есть ли эмбеддинг в памяти или на диске"""
+        with self._lock:
+            if (key, model_type, input_size) in self._memory:
+                return True
+        return os.path.exists(self._path(key, model_type, input_size))
+
+    def put(self, key, model_type, input_size, features):
+        """Сохранение эмбеддинга в память и на диск (атомарной заменой файла)"""
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        self._remember((key, model_type, input_size), features)
+
+        path = self._path(key, model_type, input_size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, features)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Не удалось сохранить эмбеддинг: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def prune(self):
+        """Удаление самых старых файлов, если кэш на диске больше disk_limit_gb"""
+        if not self.disk_limit_gb or not os.path.exists(self.cache_dir):
+            return 0
+
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".npy"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+        limit = self.disk_limit_gb * 2**30
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
@@ -0,0 +1,91 @@
+import threading
+
+from config import EMBEDDING_PREFETCH_CONFIG
+from utils.image_utils import ImageUtils
+
+
+class EmbeddingPrefetcher:
+    """Фоновое кодирование эмбеддингов изображений, к которым пользователь вероятно перейдет.
+
+    Пока размечается текущее изображение, поток кодирует следующие
+    next_images изображений и previous_images предыдущих (по порядку
+    image_files). Результаты попадают в кэш эмбеддингов SAMIntegration,
+    поэтому при переходе set_image берет готовый эмбеддинг. Новый вызов
+    schedule заменяет очередь (например, при переходе через несколько изображений).
+    """
+
+    def __init__(self, sam_integration, next_images=None, previous_images=None):
+        self.sam_integration = sam_integration
+        self.next_images = (
+            EMBEDDING_PREFETCH_CONFIG["next_images"]
+            if next_images is None
+            else next_images
+        )
+        self.previous_images = (
+            EMBEDDING_PREFETCH_CONFIG["previous_images"]
+            if previous_images is None
+            else previous_images
+        )
+
+        self._pending = []
+        self._current = None
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, image_paths, current_index, include_current=False):
+        """Новая очередь: следующие изображения, затем предыдущие
+        (и первым текущее, если include_current)"""
+        targets = [image_paths[current_index]] if include_current else []
+        targets += image_paths[current_index + 1 : current_index + 1 + self.next_images]
+        start = max(0, current_index - self.previous_images)
+        targets += image_paths[start:current_index][::-1]
+
+        with self._condition:
+            self._pending = targets
+            self._condition.notify_all()
+
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def cancel(self):
+        """Очистка очереди (кодируемое сейчас изображение будет докодировано)"""
+        with self._condition:
+            self._pending = []
+
+    def wait(self, image_path, timeout=None):
+        """Ожидание окончания кодирования image_path, если оно уже идет в фоне"""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._current != image_path, timeout=timeout
+            )
+
+    def stop(self):
+        """Остановка фонового потока"""
+        with self._condition:
+            self._pending = []
+            self._stopped = True
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._stopped)
+                if self._stopped:
+                    return
+                image_path = self._pending.pop(0)
+                self._current = image_path
+
+            try:
+                if self.sam_integration.is_loaded():
+                    image = ImageUtils.load_image(image_path)
+                    key = self.sam_integration.embedding_cache.file_key(image_path, image)
+                    self.sam_integration.get_embedding(image, key)
+            except Exception as e:
+                print(f"Ошибка фонового кодирования {image_path}: {e}")
+            finally:
+                with self._condition:
+                    self._current = None
+                    self._condition.notify_all()
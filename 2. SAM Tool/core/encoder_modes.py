@@ -0,0 +1,177 @@
+import copy
+import gc
+import io
+import os
+import threading
+import time
+
+import numpy as np
+
+from config import SAM_IMAGE_SIZE
+
+# Режимы энкодера изображений на CPU
+ENCODER_MODES = {
+    "fp32": "Полная точность",
+    "int8": "Динамическая int8-квантизация линейных слоев",
+    "bf16": "bfloat16 (быстро на CPU с AVX512-BF16/AMX)",
+}
+
+
+def embedding_model_id(model_type, mode):
+    """Идентификатор модели в ключе кэша: эмбеддинги разных режимов не смешиваются"""
+    return model_type if mode == "fp32" else f"{model_type}_{mode}"
+
+
+def apply_encoder_mode(encoder, mode):
+    """Энкодер изображений SAM (на CPU), переведенный в режим mode"""
+    import torch
+
+    if mode not in ENCODER_MODES:
+        raise ValueError(f"Неизвестный режим энкодера: {mode}")
+
+    if mode == "int8":
+        try:
+            from torch.ao.quantization import quantize_dynamic
+        except ImportError:
+            from torch.quantization import quantize_dynamic
+
+        return quantize_dynamic(encoder, {torch.nn.Linear}, dtype=torch.qint8)
+    if mode == "bf16":
+        return encoder.to(torch.bfloat16)
+    return encoder
+
+
+def encoder_dtype(encoder):
+    """Тип данных входа энкодера (для int8 остается float32)"""
+    for parameter in encoder.parameters():
+        return parameter.dtype
+    return None
+
+
+def weights_size_mb(module):
+    """Размер сериализованных весов модуля (учитывает упакованные int8-веса)"""
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(module.state_dict(), buffer)
+    return buffer.tell() / 2**20
+
+
+def _current_rss():
+    """Текущий объем памяти процесса в байтах или None, если его не узнать"""
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class PeakMemoryMonitor:
+    """Пиковый прирост памяти процесса за время блока with (опрос каждые 10 мс)"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.baseline = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = _current_rss()
+            if rss is not None:
+                self.peak = max(self.peak, rss)
+
+    def __enter__(self):
+        self.baseline = self.peak = _current_rss()
+        if self.baseline is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            rss = _current_rss()
+            if rss is not None:
+                self.peak = max(self.peak, rss)
+        return False
+
+    @property
+    def peak_increase_mb(self):
+        if self.baseline is None:
+            return None
+        return (self.peak - self.baseline) / 2**20
+
+
+def benchmark_encoder(sam, modes=None, repeats=2, threads=0):
+    """Время кодирования и память энкодера в каждом режиме.
+
+    Для каждого режима копируется исходный энкодер fp32, переводится
+    в режим и кодирует синтетическое изображение SAM_IMAGE_SIZE x SAM_IMAGE_SIZE
+    (первый прогон - прогрев). Возвращает список словарей
+    ``{mode, encode_seconds, weights_mb, peak_memory_mb, error}``.
+    """
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+
+    rng = np.random.default_rng(0)
+    image = torch.as_tensor(
+        rng.integers(0, 256, size=(1, 3, SAM_IMAGE_SIZE, SAM_IMAGE_SIZE)), dtype=torch.float32
+    )
+    image = sam.preprocess(image)
+
+    results = []
+    for mode in modes or list(ENCODER_MODES):
+        result = {"mode": mode, "encode_seconds": None, "weights_mb": None, "peak_memory_mb": None}
+        encoder = None
+        try:
+            with PeakMemoryMonitor() as monitor:
+                encoder = apply_encoder_mode(copy.deepcopy(sam.image_encoder), mode)
+                encoder.eval()
+
+                dtype = encoder_dtype(encoder)
+                timings = []
+                with torch.no_grad():
+                    for _ in range(repeats + 1):
+                        start_time = time.perf_counter()
+                        encoder(image.to(dtype))
+                        timings.append(time.perf_counter() - start_time)
+
+            result["encode_seconds"] = min(timings[1:]) if repeats else timings[0]
+            result["weights_mb"] = weights_size_mb(encoder)
+            result["peak_memory_mb"] = monitor.peak_increase_mb
+        except Exception as e:
+            result["error"] = str(e)
+        finally:
+            del encoder
+            gc.collect()
+
+        results.append(result)
+
+    return results
+
+
+def format_benchmark(results):
+    """Таблица результатов benchmark_encoder для лога и консоли"""
+    lines = [f"{'Режим':<6} {'Кодирование, с':>15} {'Веса, МБ':>10} {'Пик памяти, МБ':>15}"]
+    for result in results:
+        if result.get("error"):
+            lines.append(f"{result['mode']:<6} ошибка: {result['error']}")
+            continue
+        peak = result["peak_memory_mb"]
+        peak_text = f"{peak:.0f}" if peak is not None else "н/д"
+        lines.append(
+            f"{result['mode']:<6} {result['encode_seconds']:>15.2f} "
+            f"{result['weights_mb']:>10.0f} {peak_text:>15}"
+        )
+    return "\n".join(lines)
@@ -1,8 +1,8 @@
 import os
 import json
 import numpy as np
-from tkinter import filedialog
 from config import SUPPORTED_IMAGE_FORMATS
+from utils.mask_codec import as_compact_mask
 
 
 class FileManager:
@@ -10,36 +10,47 @@ class FileManager:
 
     def select_image_folder(self):
         """Выбор папки с изображениями"""
+        from tkinter import filedialog
+
         return filedialog.askdirectory(title="Выберите папку с изображениями")
 
-    def get_image_files(self, folder_path):
-        """Получение списка файлов изображений"""
+    def get_image_files(self, folder_path, recursive=False):
+        """Получение списка файлов изображений (пути относительно folder_path)"""
         if not os.path.exists(folder_path):
             return []
 
+        if not recursive:
+            files = os.listdir(folder_path)
+        else:
+            files = [
+                os.path.relpath(os.path.join(root, name), folder_path)
+                for root, _, names in os.walk(folder_path)
+                for name in names
+            ]
+
         image_files = []
-        for file in os.listdir(folder_path):
+        for file in files:
             if file.lower().endswith(SUPPORTED_IMAGE_FORMATS):
                 image_files.append(file)
 
         return sorted(image_files)
 
     def save_annotations_json(self, folder_path, filename, annotations):
-        """Сохранение аннотаций в JSON"""
+        """Сохранение аннотаций в JSON (маски - в COCO RLE)"""
         json_path = os.path.join(folder_path, f"{filename}_annotations.json")
 
         json_data = []
         for ann in annotations:
             ann_copy = ann.copy()
             if "mask" in ann_copy and ann_copy["mask"] is not None:
-                ann_copy["mask"] = ann_copy["mask"].tolist()
+                ann_copy["mask"] = as_compact_mask(ann_copy["mask"]).to_rle()
             json_data.append(ann_copy)
 
         with open(json_path, "w", encoding="utf-8") as f:
             json.dump(json_data, f, ensure_ascii=False, indent=2)
 
     def load_annotations_json(self, folder_path, filename):
-        """Загрузка аннотаций из JSON"""
+        """Загрузка аннотаций из JSON (маски - в COCO RLE или, в старых файлах, списком пикселей)"""
         json_path = os.path.join(folder_path, f"{filename}_annotations.json")
 
         if not os.path.exists(json_path):
@@ -52,7 +63,10 @@ class FileManager:
             annotations = []
             for ann in json_data:
                 if "mask" in ann and ann["mask"] is not None:
-                    ann["mask"] = np.array(ann["mask"], dtype=np.uint8)
+                    mask = ann["mask"]
+                    if not isinstance(mask, dict):
+                        mask = np.array(mask, dtype=np.uint8)
+                    ann["mask"] = as_compact_mask(mask)
                 annotations.append(ann)
 
             return annotations
@@ -0,0 +1,146 @@
+import queue
+import threading
+from collections import deque
+
+# Период опроса готовых результатов из потока Tk, мс
+POLL_INTERVAL_MS = 15
+
+
+class InferenceService:
+    """Поток для запросов к SAM, чтобы кодирование и декодирование не блокировали окно.
+
+    Запросы разложены по каналам (например, "image" - установка изображения,
+    "click" - сегментация по клику, "preview" - предпросмотр под курсором).
+    Каналы обслуживаются в порядке приоритета, внутри канала - по очереди.
+    Запрос с coalesce=True заменяет ожидающие запросы своего канала,
+    а результаты устаревших запросов (после более нового submit или cancel)
+    отбрасываются. Результаты передаются в поток Tk через очередь, которую
+    опрашивает root.after. Запросы фоновых каналов (background_channels)
+    не включают индикатор занятости.
+    """
+
+    def __init__(
+        self,
+        root,
+        channels=("image", "click", "prompt", "preview"),
+        busy_callback=None,
+        background_channels=("preview",),
+    ):
+        self.root = root
+        self.channels = list(channels)
+        self.busy_callback = busy_callback
+        self.background_channels = set(background_channels)
+
+        self._pending = {channel: deque() for channel in self.channels}
+        # Результаты запросов с номером меньше этого в канале устарели
+        self._valid_from = {channel: 0 for channel in self.channels}
+        self._sequence = 0
+        self._running = None
+        self._busy = False
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._results = queue.Queue()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def submit(self, channel, func, on_result=None, on_error=None, coalesce=True):
+        """Постановка func в очередь канала; возвращает номер запроса"""
+        with self._condition:
+            self._sequence += 1
+            sequence = self._sequence
+            if coalesce:
+                self._pending[channel].clear()
+                self._valid_from[channel] = sequence
+            self._pending[channel].append((sequence, func, on_result, on_error))
+            self._condition.notify()
+        return sequence
+
+    def call_soon(self, func):
+        """Вызов func в потоке Tk при ближайшем опросе (из любого потока)"""
+        self._results.put((None, 0, None, None, lambda _: func(), None))
+
+    def cancel(self, channel):
+        """Отмена ожидающих запросов канала; результат выполняемого будет отброшен"""
+        with self._condition:
+            self._pending[channel].clear()
+            self._sequence += 1
+            self._valid_from[channel] = self._sequence
+
+    def is_busy(self):
+        with self._condition:
+            channels = [self._running] + [
+                channel for channel, pending in self._pending.items() if pending
+            ]
+            return any(
+                channel is not None and channel not in self.background_channels
+                for channel in channels
+            )
+
+    def stop(self):
+        """Остановка потока (выполняемый запрос будет завершен)"""
+        with self._condition:
+            self._stopped = True
+            for pending in self._pending.values():
+                pending.clear()
+            self._condition.notify()
+
+    def _next_request(self):
+        for channel in self.channels:
+            if self._pending[channel]:
+                return channel, self._pending[channel].popleft()
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._stopped or any(self._pending.values())
+                )
+                if self._stopped:
+                    return
+                channel, (sequence, func, on_result, on_error) = self._next_request()
+                self._running = channel
+
+            try:
+                result, error = func(), None
+            except Exception as e:
+                result, error = None, e
+
+            with self._condition:
+                self._running = None
+            self._results.put((channel, sequence, result, error, on_result, on_error))
+
+    def _poll(self):
+        """Доставка готовых результатов в потоке Tk"""
+        try:
+            while True:
+                try:
+                    channel, sequence, result, error, on_result, on_error = (
+                        self._results.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+
+                # Результат устарел: запрос заменен более новым или отменен
+                if channel is not None and sequence < self._valid_from[channel]:
+                    continue
+
+                # Ошибка обработчика не должна останавливать опрос очереди
+                try:
+                    if error is not None:
+                        if on_error:
+                            on_error(error)
+                    elif on_result:
+                        on_result(result)
+                except Exception as e:
+                    print(f"Ошибка обработки результата SAM: {e}")
+
+            busy = self.is_busy()
+            if busy != self._busy and self.busy_callback:
+                self.busy_callback(busy)
+            self._busy = busy
+        finally:
+            if not self._stopped:
+                self.root.after(POLL_INTERVAL_MS, self._poll)
@@ -0,0 +1,178 @@
+import os
+
+import cv2
+import numpy as np
+
+from config import SAM_IMAGE_SIZE
+
+# Порог логитов маски (как mask_threshold в SAM)
+MASK_THRESHOLD = 0.0
+
+
+def preprocess_shape(height, width, long_side=SAM_IMAGE_SIZE):
+    """Размер изображения на входе энкодера (как ResizeLongestSide.get_preprocess_shape)"""
+    scale = long_side / max(height, width)
+    return int(height * scale + 0.5), int(width * scale + 0.5)
+
+
+def upscale_logits(low_res_mask, input_size, output_size):
+    """Логиты маски 256x256 -> логиты размера output_size (высота, ширина).
+
+    Как postprocess_masks в SAM: маска растягивается до входа энкодера,
+    обрезается по размеру input_size (без паддинга) и масштабируется до
+    output_size - исходного размера изображения или, для предпросмотра,
+    размера на экране.
+    """
+    new_h, new_w = input_size
+    mask = cv2.resize(low_res_mask, (SAM_IMAGE_SIZE, SAM_IMAGE_SIZE), interpolation=cv2.INTER_LINEAR)
+    mask = mask[:new_h, :new_w]
+    height, width = output_size
+    return cv2.resize(mask, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def export_decoder(sam, output_path, quantize=False, opset=17):
+    """Экспорт кодировщика подсказок и декодера масок SAM в ONNX.
+
+    Экспортируется вариант без встроенного масштабирования масок до размера
+    изображения: декодер возвращает маски 256x256 и оценки, до полного
+    размера масштабируется только выбранная маска. При quantize веса
+    дополнительно квантуются в int8 (динамическая квантизация onnxruntime).
+    """
+    import torch
+    from segment_anything.utils.onnx import SamOnnxModel
+
+    class LowResDecoder(SamOnnxModel):
+        def forward(self, image_embeddings, point_coords, point_labels, mask_input, has_mask_input):
+            sparse_embedding = self._embed_points(point_coords, point_labels)
+            dense_embedding = self._embed_masks(mask_input, has_mask_input)
+            masks, scores = self.model.mask_decoder.predict_masks(
+                image_embeddings=image_embeddings,
+                image_pe=self.model.prompt_encoder.get_dense_pe(),
+                sparse_prompt_embeddings=sparse_embedding,
+                dense_prompt_embeddings=dense_embedding,
+            )
+            return scores, masks
+
+    decoder = LowResDecoder(model=sam, return_single_mask=False)
+
+    embed_dim = sam.prompt_encoder.embed_dim
+    embed_size = sam.prompt_encoder.image_embedding_size
+    mask_input_size = [4 * x for x in embed_size]
+    dummy_inputs = {
+        "image_embeddings": torch.randn(1, embed_dim, *embed_size, dtype=torch.float),
+        "point_coords": torch.randint(low=0, high=1024, size=(1, 5, 2), dtype=torch.float),
+        "point_labels": torch.randint(low=0, high=4, size=(1, 5), dtype=torch.float),
+        "mask_input": torch.randn(1, 1, *mask_input_size, dtype=torch.float),
+        "has_mask_input": torch.tensor([1], dtype=torch.float),
+    }
+
+    float_path = output_path if not quantize else f"{output_path}.fp32.tmp"
+    with open(float_path, "wb") as f:
+        torch.onnx.export(
+            decoder,
+            tuple(dummy_inputs.values()),
+            f,
+            export_params=True,
+            opset_version=opset,
+            do_constant_folding=True,
+            input_names=list(dummy_inputs.keys()),
+            output_names=["iou_predictions", "low_res_masks"],
+            dynamic_axes={
+                "point_coords": {1: "num_points"},
+                "point_labels": {1: "num_points"},
+            },
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(float_path, output_path, weight_type=QuantType.QUInt8)
+        os.remove(float_path)
+
+    return output_path
+
+
+class OnnxPromptDecoder:
+    """Декодер масок SAM на onnxruntime (CPU) поверх готового эмбеддинга изображения.
+
+    Повторяет поведение SamPredictor.predict: те же подсказки (точки
+    с метками и рамка), выбор лучшей из трех масок при multimask_output
+    и порог логитов MASK_THRESHOLD, но без накладных расходов PyTorch.
+    """
+
+    def __init__(self, model_path, num_threads=0):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.model_path = model_path
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.features = None
+        self.original_size = None
+        self.input_size = None
+
+        self._mask_input = np.zeros((1, 1, 256, 256), dtype=np.float32)
+        self._has_mask_input = np.zeros(1, dtype=np.float32)
+
+    def set_embedding(self, features, original_size):
+        """Эмбеддинг текущего изображения и его исходный размер (высота, ширина)"""
+        self.features = np.ascontiguousarray(features, dtype=np.float32)
+        self.original_size = tuple(original_size[:2])
+        self.input_size = preprocess_shape(*self.original_size)
+
+    def _transform_coords(self, coords):
+        """Координаты исходного изображения -> координаты входа энкодера"""
+        height, width = self.original_size
+        new_h, new_w = self.input_size
+        coords = np.asarray(coords, dtype=np.float32).reshape(-1, 2).copy()
+        coords[:, 0] *= new_w / width
+        coords[:, 1] *= new_h / height
+        return coords
+
+    def predict_best(
+        self, point_coords=None, point_labels=None, box=None, multimask_output=True, output_size=None
+    ):
+        """Лучшая маска (bool, размер output_size или изображения) и ее оценка"""
+        if self.features is None:
+            raise RuntimeError("Эмбеддинг изображения не установлен")
+
+        coords = np.zeros((0, 2), dtype=np.float32)
+        labels = np.zeros(0, dtype=np.float32)
+        if point_coords is not None:
+            coords = self._transform_coords(point_coords)
+            labels = np.asarray(point_labels, dtype=np.float32).reshape(-1)
+
+        if box is not None:
+            coords = np.concatenate([coords, self._transform_coords(box)])
+            labels = np.concatenate([labels, np.array([2, 3], dtype=np.float32)])
+        else:
+            # Точка-заглушка вместо рамки, как в примере экспорта SAM
+            coords = np.concatenate([coords, np.zeros((1, 2), dtype=np.float32)])
+            labels = np.concatenate([labels, np.array([-1], dtype=np.float32)])
+
+        scores, low_res_masks = self.session.run(
+            None,
+            {
+                "image_embeddings": self.features,
+                "point_coords": coords[None, :, :],
+                "point_labels": labels[None, :],
+                "mask_input": self._mask_input,
+                "has_mask_input": self._has_mask_input,
+            },
+        )
+
+        # Токен 0 - одиночная маска, токены 1..3 - варианты для multimask_output
+        scores, low_res_masks = scores[0], low_res_masks[0]
+        if multimask_output:
+            best = 1 + int(np.argmax(scores[1:]))
+        else:
+            best = 0
+
+        mask = upscale_logits(low_res_masks[best], self.input_size, output_size or self.original_size)
+        mask = mask > MASK_THRESHOLD
+        return mask, float(scores[best])
@@ -1,7 +1,16 @@
 import os
 import numpy as np
 import threading
-from config import SAM_MODELS, MODELS_DIR
+from config import SAM_MODELS, MODELS_DIR, ENCODER_CONFIG, ONNX_DECODER_CONFIG
+from core.embedding_cache import EmbeddingCache
+from core.onnx_decoder import MASK_THRESHOLD, upscale_logits
+from core.encoder_modes import (
+    apply_encoder_mode,
+    benchmark_encoder,
+    embedding_model_id,
+    encoder_dtype,
+    format_benchmark,
+)
 
 
 class SAMIntegration:
@@ -11,11 +20,69 @@ class SAMIntegration:
         self.sam_predictor = None
         self.sam_loaded = False
         self.current_model_type = None
+        self.encoder_mode = "fp32"
+        self.embedding_cache = EmbeddingCache()
+        self.onnx_decoder = None
+        self._predictor_lock = threading.RLock()
 
     def is_loaded(self):
         """Проверка загрузки модели"""
         return self.sam_loaded and self.sam_predictor is not None
 
+    def load_model_sync(
+        self, model_path=None, device=None, progress_callback=None, encoder_mode=None, threads=None
+    ):
+        """Загрузка модели SAM в текущем потоке; возвращает (тип модели, устройство).
+
+        На CPU энкодер переводится в режим encoder_mode (ENCODER_CONFIG по умолчанию),
+        threads задает число потоков torch.
+        """
+        try:
+            from segment_anything import sam_model_registry, SamPredictor
+            import torch
+        except ImportError:
+            raise ImportError(
+                "Не установлена библиотека segment-anything.\n"
+                "Установите: pip install git+https://github.com/facebookresearch/segment-anything.git"
+            )
+
+        if progress_callback:
+            progress_callback(50)
+
+        model_path = model_path or self._find_model_file()
+        if not model_path or not os.path.exists(model_path):
+            raise FileNotFoundError(
+                "Файл модели SAM не найден.\n"
+                "Скачайте одну из моделей:\n"
+                + "\n".join([f"wget {info['url']}" for info in SAM_MODELS.values()])
+            )
+
+        if progress_callback:
+            progress_callback(75)
+
+        model_type = self._get_model_type(model_path)
+
+        sam = sam_model_registry[model_type](checkpoint=model_path)
+
+        device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        sam.to(device=device)
+
+        threads = ENCODER_CONFIG["threads"] if threads is None else threads
+        if threads:
+            torch.set_num_threads(threads)
+
+        self.encoder_mode = "fp32"
+        if device == "cpu":
+            self.encoder_mode = encoder_mode or ENCODER_CONFIG["mode"]
+            sam.image_encoder = apply_encoder_mode(sam.image_encoder, self.encoder_mode)
+
+        self.sam_predictor = SamPredictor(sam)
+        self.onnx_decoder = None
+        self.sam_loaded = True
+        self.current_model_type = model_type
+
+        return model_type, device
+
     def load_model(self, callback=None, progress_callback=None):
         """Загрузка модели SAM в отдельном потоке"""
 
@@ -24,49 +91,35 @@ class SAMIntegration:
                 if progress_callback:
                     progress_callback(25)
 
-                try:
-                    from segment_anything import sam_model_registry, SamPredictor
-                    import torch
-                except ImportError:
-                    raise ImportError(
-                        "Не установлена библиотека segment-anything.\n"
-                        "Установите: pip install git+https://github.com/facebookresearch/segment-anything.git"
-                    )
-
-                if progress_callback:
-                    progress_callback(50)
-
-                model_path = self._find_model_file()
-                if not model_path:
-                    raise FileNotFoundError(
-                        "Файл модели SAM не найден.\n"
-                        "Скачайте одну из моделей:\n"
-                        + "\n".join(
-                            [f"wget {info['url']}" for info in SAM_MODELS.values()]
-                        )
-                    )
-
-                if progress_callback:
-                    progress_callback(75)
-
-                model_type = self._get_model_type(model_path)
+                model_type, device = self.load_model_sync(
+                    progress_callback=progress_callback
+                )
 
-                sam = sam_model_registry[model_type](checkpoint=model_path)
+                self.embedding_cache.prune()
 
-                device = "cuda" if torch.cuda.is_available() else "cpu"
-                sam.to(device=device)
+                decoder_info = "PyTorch"
+                if ONNX_DECODER_CONFIG["enabled"]:
+                    try:
+                        self.enable_onnx_decoder(
+                            ONNX_DECODER_CONFIG["quantize"], ONNX_DECODER_CONFIG["threads"]
+                        )
+                        decoder_info = os.path.basename(self.onnx_decoder.model_path)
+                    except Exception as e:
+                        decoder_info = f"PyTorch (ONNX недоступен: {e})"
 
-                self.sam_predictor = SamPredictor(sam)
-                self.sam_loaded = True
-                self.current_model_type = model_type
+                benchmark_info = ""
+                if ENCODER_CONFIG["benchmark_on_load"] and device == "cpu":
+                    benchmark_info = "\n\n" + self.run_encoder_benchmark()
 
                 if progress_callback:
                     progress_callback(100)
 
-                device_info = f" (GPU)" if device == "cuda" else " (CPU)"
                 success_message = (
                     f"Модель SAM ({model_type.upper()}) загружена успешно\n"
-                    f"Устройство: {device.upper()}"
+                    f"Устройство: {device.upper()}\n"
+                    f"Энкодер: {self.encoder_mode}\n"
+                    f"Декодер масок: {decoder_info}"
+                    f"{benchmark_info}"
                 )
 
                 if callback:
@@ -79,8 +132,8 @@ class SAMIntegration:
 
         threading.Thread(target=load_in_thread, daemon=True).start()
 
-    def _find_model_file(self):
-        """Поиск файла модели SAM"""
+    def _find_model_file(self, model_type=None):
+        """Поиск файла модели SAM (заданного типа, если указан model_type)"""
 
         search_paths = [
             MODELS_DIR,
@@ -88,7 +141,9 @@ class SAMIntegration:
             os.path.join(os.getcwd(), "models"),
         ]
 
-        for model_info in SAM_MODELS.values():
+        for current_type, model_info in SAM_MODELS.items():
+            if model_type and current_type != model_type:
+                continue
             filename = model_info["filename"]
             for search_path in search_paths:
                 full_path = os.path.join(search_path, filename)
@@ -97,6 +152,38 @@ class SAMIntegration:
 
         return None
 
+    def onnx_decoder_path(self, quantize=False):
+        """Путь к ONNX-декодеру загруженной модели"""
+        suffix = "_int8" if quantize else ""
+        return os.path.join(
+            MODELS_DIR, f"sam_{self.current_model_type}_decoder{suffix}.onnx"
+        )
+
+    def enable_onnx_decoder(self, quantize=False, num_threads=0):
+        """Переключение декодера масок на onnxruntime (с экспортом модели при первом запуске)"""
+        from core.onnx_decoder import OnnxPromptDecoder, export_decoder
+
+        if not self.is_loaded():
+            raise RuntimeError("Модель SAM не загружена")
+
+        model_path = self.onnx_decoder_path(quantize)
+        if not os.path.exists(model_path):
+            export_decoder(self.sam_predictor.model, model_path, quantize)
+
+        decoder = OnnxPromptDecoder(model_path, num_threads)
+        with self._predictor_lock:
+            if self.sam_predictor.is_image_set:
+                decoder.set_embedding(
+                    self.sam_predictor.features.cpu().numpy(),
+                    self.sam_predictor.original_size,
+                )
+            self.onnx_decoder = decoder
+
+    def disable_onnx_decoder(self):
+        """Возврат к декодеру PyTorch"""
+        with self._predictor_lock:
+            self.onnx_decoder = None
+
     def _get_model_type(self, model_path):
         """Определение типа модели по пути к файлу"""
         filename = os.path.basename(model_path)
@@ -105,33 +192,179 @@ class SAMIntegration:
                 return model_type
         return "vit_h"
 
-    def set_image(self, image):
-        """Установка изображения для SAM"""
-        if self.is_loaded():
-            self.sam_predictor.set_image(image)
+    def run_encoder_benchmark(self, modes=None):
+        """Сравнение режимов энкодера на этой машине (таблица для вывода)"""
+        if not self.is_loaded():
+            raise RuntimeError("Модель SAM не загружена")
 
-    def segment_point(self, x, y):
-        """Сегментация по одной точке"""
+        # Копии энкодера строятся из исходных весов fp32
+        model = self.sam_predictor.model
+        if self.encoder_mode != "fp32":
+            return "Сравнение режимов доступно только при загрузке в режиме fp32"
+
+        results = benchmark_encoder(model, modes)
+        return format_benchmark(results)
+
+    @property
+    def embedding_model_id(self):
+        """Тип модели с режимом энкодера (часть ключа кэша эмбеддингов)"""
+        return embedding_model_id(self.current_model_type, self.encoder_mode)
+
+    @property
+    def input_size(self):
+        """Размер входа энкодера изображений (длинная сторона)"""
+        return self.sam_predictor.model.image_encoder.img_size
+
+    def encode_image(self, image):
+        """Эмбеддинг изображения RGB энкодером SAM без изменения состояния предиктора"""
+        import torch
+
+        predictor = self.sam_predictor
+        input_image = predictor.transform.apply_image(image)
+        input_image = torch.as_tensor(input_image, device=predictor.device)
+        input_image = input_image.permute(2, 0, 1).contiguous()[None, :, :, :]
+
+        encoder = predictor.model.image_encoder
+        with torch.no_grad():
+            input_image = predictor.model.preprocess(input_image).to(encoder_dtype(encoder))
+            features = encoder(input_image)
+
+        return features.float().cpu().numpy()
+
+    def get_embedding(self, image, key=None):
+        """Эмбеддинг изображения из кэша или, если его там нет, от энкодера"""
         if not self.is_loaded():
             raise RuntimeError("Модель SAM не загружена")
 
-        point_coords = np.array([[x, y]])
-        point_labels = np.array([1])
+        key = key or self.embedding_cache.image_key(image)
+        model_type, input_size = self.embedding_model_id, self.input_size
+
+        features = self.embedding_cache.get(key, model_type, input_size)
+        if features is None:
+            features = self.encode_image(image)
+            self.embedding_cache.put(key, model_type, input_size, features)
+
+        return features
 
-        masks, scores, logits = self.sam_predictor.predict(
-            point_coords=point_coords,
-            point_labels=point_labels,
-            multimask_output=True,
+    def _restore_embedding(self, image_shape, features):
+        """Установка готового эмбеддинга в предиктор вместо повторного кодирования"""
+        import torch
+
+        predictor = self.sam_predictor
+        height, width = image_shape[:2]
+
+        predictor.reset_image()
+        predictor.original_size = (height, width)
+        predictor.input_size = predictor.transform.get_preprocess_shape(
+            height, width, predictor.transform.target_length
         )
+        predictor.features = torch.from_numpy(np.array(features)).to(predictor.device)
+        predictor.is_image_set = True
+
+    def set_image(self, image, key=None):
+        """Установка изображения для SAM (эмбеддинг берется из кэша, если он там есть)"""
+        if self.is_loaded():
+            features = self.get_embedding(image, key)
+            with self._predictor_lock:
+                self._restore_embedding(image.shape, features)
+                if self.onnx_decoder is not None:
+                    self.onnx_decoder.set_embedding(features, image.shape)
+
+    def _predict_low_res(self, point_coords=None, point_labels=None, box=None, multimask_output=True):
+        """Логиты лучшей маски 256x256 декодером PyTorch и ее оценка.
+
+        В отличие от SamPredictor.predict не масштабирует все маски
+        до размера изображения: это делает вызывающий код только для
+        выбранной маски и до нужного ему размера.
+        """
+        import torch
+
+        predictor = self.sam_predictor
+        if not predictor.is_image_set:
+            raise RuntimeError("Изображение для SAM не установлено")
+
+        model = predictor.model
+        points = None
+        if point_coords is not None:
+            coords = predictor.transform.apply_coords(point_coords, predictor.original_size)
+            points = (
+                torch.as_tensor(coords, dtype=torch.float, device=predictor.device)[None],
+                torch.as_tensor(point_labels, dtype=torch.int, device=predictor.device)[None],
+            )
+        boxes = None
+        if box is not None:
+            boxes = torch.as_tensor(
+                predictor.transform.apply_boxes(box, predictor.original_size),
+                dtype=torch.float,
+                device=predictor.device,
+            )
+
+        with torch.no_grad():
+            sparse_embeddings, dense_embeddings = model.prompt_encoder(
+                points=points, boxes=boxes, masks=None
+            )
+            low_res_masks, scores = model.mask_decoder(
+                image_embeddings=predictor.features,
+                image_pe=model.prompt_encoder.get_dense_pe(),
+                sparse_prompt_embeddings=sparse_embeddings,
+                dense_prompt_embeddings=dense_embeddings,
+                multimask_output=multimask_output,
+            )
 
-        best_mask_idx = np.argmax(scores)
-        mask = masks[best_mask_idx]
-        score = scores[best_mask_idx]
+        best = int(torch.argmax(scores[0]))
+        return low_res_masks[0, best].float().cpu().numpy(), float(scores[0, best])
+
+    def _predict_mask(
+        self, point_coords=None, point_labels=None, box=None, multimask_output=True, output_size=None
+    ):
+        """Лучшая маска (bool, размер output_size или изображения) и ее оценка"""
+        with self._predictor_lock:
+            if self.onnx_decoder is not None:
+                return self.onnx_decoder.predict_best(
+                    point_coords, point_labels, box, multimask_output, output_size
+                )
+
+            low_res_mask, score = self._predict_low_res(
+                point_coords, point_labels, box, multimask_output
+            )
+            input_size = self.sam_predictor.input_size
+            output_size = output_size or self.sam_predictor.original_size
+
+        mask = upscale_logits(low_res_mask, input_size, output_size) > MASK_THRESHOLD
+        return mask, score
+
+    def _predict_best(self, point_coords=None, point_labels=None, box=None, multimask_output=True):
+        """Лучшая маска по оценке SAM (uint8 0/255) и ее оценка"""
+        mask, score = self._predict_mask(point_coords, point_labels, box, multimask_output)
 
         mask = (mask * 255).astype(np.uint8)
 
         return mask, score
 
+    def preview_point(self, x, y, output_size):
+        """Маска-кандидат по точке для предпросмотра (bool, размер output_size = (высота, ширина)).
+
+        Маска масштабируется сразу до размера изображения на экране,
+        поэтому вызов укладывается в десятки миллисекунд и для больших снимков.
+        """
+        if not self.is_loaded():
+            raise RuntimeError("Модель SAM не загружена")
+
+        point_coords = np.array([[x, y]])
+        point_labels = np.array([1])
+
+        return self._predict_mask(point_coords, point_labels, output_size=output_size)
+
+    def segment_point(self, x, y):
+        """Сегментация по одной точке"""
+        if not self.is_loaded():
+            raise RuntimeError("Модель SAM не загружена")
+
+        point_coords = np.array([[x, y]])
+        point_labels = np.array([1])
+
+        return self._predict_best(point_coords, point_labels, multimask_output=True)
+
     def segment_with_points(self, manual_points):
         """Сегментация с несколькими точками"""
         if not self.is_loaded():
@@ -147,19 +380,7 @@ class SAMIntegration:
             point_coords = np.array(manual_points)
             point_labels = np.ones(len(manual_points))
 
-        masks, scores, logits = self.sam_predictor.predict(
-            point_coords=point_coords,
-            point_labels=point_labels,
-            multimask_output=True,
-        )
-
-        best_mask_idx = np.argmax(scores)
-        mask = masks[best_mask_idx]
-        score = scores[best_mask_idx]
-
-        mask = (mask * 255).astype(np.uint8)
-
-        return mask, score
+        return self._predict_best(point_coords, point_labels, multimask_output=True)
 
     def segment_with_bbox(self, bbox):
         """Сегментация с bounding box"""
@@ -168,19 +389,7 @@ class SAMIntegration:
 
         input_box = np.array(bbox)
 
-        masks, scores, logits = self.sam_predictor.predict(
-            point_coords=None,
-            point_labels=None,
-            box=input_box[None, :],
-            multimask_output=False,
-        )
-
-        mask = masks[0]
-        score = scores[0]
-
-        mask = (mask * 255).astype(np.uint8)
-
-        return mask, score
+        return self._predict_best(box=input_box[None, :], multimask_output=False)
 
     def auto_segment_everything(self, image):
         """Автоматическая сегментация всего изображения"""
@@ -27,7 +27,9 @@ def main():
 
         def on_closing():
             if messagebox.askokcancel("Выход", "Вы уверены, что хотите выйти?"):
-                app.save_current_annotations()
+                app.close_annotation_store()
+                app.embedding_prefetcher.stop()
+                app.inference_service.stop()
                 root.quit()
                 root.destroy()
 
@@ -0,0 +1,207 @@
+"""
+sam-embed: пакетное кодирование эмбеддингов SAM для папки изображений без интерфейса.
+
+Эмбеддинги записываются в тот же кэш, что использует приложение, поэтому
+при разметке запускается только легкий декодер масок. Повторный запуск
+продолжает работу: уже закодированные изображения пропускаются.
+
+Пример:
+    python sam_embed.py /data/flight_01 --model vit_h --workers 2 --threads 4
+    python sam_embed.py --model vit_h --benchmark
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import EMBEDDINGS_DIR, ENCODER_CONFIG, SAM_IMAGE_SIZE, SAM_MODELS
+from core.embedding_cache import EmbeddingCache
+from core.encoder_modes import ENCODER_MODES, embedding_model_id
+from core.file_manager import FileManager
+from core.sam_integration import SAMIntegration
+from utils.image_utils import ImageUtils
+
+# Как часто сохранять индекс хэшей файлов (число обработанных изображений)
+SAVE_INTERVAL = 20
+
+# Модель в рабочем процессе
+_process_sam = None
+
+
+def _init_worker(model_path, device, encoder_mode, threads, cache_dir):
+    """Загрузка модели в рабочем процессе"""
+    global _process_sam
+
+    _process_sam = SAMIntegration()
+    _process_sam.embedding_cache = EmbeddingCache(cache_dir, memory_items=0)
+    _process_sam.load_model_sync(
+        model_path, device, encoder_mode=encoder_mode, threads=threads
+    )
+
+
+def _embed_file(image_path, force):
+    """Кодирование одного файла: (путь, хэш, закодирован ли, секунд)"""
+    start_time = time.perf_counter()
+    cache = _process_sam.embedding_cache
+
+    image = ImageUtils.load_image(image_path)
+    key = cache.image_key(image)
+    model_type, input_size = _process_sam.embedding_model_id, _process_sam.input_size
+
+    if not force and cache.contains(key, model_type, input_size):
+        return image_path, key, False, time.perf_counter() - start_time
+
+    features = _process_sam.encode_image(image)
+    cache.put(key, model_type, input_size, features)
+    return image_path, key, True, time.perf_counter() - start_time
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="sam-embed",
+        description="Пакетное кодирование эмбеддингов SAM для папки изображений",
+    )
+    parser.add_argument("folder", nargs="?", help="Папка с изображениями")
+    parser.add_argument(
+        "--model",
+        choices=sorted(SAM_MODELS),
+        help="Тип модели (по умолчанию - первая найденная в models/)",
+    )
+    parser.add_argument("--checkpoint", help="Путь к файлу весов модели")
+    parser.add_argument("--device", help="Устройство torch: cpu, cuda, cuda:1 ...")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Число процессов (каждый загружает модель)"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=ENCODER_CONFIG["threads"],
+        help="Потоков torch на процесс (0 - по умолчанию)",
+    )
+    parser.add_argument(
+        "--encoder-mode",
+        choices=list(ENCODER_MODES),
+        default=ENCODER_CONFIG["mode"],
+        help="Режим энкодера на CPU",
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Только сравнить режимы энкодера на этой машине и выйти",
+    )
+    parser.add_argument(
+        "--recursive", action="store_true", help="Обходить вложенные папки"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Кодировать заново уже закодированные"
+    )
+    parser.add_argument("--cache-dir", default=EMBEDDINGS_DIR, help="Папка кэша эмбеддингов")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    try:
+        import segment_anything  # noqa: F401
+        import torch  # noqa: F401
+    except ImportError as e:
+        print(f"Не установлены зависимости SAM: {e}")
+        return 1
+
+    model_path = args.checkpoint
+    if model_path is None:
+        model_path = SAMIntegration()._find_model_file(args.model)
+        if model_path is None:
+            print("Файл модели SAM не найден. Поместите веса в папку models/")
+            return 1
+
+    if args.benchmark:
+        sam = SAMIntegration()
+        sam.load_model_sync(model_path, "cpu", encoder_mode="fp32", threads=args.threads)
+        print(sam.run_encoder_benchmark())
+        return 0
+
+    if not args.folder:
+        print("Не указана папка с изображениями")
+        return 1
+
+    image_files = FileManager().get_image_files(args.folder, args.recursive)
+    if not image_files:
+        print(f"В папке нет поддерживаемых изображений: {args.folder}")
+        return 1
+
+    model_type = SAMIntegration()._get_model_type(model_path)
+    model_id = embedding_model_id(model_type, args.encoder_mode)
+    cache = EmbeddingCache(args.cache_dir)
+    image_paths = [os.path.join(args.folder, name) for name in image_files]
+
+    # Продолжение: файлы, хэш которых известен и эмбеддинг которых уже есть,
+    # пропускаются без чтения
+    if not args.force:
+        pending = []
+        for path in image_paths:
+            key = cache.lookup_file_key(path)
+            if key is None or not cache.contains(key, model_id, SAM_IMAGE_SIZE):
+                pending.append(path)
+        skipped = len(image_paths) - len(pending)
+        image_paths = pending
+    else:
+        skipped = 0
+
+    print(
+        f"Изображений: {len(image_files)}, уже закодировано: {skipped}, "
+        f"к кодированию: {len(image_paths)} ({model_id}, процессов: {args.workers})"
+    )
+    if not image_paths:
+        return 0
+
+    start_time = time.perf_counter()
+    encoded = 0
+    errors = 0
+    processed = 0
+
+    with ProcessPoolExecutor(
+        max_workers=max(1, args.workers),
+        initializer=_init_worker,
+        initargs=(model_path, args.device, args.encoder_mode, args.threads, args.cache_dir),
+    ) as executor:
+        futures = {executor.submit(_embed_file, path, args.force): path for path in image_paths}
+        try:
+            for future in as_completed(futures):
+                processed += 1
+                try:
+                    image_path, key, was_encoded, seconds = future.result()
+                except Exception as e:
+                    errors += 1
+                    print(f"[{processed}/{len(image_paths)}] Ошибка {futures[future]}: {e}")
+                    continue
+
+                cache.remember_file_key(image_path, key, save=False)
+                encoded += was_encoded
+                status = f"{seconds:.1f} с" if was_encoded else "уже в кэше"
+                print(f"[{processed}/{len(image_paths)}] {os.path.basename(image_path)}: {status}")
+
+                if processed % SAVE_INTERVAL == 0:
+                    cache.save_file_keys()
+        except KeyboardInterrupt:
+            print("Прервано, уже закодированные изображения сохранены")
+            for future in futures:
+                future.cancel()
+        finally:
+            cache.save_file_keys()
+
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"Готово: закодировано {encoded}, ошибок {errors}, "
+        f"время {elapsed:.0f} с ({elapsed / max(processed, 1):.1f} с на изображение)"
+    )
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
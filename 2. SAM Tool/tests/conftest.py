@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули инструмента импортируются от корня папки (import config, core.*, utils.*)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
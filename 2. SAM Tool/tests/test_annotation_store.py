@@ -0,0 +1,102 @@
+import json
+
+import numpy as np
+import pytest
+
+from core.annotation_store import AnnotationStore
+from utils.mask_codec import CompactMask
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = AnnotationStore(str(tmp_path / "annotations.sqlite"))
+    yield store
+    store.close()
+
+
+def _mask(shape, y0, y1, x0, x1):
+    mask = np.zeros(shape, dtype=np.uint8)
+    mask[y0:y1, x0:x1] = 255
+    return mask
+
+
+def test_save_load_round_trip(store):
+    annotations = [
+        {
+            "class": "cat",
+            "points": [(12, 15), (20, 18)],
+            "mask": _mask((40, 60), 10, 20, 5, 25),
+            "type": "point",
+            "timestamp": "2024-01-01T10:00:00",
+            "sam_score": 0.93,
+        },
+        {"class": "dog", "points": [(1, 2), (30, 35)], "mask": None, "type": "box"},
+    ]
+    store.save_image("a.png", annotations)
+
+    loaded = store.load_image("a.png")
+    assert [ann["class"] for ann in loaded] == ["cat", "dog"]
+    assert loaded[0]["points"] == [(12, 15), (20, 18)]
+    assert loaded[0]["timestamp"] == "2024-01-01T10:00:00"
+    assert loaded[0]["sam_score"] == pytest.approx(0.93)
+    assert isinstance(loaded[0]["mask"], CompactMask)
+    np.testing.assert_array_equal(loaded[0]["mask"].to_array(), annotations[0]["mask"])
+    assert loaded[1]["mask"] is None
+    assert "sam_score" not in loaded[1]
+
+
+def test_save_replaces_image_annotations(store):
+    store.save_image("a.png", [{"class": "cat", "points": [(1, 1)], "mask": None, "type": "point"}])
+    store.save_image("a.png", [])
+
+    assert store.has_image("a.png")
+    assert store.load_image("a.png") == []
+    assert store.load_image("missing.png") == []
+    assert not store.has_image("missing.png")
+
+
+def test_save_images_writes_meta_and_queries(store):
+    mask = _mask((40, 60), 10, 20, 5, 25)
+    store.save_images(
+        {
+            "a.png": [{"class": "cat", "points": [], "mask": mask, "type": "point"}],
+            "b.png": [{"class": "dog", "points": [(1, 2), (30, 35)], "mask": None, "type": "box"}],
+        },
+        image_shapes={"b.png": (100, 200)},
+        meta={"journal_sequence": 7},
+    )
+
+    assert store.get_meta("journal_sequence") == "7"
+    rows = store.bbox_rows()
+    boxes = [
+        (row["filename"], row["x_min"], row["y_min"], row["x_max"], row["y_max"]) for row in rows
+    ]
+    assert boxes == [("a.png", 5, 10, 24, 19), ("b.png", 1, 2, 30, 35)]
+    assert (rows[0]["image_width"], rows[0]["image_height"]) == (60, 40)
+    assert (rows[1]["image_width"], rows[1]["image_height"]) == (200, 100)
+    assert [row["class"] for row in store.bbox_rows(class_name="dog")] == ["dog"]
+
+    statistics = store.statistics()
+    assert statistics["images"] == 2
+    assert statistics["annotations"] == 2
+    assert statistics["by_type"] == {"box": 1, "point": 1}
+
+
+def test_import_json_sidecars_skips_known_images(tmp_path, store):
+    class FileManager:
+        def load_annotations_json(self, folder_path, filename):
+            with open(tmp_path / f"{filename}_annotations.json", encoding="utf-8") as f:
+                return json.load(f)
+
+    for filename in ("a.png", "b.png"):
+        (tmp_path / f"{filename}_annotations.json").write_text(
+            json.dumps([{"class": filename, "points": [[1, 2]], "mask": None, "type": "point"}]),
+            encoding="utf-8",
+        )
+    store.save_image("b.png", [])
+
+    imported = store.import_json_sidecars(str(tmp_path), ["a.png", "b.png", "c.png"], FileManager())
+
+    assert imported == 1
+    assert [ann["class"] for ann in store.load_image("a.png")] == ["a.png"]
+    assert store.load_image("b.png") == []
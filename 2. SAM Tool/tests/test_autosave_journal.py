@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+import pytest
+
+from core import autosave_journal
+from core.annotation_store import AnnotationStore
+from core.autosave_journal import JOURNAL_SEQUENCE_KEY, AutosaveJournal
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = AnnotationStore(str(tmp_path / "annotations.sqlite"))
+    yield store
+    store.close()
+
+
+def _annotation(class_name):
+    mask = np.zeros((40, 60), dtype=np.uint8)
+    mask[10:20, 5:25] = 255
+    return {"class": class_name, "points": [(12, 15)], "mask": mask, "type": "point"}
+
+
+def test_replay_stops_at_truncated_last_line(tmp_path, store):
+    journal_path = tmp_path / "annotations.journal"
+    records = [
+        {"seq": 1, "op": "add", "image": "a.png", "annotation": _annotation("cat")},
+        {"seq": 2, "op": "add", "image": "a.png", "annotation": _annotation("dog")},
+        {"seq": 3, "op": "delete", "image": "a.png", "index": 0},
+    ]
+    lines = [
+        json.dumps(autosave_journal._encode_record(record), ensure_ascii=False)
+        for record in records
+    ]
+    # Последняя строка оборвана при сбое
+    journal_path.write_text("\n".join(lines[:2]) + "\n" + lines[2][:10], encoding="utf-8")
+
+    journal = AutosaveJournal(str(journal_path), store)
+    journal.close()
+
+    assert journal.replayed == 2
+    annotations = store.load_image("a.png")
+    assert [ann["class"] for ann in annotations] == ["cat", "dog"]
+    assert annotations[0]["mask"].area == 200
+    assert int(store.get_meta(JOURNAL_SEQUENCE_KEY)) == 2
+    assert journal_path.read_text(encoding="utf-8") == ""
+
+
+def test_replay_skips_records_already_in_store(tmp_path, store):
+    journal_path = tmp_path / "annotations.journal"
+    journal = AutosaveJournal(str(journal_path), store, compact_records=1000)
+    journal.add("a.png", _annotation("cat"))
+    journal.checkpoint()
+    lines = [json.dumps({"seq": 1, "op": "undo", "image": "a.png"})]
+    journal.close()
+
+    # Журнал с записью, уже перенесенной в базу, не применяется повторно
+    journal_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    journal = AutosaveJournal(str(journal_path), store)
+    journal.close()
+
+    assert journal.replayed == 0
+    assert [ann["class"] for ann in store.load_image("a.png")] == ["cat"]
+
+
+def test_failed_append_is_kept_and_reported(tmp_path, store, monkeypatch):
+    errors = []
+    journal = AutosaveJournal(
+        str(tmp_path / "annotations.journal"),
+        store,
+        compact_records=1000,
+        error_callback=errors.append,
+    )
+
+    def failing_fsync(fd):
+        raise OSError("диск переполнен")
+
+    monkeypatch.setattr(autosave_journal.os, "fsync", failing_fsync)
+    journal.add("a.png", _annotation("cat"))
+    journal.add("a.png", _annotation("dog"))
+    journal.undo("a.png")
+    journal.close()
+
+    # Записи, не попавшие в файл, переносятся в базу при закрытии
+    assert len(errors) == 1
+    assert [ann["class"] for ann in store.load_image("a.png")] == ["cat"]
+    assert int(store.get_meta(JOURNAL_SEQUENCE_KEY)) == 3
@@ -0,0 +1,94 @@
+import cv2
+import numpy as np
+import pytest
+
+from utils.mask_codec import CompactMask, _decode_counts, _encode_counts, as_compact_mask
+
+
+def _reference_counts(mask):
+    """Счетчики COCO RLE напрямую по пикселям (по столбцам, начиная с нулей)"""
+    flat = (np.asarray(mask) > 0).reshape(-1, order="F")
+    counts, current, run = [], False, 0
+    for value in flat:
+        if value != current:
+            counts.append(run)
+            current, run = value, 0
+        run += 1
+    counts.append(run)
+    return counts
+
+
+def _random_masks(count=200, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        height, width = rng.integers(1, 40, size=2)
+        mask = np.zeros((height, width), dtype=np.uint8)
+        for _ in range(rng.integers(0, 4)):
+            y0, x0 = rng.integers(0, height), rng.integers(0, width)
+            y1, x1 = rng.integers(y0, height + 1), rng.integers(x0, width + 1)
+            mask[y0:y1, x0:x1] = 255
+        if rng.random() < 0.3:
+            mask[rng.random(mask.shape) < 0.1] = 255
+        yield mask
+
+
+def test_rle_matches_reference_and_round_trips():
+    for mask in _random_masks():
+        compact = CompactMask.from_array(mask)
+        rle = compact.to_rle()
+
+        assert rle["size"] == list(mask.shape)
+        assert _decode_counts(rle["counts"]) == _reference_counts(mask)
+        np.testing.assert_array_equal(CompactMask.from_rle(rle).to_array(value=1), mask > 0)
+        np.testing.assert_array_equal(compact.to_array(value=1), mask > 0)
+
+
+def test_rle_string_encoding():
+    mask = np.zeros((3, 3), dtype=np.uint8)
+    mask[1, 1] = 1
+
+    assert CompactMask.from_array(mask).to_rle()["counts"] == "414"
+    for counts in ([9], [0, 9], [4, 1, 4], [100, 3, 2000, 70000, 1, 5]):
+        assert _decode_counts(_encode_counts(counts)) == counts
+
+
+def test_from_rle_accepts_uncompressed_counts():
+    mask = np.zeros((5, 4), dtype=np.uint8)
+    mask[0:2, 1:3] = 1
+
+    compact = CompactMask.from_rle({"size": [5, 4], "counts": _reference_counts(mask)})
+
+    np.testing.assert_array_equal(compact.to_array(value=1), mask)
+    assert compact.bbox == [1, 0, 2, 1]
+    assert compact.area == 4
+
+
+def test_empty_mask():
+    compact = as_compact_mask(np.zeros((6, 7), dtype=np.uint8))
+
+    assert compact.is_empty()
+    assert compact.area == 0
+    assert compact.to_rle()["counts"] == _encode_counts([42])
+    assert CompactMask.from_rle(compact.to_rle()).is_empty()
+
+
+def test_polygon_matches_fill_poly():
+    points = [(3, 2), (25, 5), (18, 30), (1, 20)]
+    expected = np.zeros((28, 24), dtype=np.uint8)
+    cv2.fillPoly(expected, [np.array(points, dtype=np.int32)], 1)
+
+    compact = CompactMask.from_polygon(points, (28, 24))
+
+    np.testing.assert_array_equal(compact.to_array(value=1), expected)
+
+
+def test_rle_matches_pycocotools():
+    mask_utils = pytest.importorskip("pycocotools.mask")
+
+    for mask in _random_masks(count=100, seed=1):
+        expected = mask_utils.encode(np.asfortranarray((mask > 0).astype(np.uint8)))
+        counts = expected["counts"].decode("ascii")
+
+        assert CompactMask.from_array(mask).to_rle()["counts"] == counts
+        decoded = CompactMask.from_rle({"size": list(expected["size"]), "counts": counts})
+        np.testing.assert_array_equal(decoded.to_array(value=1), mask_utils.decode(expected))
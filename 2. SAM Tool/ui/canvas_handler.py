@@ -39,6 +39,7 @@ class CanvasHandler:
         self.canvas.bind("<Button-1>", handlers.get("canvas_click"))
         self.canvas.bind("<Button-3>", handlers.get("canvas_right_click"))
         self.canvas.bind("<Motion>", handlers.get("canvas_motion"))
+        self.canvas.bind("<Leave>", handlers.get("canvas_leave"))
 
     def get_canvas_size(self):
         """Получение размеров Canvas"""
@@ -50,6 +51,15 @@ class CanvasHandler:
         self.canvas.create_image(10, 10, anchor=tk.NW, image=photo)
         self.canvas.configure(scrollregion=self.canvas.bbox("all"))
 
+    def show_overlay(self, photo, x, y):
+        """Полупрозрачный слой поверх изображения (x, y - смещение на изображении)"""
+        self.canvas.delete("overlay")
+        self.canvas.create_image(10 + x, 10 + y, anchor=tk.NW, image=photo, tags="overlay")
+
+    def clear_overlay(self):
+        """Удаление слоя поверх изображения"""
+        self.canvas.delete("overlay")
+
     def canvas_to_image_coords(self, event, canvas_scale):
         """Преобразование координат Canvas в координаты изображения"""
         canvas_x = self.canvas.canvasx(event.x) - 10
@@ -16,6 +16,7 @@ class MainWindow:
         self.root = root
         self.app = app
         self.current_photo = None
+        self.preview_photo = None
         self.event_handlers = {}
         self.selected_class = tk.StringVar(value="car")
         self.mode_var = tk.StringVar(value="manual")
@@ -77,6 +78,28 @@ class MainWindow:
 
         self.canvas_handler.display_image(self.current_photo)
 
+    def show_hover_preview(self, mask, color, alpha):
+        """Полупрозрачная маска-кандидат (размер изображения на экране) поверх Canvas"""
+        x, y, w, h = cv2.boundingRect(mask.view(np.uint8))
+        if w == 0 or h == 0:
+            self.clear_hover_preview()
+            return
+
+        # Слой строится только по рамке маски, изображение не перерисовывается
+        mask = np.ascontiguousarray(mask[y:y + h, x:x + w]).view(np.uint8)
+        overlay = np.zeros((h, w, 4), dtype=np.uint8)
+        overlay[mask > 0] = (*color, int(255 * alpha))
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        cv2.drawContours(overlay, contours, -1, (*color, 255), 2)
+
+        self.preview_photo = ImageTk.PhotoImage(Image.fromarray(overlay, "RGBA"))
+        self.canvas_handler.show_overlay(self.preview_photo, x, y)
+
+    def clear_hover_preview(self):
+        """Удаление маски-кандидата"""
+        self.canvas_handler.clear_overlay()
+        self.preview_photo = None
+
     def canvas_to_image_coords(self, event, canvas_scale):
         """Преобразование координат Canvas в координаты изображения"""
         return self.canvas_handler.canvas_to_image_coords(event, canvas_scale)
@@ -85,6 +108,10 @@ class MainWindow:
         """Обновление статусной строки"""
         self.bottom_panel.update_status(message)
 
+    def set_busy(self, busy):
+        """Индикатор фоновой работы SAM (окно при этом остается отзывчивым)"""
+        self.bottom_panel.set_busy(busy)
+
     def set_progress(self, value):
         """Установка значения прогресс-бара"""
         self.progress_var.set(value)
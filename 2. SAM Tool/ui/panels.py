@@ -56,6 +56,10 @@ class TopPanel:
                                 bg='#9C27B0', fg='white', 
                                 font=('Arial', 10, 'bold'))
         self.xml_btn.pack(side=tk.RIGHT, padx=5)
+        
+        self.stats_btn = tk.Button(save_frame, text="Статистика",
+                                  font=('Arial', 10))
+        self.stats_btn.pack(side=tk.RIGHT, padx=5)
     
     def bind_handlers(self, handlers):
         """Привязка обработчиков событий"""
@@ -67,6 +71,7 @@ class TopPanel:
         self.next_btn.config(command=handlers.get('next_image'))
         self.xml_btn.config(command=handlers.get('save_xml'))
         self.csv_btn.config(command=handlers.get('export_csv'))
+        self.stats_btn.config(command=handlers.get('show_statistics'))
 
 
 class RightPanel:
@@ -261,8 +266,16 @@ class BottomPanel:
         self.progress_bar = ttk.Progressbar(self.frame, variable=self.main_window.progress_var,
                                            maximum=100, length=200)
         self.progress_bar.pack(side=tk.RIGHT, pady=5, padx=10)
+        
+        self.busy_label = tk.Label(self.frame, text="", fg='#1565C0',
+                                  bg=UI_CONFIG['panel_bg'], font=('Arial', 9))
+        self.busy_label.pack(side=tk.RIGHT, pady=5)
     
     def update_status(self, message):
         """Обновление статуса"""
         self.status_label.config(text=message)
-        self.root.update_idletasks()
\ No newline at end of file
+        self.root.update_idletasks()
+    
+    def set_busy(self, busy):
+        """Индикатор выполнения запросов SAM"""
+        self.busy_label.config(text="SAM: обработка..." if busy else "")
\ No newline at end of file
@@ -1,20 +1,13 @@
 import cv2
-import numpy as np
+from utils.mask_codec import CompactMask, as_compact_mask
 
 class AnnotationUtils:
     """Утилиты для аннотаций"""
     
     @staticmethod
     def points_to_mask(points, image_shape):
-        """Преобразование точек в маску"""
-        img_height, img_width = image_shape
-        mask = np.zeros((img_height, img_width), dtype=np.uint8)
-        
-        if len(points) >= 3:
-            pts = np.array(points, dtype=np.int32)
-            cv2.fillPoly(mask, [pts], 255)
-        
-        return mask
+        """Преобразование точек в маску (CompactMask)"""
+        return CompactMask.from_polygon(points, image_shape)
     
     @staticmethod
     def draw_annotations(image, annotations, canvas_scale, class_colors):
@@ -34,14 +27,19 @@ class AnnotationUtils:
             
             elif 'mask' in ann and ann['mask'] is not None:
                 
-                mask = cv2.resize(ann['mask'].astype(np.uint8), 
-                                (image.shape[1], image.shape[0]))
-                colored_mask = np.zeros_like(display_image)
-                colored_mask[mask > 0] = color
-                display_image = cv2.addWeighted(display_image, 0.7, colored_mask, 0.3, 0)
+                # Масштабируется и закрашивается только рамка маски
+                scaled = as_compact_mask(ann['mask']).scaled_crop(canvas_scale, image.shape)
+                if scaled is None:
+                    continue
+                x, y, mask = scaled
+                roi = display_image[y:y + mask.shape[0], x:x + mask.shape[1]]
                 
+                colored_mask = roi.copy()
+                colored_mask[mask > 0] = color
+                roi[mask > 0] = cv2.addWeighted(roi, 0.7, colored_mask, 0.3, 0)[mask > 0]
                 
-                contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                               offset=(x, y))
                 cv2.drawContours(display_image, contours, -1, color, 2)
         
         return display_image
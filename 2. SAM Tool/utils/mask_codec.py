@@ -0,0 +1,224 @@
+import cv2
+import numpy as np
+
+
+class CompactMask:
+    """Бинарная маска, обрезанная по рамке объекта и упакованная по битам.
+
+    Вместо полного кадра uint8 хранится только рамка (x, y, ширина, высота)
+    и np.packbits ее содержимого: для объекта на снимке 20 Мп это килобайты
+    вместо 20 МБ. Полная маска собирается только по запросу (to_array),
+    отрисовка и экспорт работают с обрезанной частью. На диске маска
+    хранится в формате COCO RLE (to_rle / from_rle).
+    """
+
+    def __init__(self, shape, bbox, bits):
+        self.shape = tuple(int(v) for v in shape[:2])
+        self.x, self.y, self.width, self.height = (int(v) for v in bbox)
+        self.bits = bits
+
+    @classmethod
+    def from_array(cls, mask):
+        """Маска из массива (ненулевые пиксели - объект)"""
+        mask = np.asarray(mask)
+        binary = (mask > 0).astype(np.uint8)
+        x, y, width, height = cv2.boundingRect(binary)
+        return cls._from_crop(mask.shape, x, y, binary[y : y + height, x : x + width])
+
+    @classmethod
+    def from_polygon(cls, points, shape):
+        """Маска многоугольника (рисуется только в его рамке)"""
+        height, width = shape[:2]
+        if len(points) < 3:
+            return cls(shape, (0, 0, 0, 0), np.zeros(0, dtype=np.uint8))
+
+        pts = np.array([(p[0], p[1]) for p in points], dtype=np.int32)
+        x_min, y_min = np.maximum(pts.min(axis=0), 0)
+        x_max = min(int(pts[:, 0].max()), width - 1)
+        y_max = min(int(pts[:, 1].max()), height - 1)
+        if x_max < x_min or y_max < y_min:
+            return cls(shape, (0, 0, 0, 0), np.zeros(0, dtype=np.uint8))
+
+        crop = np.zeros((y_max - y_min + 1, x_max - x_min + 1), dtype=np.uint8)
+        cv2.fillPoly(crop, [pts - (x_min, y_min)], 1)
+
+        # Рамка по фактически закрашенным пикселям
+        x, y, crop_width, crop_height = cv2.boundingRect(crop)
+        crop = crop[y : y + crop_height, x : x + crop_width]
+        return cls._from_crop(shape, x_min + x, y_min + y, crop)
+
+    @classmethod
+    def _from_crop(cls, shape, x, y, crop):
+        height, width = crop.shape
+        return cls(shape, (x, y, width, height), np.packbits(crop, axis=None))
+
+    @property
+    def area(self):
+        """Число пикселей объекта"""
+        return int(self.crop().sum())
+
+    @property
+    def bbox(self):
+        """Рамка [x_min, y_min, x_max, y_max] (включительно, как _mask_to_bbox)"""
+        if self.is_empty():
+            return [0, 0, 1, 1]
+        return [self.x, self.y, self.x + self.width - 1, self.y + self.height - 1]
+
+    def is_empty(self):
+        return self.width == 0 or self.height == 0
+
+    def crop(self):
+        """Содержимое рамки: uint8 0/1 размера (высота, ширина) рамки"""
+        count = self.width * self.height
+        crop = np.unpackbits(self.bits, count=count) if count else np.zeros(0, dtype=np.uint8)
+        return crop.reshape(self.height, self.width)
+
+    def to_array(self, value=255):
+        """Маска полного кадра uint8 (0 / value)"""
+        mask = np.zeros(self.shape, dtype=np.uint8)
+        if not self.is_empty():
+            mask[self.y : self.y + self.height, self.x : self.x + self.width] = (
+                self.crop() * value
+            )
+        return mask
+
+    def __array__(self, dtype=None, copy=None):
+        # Совместимость с кодом, который работает с маской как с массивом
+        mask = self.to_array()
+        return mask if dtype is None else mask.astype(dtype)
+
+    def scaled_crop(self, scale, image_shape):
+        """Рамка на изображении масштаба scale: (x, y, маска uint8 0/255) или None.
+
+        Масштабируется только содержимое рамки, результат обрезан
+        по размеру image_shape (высота, ширина) изображения на экране.
+        """
+        if self.is_empty():
+            return None
+
+        image_height, image_width = image_shape[:2]
+        x0, y0 = int(self.x * scale), int(self.y * scale)
+        x1 = min(max(int(np.ceil((self.x + self.width) * scale)), x0 + 1), image_width)
+        y1 = min(max(int(np.ceil((self.y + self.height) * scale)), y0 + 1), image_height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+
+        scaled = cv2.resize(self.crop() * 255, (x1 - x0, y1 - y0))
+        return x0, y0, scaled
+
+    def contours(self):
+        """Внешние контуры в координатах полного кадра"""
+        if self.is_empty():
+            return []
+        # Рамка с полем в 1 пиксель, чтобы контуры на краю рамки были замкнуты
+        crop = cv2.copyMakeBorder(self.crop(), 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+        contours, _ = cv2.findContours(
+            crop, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(self.x - 1, self.y - 1)
+        )
+        return contours
+
+    def to_rle(self):
+        """COCO RLE: {"size": [высота, ширина], "counts": строка} (как в pycocotools)"""
+        height, width = self.shape
+        total = height * width
+        if self.is_empty():
+            return {"size": [height, width], "counts": _encode_counts([total])}
+
+        # Пиксели по столбцам (порядок COCO), только столбцы рамки
+        columns = np.zeros((self.width, height), dtype=np.uint8)
+        columns[:, self.y : self.y + self.height] = self.crop().T
+        flat = columns.reshape(-1)
+
+        changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+        counts = np.diff(np.concatenate([[0], changes, [flat.size]])).tolist()
+        if flat[0]:
+            counts.insert(0, 0)
+
+        # Нули столбцов слева и справа от рамки
+        counts[0] += self.x * height
+        trailing = (width - self.x - self.width) * height
+        if len(counts) % 2:
+            counts[-1] += trailing
+        elif trailing:
+            counts.append(trailing)
+
+        return {"size": [height, width], "counts": _encode_counts(counts)}
+
+    @classmethod
+    def from_rle(cls, rle):
+        """Маска из COCO RLE (counts - строка или список)"""
+        height, width = rle["size"]
+        counts = rle["counts"]
+        if isinstance(counts, str):
+            counts = _decode_counts(counts)
+        counts = np.asarray(counts, dtype=np.int64)
+
+        bounds = np.cumsum(counts)
+        starts, ends = bounds[0:-1:2], bounds[1::2]
+        keep = ends > starts
+        starts, ends = starts[keep], ends[keep]
+        if not len(starts):
+            return cls((height, width), (0, 0, 0, 0), np.zeros(0, dtype=np.uint8))
+
+        # Собираются только столбцы, в которых есть объект
+        first_column, last_column = starts[0] // height, (ends[-1] - 1) // height
+        offset = first_column * height
+        size = (last_column - first_column + 1) * height
+        marks = np.zeros(size + 1, dtype=np.int32)
+        np.add.at(marks, starts - offset, 1)
+        np.add.at(marks, ends - offset, -1)
+        columns = (np.cumsum(marks[:-1]) > 0).astype(np.uint8)
+        region = columns.reshape(-1, height).T
+
+        rows = np.flatnonzero(region.any(axis=1))
+        crop = region[rows[0] : rows[-1] + 1]
+        return cls._from_crop((height, width), int(first_column), int(rows[0]), crop)
+
+
+def as_compact_mask(mask):
+    """CompactMask из CompactMask, массива или COCO RLE"""
+    if isinstance(mask, CompactMask):
+        return mask
+    if isinstance(mask, dict):
+        return CompactMask.from_rle(mask)
+    return CompactMask.from_array(mask)
+
+
+def _encode_counts(counts):
+    """Счетчики RLE -> сжатая строка COCO (rleToString из pycocotools)"""
+    chars = []
+    for i, value in enumerate(counts):
+        x = int(value)
+        if i > 2:
+            x -= int(counts[i - 2])
+        more = True
+        while more:
+            c = x & 0x1F
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            chars.append(chr(c + 48))
+    return "".join(chars)
+
+
+def _decode_counts(text):
+    """Сжатая строка COCO -> счетчики RLE (rleFrString из pycocotools)"""
+    counts = []
+    position = 0
+    while position < len(text):
+        x = 0
+        shift = 0
+        more = True
+        while more:
+            c = ord(text[position]) - 48
+            x |= (c & 0x1F) << shift
+            more = c & 0x20
+            position += 1
+            shift += 5
+            if not more and c & 0x10:
+                x |= -1 << shift
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return counts
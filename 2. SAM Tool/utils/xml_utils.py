@@ -1,7 +1,7 @@
 import xml.etree.ElementTree as ET
 import cv2
-import numpy as np
 import os
+from utils.mask_codec import as_compact_mask
 
 
 class XMLUtils:
@@ -86,14 +86,7 @@ class XMLUtils:
     @staticmethod
     def _mask_to_bbox(mask):
         """Получение bbox из маски"""
-        coords = np.where(mask > 0)
-        if len(coords[0]) == 0:
-            return [0, 0, 1, 1]
-
-        y_min, y_max = coords[0].min(), coords[0].max()
-        x_min, x_max = coords[1].min(), coords[1].max()
-
-        return [x_min, y_min, x_max, y_max]
+        return as_compact_mask(mask).bbox
 
     @staticmethod
     def _points_to_bbox(points):
@@ -109,7 +102,7 @@ class XMLUtils:
     @staticmethod
     def _mask_to_polygons(mask):
         """Преобразование маски в полигоны"""
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        contours = as_compact_mask(mask).contours()
         polygons = []
 
         for contour in contours:
@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from sprites import SpritePyramid, load_sprite
+
+
+ATLAS_VERSION = 2
+ALIGNMENT = 64
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime, stat.st_size]
+
+
+class AssetAtlas:
+    """Упакованный атлас объектов: все уровни пирамид в одном бинарном файле.
+
+    Файл ``<имя>.bin`` открывается через ``np.memmap`` только для чтения, поэтому
+    любое число рабочих процессов использует одни и те же страницы из кэша ОС
+    без декодирования PNG и без копирования в память процесса. Индекс
+    ``<имя>.json`` хранит для каждого объекта категорию, подпись исходного
+    файла, смещения/размеры уровней и статистику цвета Lab (среднее, СКО).
+    """
+
+    def __init__(self, atlas_path):
+        self.atlas_path = atlas_path
+        with open(self.index_path(atlas_path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+
+        if index.get('version') != ATLAS_VERSION:
+            raise ValueError(f"Неподдерживаемая версия атласа: {index.get('version')}")
+        self.sprites = index['sprites']
+        self._data = None
+        self._pyramids = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def index_path(atlas_path):
+        return os.path.splitext(atlas_path)[0] + '.json'
+
+    def __getstate__(self):
+        return {'atlas_path': self.atlas_path}
+
+    def __setstate__(self, state):
+        self.__init__(state['atlas_path'])
+
+    @property
+    def data(self):
+        if self._data is None:
+            if os.path.getsize(self.atlas_path) == 0:
+                self._data = np.zeros(0, dtype=np.uint8)
+            else:
+                self._data = np.memmap(self.atlas_path, dtype=np.uint8, mode='r')
+        return self._data
+
+    def get(self, object_path):
+        """Пирамида объекта из атласа (представления памяти без копирования) или None"""
+        pyramid = self._pyramids.get(object_path)
+        if pyramid is not None:
+            return pyramid
+
+        entry = self.sprites.get(object_path)
+        if entry is None or not entry['levels']:
+            return None
+
+        levels = []
+        for offset, h, w, c in entry['levels']:
+            levels.append(self.data[offset:offset + h * w * c].reshape(h, w, c))
+
+        color_stats = entry.get('color_stats')
+        if color_stats is not None:
+            color_stats = tuple(np.array(values, dtype=np.float32) for values in color_stats)
+
+        pyramid = SpritePyramid.from_levels(levels, color_stats)
+        with self._lock:
+            self._pyramids[object_path] = pyramid
+        return pyramid
+
+    def is_current(self, asset_objects):
+        """Проверка, что атлас содержит ровно эти объекты и они не менялись"""
+        paths = {path for objects in asset_objects.values() for path in objects}
+        if paths != set(self.sprites):
+            return False
+        try:
+            return all(entry['signature'] == _signature(path) for path, entry in self.sprites.items())
+        except OSError:
+            return False
+
+    @classmethod
+    def pack(cls, asset_objects, atlas_path, progress_callback=None):
+        """Упаковка всех объектов (обрезанных по прозрачности) с пирамидами в атлас"""
+        sprites = {}
+        offset = 0
+        total = sum(len(objects) for objects in asset_objects.values())
+        done = 0
+
+        tmp_path = f"{atlas_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            for category, objects in asset_objects.items():
+                for object_path in objects:
+                    done += 1
+                    image = load_sprite(object_path)
+                    pyramid = SpritePyramid(image) if image is not None else None
+                    pyramid_levels = pyramid.levels if pyramid is not None else []
+                    color_stats = None
+                    if pyramid is not None and pyramid.color_stats is not None:
+                        color_stats = [values.tolist() for values in pyramid.color_stats]
+
+                    levels = []
+                    for level in pyramid_levels:
+                        level = np.ascontiguousarray(level)
+                        padding = -offset % ALIGNMENT
+                        f.write(b'\0' * padding)
+                        offset += padding
+
+                        f.write(level.tobytes())
+                        levels.append([offset, *level.shape])
+                        offset += level.nbytes
+
+                    sprites[object_path] = {
+                        'category': category,
+                        'signature': _signature(object_path),
+                        'levels': levels,
+                        'color_stats': color_stats
+                    }
+
+                    if progress_callback:
+                        progress_callback(done, total)
+
+        os.replace(tmp_path, atlas_path)
+
+        index_path = cls.index_path(atlas_path)
+        with open(f"{index_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'version': ATLAS_VERSION, 'sprites': sprites}, f, ensure_ascii=False)
+        os.replace(f"{index_path}.tmp", index_path)
+
+        return cls(atlas_path)
+
+    @classmethod
+    def open_or_pack(cls, asset_objects, atlas_path, progress_callback=None):
+        """Открытие атласа, если он актуален, иначе пересборка"""
+        if os.path.exists(atlas_path) and os.path.exists(cls.index_path(atlas_path)):
+            try:
+                atlas = cls(atlas_path)
+                if atlas.is_current(asset_objects):
+                    return atlas
+            except (OSError, ValueError, KeyError):
+                pass
+
+        return cls.pack(asset_objects, atlas_path, progress_callback)
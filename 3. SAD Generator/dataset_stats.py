@@ -0,0 +1,147 @@
+import json
+import os
+from collections import Counter
+
+import numpy as np
+
+
+# Корзины площади рамок: корзина k — площадь в пикселях [2^k, 2^(k+1))
+AREA_BINS = 26
+
+
+class DatasetStatistics:
+    """Статистика датасета, накапливаемая по ходу генерации за один проход.
+
+    Хранятся только счетчики и гистограммы фиксированного размера (площади
+    рамок — по логарифмическим корзинам), поэтому память не растет с числом
+    изображений и аудит не требует повторного чтения разметки с диска.
+    Накопители разных процессов можно объединить через ``merge``.
+    """
+
+    def __init__(self, categories):
+        self.categories = list(categories)
+        num_classes = len(self.categories)
+
+        self.images = 0
+        self.empty_images = 0
+        self.failures = Counter()
+        self.rejections = Counter()
+        self.objects_per_image = Counter()
+        self.placement = Counter()
+        self.zones = Counter()
+        self.viewing_angles = Counter()
+
+        self.class_counts = np.zeros(num_classes, dtype=np.int64)
+        self.area_histogram = np.zeros((num_classes, AREA_BINS), dtype=np.int64)
+        self.relative_area_sum = np.zeros(num_classes, dtype=np.float64)
+        self.relative_area_sq_sum = np.zeros(num_classes, dtype=np.float64)
+
+    def add_image(self, image_shape, annotations, placement=None):
+        """Учет сохраненного изображения, его разметки и итогов размещения объектов"""
+        self.images += 1
+        self.objects_per_image[len(annotations)] += 1
+        if not annotations:
+            self.empty_images += 1
+        if placement:
+            self.placement.update(placement)
+
+        if not annotations:
+            return
+
+        image_area = float(image_shape[0] * image_shape[1])
+        class_ids = np.array([self.categories.index(ann['category']) for ann in annotations])
+        areas = np.array([ann['bbox']['width'] * ann['bbox']['height'] for ann in annotations], dtype=np.float64)
+        bins = np.clip(np.log2(np.maximum(areas, 1)).astype(np.intp), 0, AREA_BINS - 1)
+
+        np.add.at(self.class_counts, class_ids, 1)
+        np.add.at(self.area_histogram, (class_ids, bins), 1)
+        np.add.at(self.relative_area_sum, class_ids, areas / image_area)
+        np.add.at(self.relative_area_sq_sum, class_ids, (areas / image_area) ** 2)
+
+        for ann in annotations:
+            self.zones[ann.get('zone') or 'unknown'] += 1
+            self.viewing_angles[ann.get('viewing_angle') or 'unknown'] += 1
+
+    def add_failure(self, reason):
+        """Учет кадра, который не удалось сгенерировать или сохранить"""
+        self.failures[reason] += 1
+
+    def add_rejection(self, reason):
+        """Учет кадра, отбракованного до записи (пустой кадр, почти-дубликат)"""
+        self.rejections[reason] += 1
+
+    def merge(self, other):
+        """Добавление статистики другого накопителя с тем же списком классов"""
+        self.images += other.images
+        self.empty_images += other.empty_images
+        for name in ('failures', 'rejections', 'objects_per_image', 'placement', 'zones', 'viewing_angles'):
+            getattr(self, name).update(getattr(other, name))
+        self.class_counts += other.class_counts
+        self.area_histogram += other.area_histogram
+        self.relative_area_sum += other.relative_area_sum
+        self.relative_area_sq_sum += other.relative_area_sq_sum
+
+    @staticmethod
+    def _histogram_quantile(histogram, quantile):
+        """Приближенный квантиль площади по логарифмической гистограмме (нижняя граница корзины)"""
+        total = histogram.sum()
+        if total == 0:
+            return None
+        index = int(np.searchsorted(np.cumsum(histogram), quantile * total))
+        return 2 ** index
+
+    def report(self):
+        """Отчет в виде словаря, пригодного для JSON"""
+        attempts = self.images + sum(self.failures.values())
+        requested = self.placement.get('requested', 0)
+
+        classes = {}
+        for class_id, category in enumerate(self.categories):
+            count = int(self.class_counts[class_id])
+            if count == 0:
+                classes[category] = {'objects': 0}
+                continue
+
+            mean = self.relative_area_sum[class_id] / count
+            variance = max(self.relative_area_sq_sum[class_id] / count - mean * mean, 0.0)
+            histogram = self.area_histogram[class_id]
+            classes[category] = {
+                'objects': count,
+                'share': count / max(int(self.class_counts.sum()), 1),
+                'relative_area_mean': mean,
+                'relative_area_std': variance ** 0.5,
+                'area_px_p10': self._histogram_quantile(histogram, 0.1),
+                'area_px_p50': self._histogram_quantile(histogram, 0.5),
+                'area_px_p90': self._histogram_quantile(histogram, 0.9),
+                'area_px_histogram': {f"{2 ** k}-{2 ** (k + 1)}": int(n) for k, n in enumerate(histogram) if n}
+            }
+
+        return {
+            'images': self.images,
+            'empty_images': self.empty_images,
+            'objects': int(self.class_counts.sum()),
+            'objects_per_image': {str(k): v for k, v in sorted(self.objects_per_image.items())},
+            'classes': classes,
+            'zones': dict(self.zones.most_common()),
+            'viewing_angles': dict(self.viewing_angles.most_common()),
+            'placement': dict(self.placement),
+            'object_rejection_rate': 1 - self.placement.get('placed', 0) / requested if requested else 0.0,
+            'failures': dict(self.failures),
+            'image_failure_rate': sum(self.failures.values()) / attempts if attempts else 0.0,
+            'rejected_frames': dict(self.rejections)
+        }
+
+    def save(self, report_path):
+        """Запись отчета в JSON"""
+        tmp_path = f"{report_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, report_path)
+
+    def summary(self):
+        """Краткая сводка для лога"""
+        report = self.report()
+        return (f"Изображений: {report['images']} (без объектов: {report['empty_images']}), "
+                f"объектов: {report['objects']}, отказов размещения: {report['object_rejection_rate']:.1%}, "
+                f"сбоев кадров: {report['image_failure_rate']:.1%}, "
+                f"отбраковано кадров: {sum(self.rejections.values())}")
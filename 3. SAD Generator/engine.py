@@ -0,0 +1,613 @@
+import cv2
+import numpy as np
+import random
+from collections import Counter
+
+from harmonization import EMISSIVE_CATEGORIES, attach_zone_color_stats, harmonize
+from perspective import DEFAULT_OBJECT_SIZE_M, OBJECT_SIZES_M, GroundSamplingModel, load_scene_metadata
+from shadows import CANOPY_CATEGORIES, NO_SHADOW_CATEGORIES, ShadowCache, composite_object, sample_canopy, shadow_offset
+from sprites import SpriteCache
+
+
+ZONE_TYPES = ['sky', 'road', 'forest', 'field', 'water', 'building', 'ground', 'snow']
+
+DEFAULT_CATEGORIES = ['vehicles', 'people', 'animals', 'fire', 'smoke', 'trees', 'aircraft', 'boats']
+
+# Ракурс определяется по копии кадра с такой длинной стороной
+ANGLE_ANALYSIS_SIZE = 320
+
+# Порог модуля градиента Собеля для учета пикселя как границы
+EDGE_MAGNITUDE_THRESHOLD = 150.0
+
+# Доля горизонтальных границ, при которой кадр с небом считается видом сбоку
+HORIZONTAL_EDGE_SHARE = 0.25
+
+
+def edge_orientation_shares(gray, bins=36):
+    """Доли горизонтальных и вертикальных границ по гистограмме направлений градиента.
+
+    Гистограмма взвешена модулем градиента и строится только по сильным
+    границам. Горизонтальной линии соответствует градиент под 90°±10°,
+    вертикальной — под 0°±10° (или 180°).
+    """
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+    magnitude, angle = cv2.cartToPolar(gx, gy, angleInDegrees=True)
+
+    strong = magnitude > EDGE_MAGNITUDE_THRESHOLD
+    if not np.any(strong):
+        return 0.0, 0.0
+
+    bin_width = 180.0 / bins
+    bin_index = (angle[strong] % 180.0 // bin_width).astype(np.intp)
+    histogram = np.bincount(bin_index, weights=magnitude[strong], minlength=bins)[:bins]
+
+    window = int(round(10.0 / bin_width))
+    center = bins // 2
+    horizontal = histogram[center - window:center + window].sum()
+    vertical = histogram[:window].sum() + histogram[bins - window:].sum()
+
+    total = histogram.sum()
+    return horizontal / total, vertical / total
+
+
+def cell_mean_hsv(image, grid_size=12):
+    """Средний HSV каждой ячейки сетки grid_size x grid_size (по интегральному изображению).
+
+    Как и в покомпонентном анализе, остаток ширины и высоты, не кратный
+    размеру ячейки, не учитывается. Сторона короче grid_size пикселей
+    растягивается до grid_size, чтобы ячейка была не меньше пикселя.
+    """
+    height, width = image.shape[:2]
+    if height < grid_size or width < grid_size:
+        image = cv2.resize(image, (max(width, grid_size), max(height, grid_size)),
+                           interpolation=cv2.INTER_NEAREST)
+        height, width = image.shape[:2]
+    cell_h, cell_w = height // grid_size, width // grid_size
+
+    hsv = cv2.cvtColor(image[:cell_h * grid_size, :cell_w * grid_size], cv2.COLOR_BGR2HSV)
+    integral = cv2.integral(hsv, sdepth=cv2.CV_64F)
+    corners = integral[::cell_h, ::cell_w][:grid_size + 1, :grid_size + 1]
+
+    sums = corners[1:, 1:] - corners[:-1, 1:] - corners[1:, :-1] + corners[:-1, :-1]
+    return (sums / (cell_h * cell_w)).astype(np.float32)
+
+
+def classify_zone_cells(mean_hsv):
+    """Индекс зоны (в ZONE_TYPES) для каждой ячейки по ее среднему HSV.
+
+    mean_hsv имеет форму (..., grid, grid, 3), поэтому одним вызовом
+    классифицируется и один кадр, и пакет кадров. Правила и их порядок
+    совпадают с исходным покомпонентным анализом.
+    """
+    h, s, v = mean_hsv[..., 0], mean_hsv[..., 1], mean_hsv[..., 2]
+    grid_size = mean_hsv.shape[-2]
+    top_rows = (np.arange(grid_size) < grid_size // 3)[:, None]
+
+    conditions = [
+        top_rows & (((90 <= h) & (h <= 130)) | ((s < 40) & (v > 150))),
+        (s < 30) & (v > 200),
+        (v < 80) & (s < 60),
+        (35 <= h) & (h <= 85) & (s > 60) & (v < 180),
+        ((35 <= h) & (h <= 85) & (20 <= s) & (s <= 60)) | ((15 <= h) & (h <= 35) & (s > 30)),
+        (100 <= h) & (h <= 130) & (s > 40),
+        (s < 40) & (80 <= v) & (v <= 180),
+        (5 <= h) & (h <= 25) & (s > 30) & (v < 120),
+    ]
+    zones = ['sky', 'snow', 'road', 'forest', 'field', 'water', 'building', 'ground']
+    choices = [ZONE_TYPES.index(zone) for zone in zones]
+    return np.select(conditions, choices, default=ZONE_TYPES.index('field')).astype(np.uint8)
+
+
+def zone_counts_from_labels(labels):
+    """Число ячеек каждой зоны для каждого кадра пакета: массив (N, len(ZONE_TYPES))"""
+    labels = labels.reshape(len(labels), -1)
+    offsets = np.arange(len(labels))[:, None] * len(ZONE_TYPES)
+    counts = np.bincount((labels + offsets).ravel(), minlength=len(labels) * len(ZONE_TYPES))
+    return counts.reshape(len(labels), len(ZONE_TYPES))
+
+
+def classify_viewing_angles(sky_ratio_top, ground_ratio_bottom, horizontal_share):
+    """Ракурс для каждого набора признаков (массивы одинаковой формы)"""
+    sky_ratio_top = np.asarray(sky_ratio_top)
+    ground_ratio_bottom = np.asarray(ground_ratio_bottom)
+    horizontal_share = np.asarray(horizontal_share)
+
+    top_down = (sky_ratio_top < 0.1) & (ground_ratio_bottom < 0.3)
+    side_view = ~top_down & (sky_ratio_top > 0.4) & (horizontal_share > HORIZONTAL_EDGE_SHARE)
+    return np.where(top_down, 'top_down', np.where(side_view, 'side_view', 'angled'))
+
+
+class SceneGenerator:
+    """Ядро генерации синтетических изображений без зависимости от Tkinter.
+
+    Объект можно передавать в рабочие потоки и процессы: он хранит только
+    списки путей к объектам и настройки генерации.
+    """
+
+    def __init__(self, asset_objects=None, max_objects=5, log_callback=None):
+        self.asset_objects = asset_objects if asset_objects is not None else {
+            category: [] for category in DEFAULT_CATEGORIES
+        }
+        self.max_objects = max_objects
+        self.category_weights = {}
+        self.min_object_size = 10
+        self.harmonization_strength = 0.5
+        self.shadows_enabled = True
+        self.sun_azimuth = 135.0
+        self.sun_elevation = 45.0
+        self.shadow_strength = 0.5
+        self.canopy_probability = 0.5
+        self.shadow_cache = ShadowCache()
+        self.log_callback = log_callback
+        self.rng = random.Random()
+        self.sprite_cache = SpriteCache()
+
+    def with_seed(self, seed):
+        """Поверхностная копия движка с собственным генератором случайных чисел"""
+        engine = self.__class__.__new__(self.__class__)
+        engine.__dict__.update(self.__dict__)
+        engine.rng = random.Random(seed)
+        return engine
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['log_callback'] = None
+        state['sprite_cache'] = SpriteCache(self.sprite_cache.max_bytes, self.sprite_cache.atlas)
+        state['shadow_cache'] = ShadowCache(self.shadow_cache.max_entries)
+        return state
+
+    def log_message(self, message):
+        """Передача сообщения в лог, если он подключен"""
+        if self.log_callback:
+            self.log_callback(message)
+
+    def analyze_background(self, image):
+        """Улучшенный анализ фона для определения зон размещения"""
+        height, width = image.shape[:2]
+        grid_size = 12
+
+        labels = classify_zone_cells(cell_mean_hsv(image, grid_size))
+        zones = self.zones_from_labels(labels, width, height)
+
+        zone_counts = {zone: len(cells) for zone, cells in zones.items() if cells}
+        self.log_message(f"Анализ сцены: {zone_counts}")
+
+        return zones
+
+    @staticmethod
+    def zones_from_labels(labels, width, height):
+        """Списки ячеек каждой зоны по сетке индексов зон"""
+        grid_size = labels.shape[0]
+        cell_w = width // grid_size
+        cell_h = height // grid_size
+
+        zones = {zone: [] for zone in ZONE_TYPES}
+        for i in range(grid_size):
+            for j in range(grid_size):
+                x1, y1 = j * cell_w, i * cell_h
+                x2, y2 = min((j + 1) * cell_w, width), min((i + 1) * cell_h, height)
+
+                zones[ZONE_TYPES[labels[i, j]]].append({
+                    'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+                    'center': ((x1+x2)//2, (y1+y2)//2),
+                    'position_ratio': i / grid_size
+                })
+
+        return zones
+
+    def viewing_angle_features(self, image):
+        """Признаки ракурса по уменьшенной копии кадра:
+        доля неба в верхней трети, доля земли в нижней, доля горизонтальных границ"""
+        height, width = image.shape[:2]
+
+        # Прореживание строк/столбцов до ~2x целевого размера, затем усреднение INTER_AREA
+        step = max(1, max(height, width) // (2 * ANGLE_ANALYSIS_SIZE))
+        if step > 1:
+            image = np.ascontiguousarray(image[::step, ::step])
+            height, width = image.shape[:2]
+
+        scale = ANGLE_ANALYSIS_SIZE / max(height, width)
+        if scale < 1:
+            image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+            height, width = image.shape[:2]
+
+
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        top_third = hsv[:height//3, :]
+        bottom_third = hsv[2*height//3:, :]
+
+
+        sky_mask_top = cv2.inRange(top_third, (90, 0, 150), (130, 255, 255))
+        sky_ratio_top = np.count_nonzero(sky_mask_top) / sky_mask_top.size
+
+
+        ground_mask_bottom = cv2.inRange(bottom_third, (15, 30, 30), (85, 255, 200))
+        ground_ratio_bottom = np.count_nonzero(ground_mask_bottom) / ground_mask_bottom.size
+
+
+        # Границы считаются только для кадров с небом, где возможен горизонт
+        horizontal_share = 0.0
+        if sky_ratio_top > 0.4:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            horizontal_share, _ = edge_orientation_shares(gray)
+
+        return sky_ratio_top, ground_ratio_bottom, horizontal_share
+
+    def detect_viewing_angle(self, image):
+        """Определение ракурса съемки (вид сверху, сбоку, под углом) по уменьшенной копии кадра"""
+        return str(classify_viewing_angles(*self.viewing_angle_features(image)))
+
+    def placeable_categories(self, zone_counts):
+        """Категории с объектами, для которых есть подходящие зоны при данном числе ячеек каждой зоны"""
+        zones = {zone: [None] * zone_counts.get(zone, 0) for zone in ZONE_TYPES}
+        return {category for category, objects in self.asset_objects.items()
+                if objects and self.get_suitable_zones(category, zones)}
+
+    def get_suitable_objects_by_angle(self, category, viewing_angle):
+        """Фильтрация объектов по ракурсу съемки"""
+        objects = self.asset_objects.get(category, [])
+        if not objects:
+            return []
+
+        return objects
+
+    def get_suitable_zones(self, category, zones):
+        """Определение подходящих зон для размещения объектов с учетом реалистичности"""
+        suitable_zones = []
+
+        if category == 'vehicles':
+
+            suitable_zones.extend(zones['road'] * 3)
+            suitable_zones.extend(zones['building'])
+            suitable_zones.extend(zones['field'][:len(zones['field'])//3])
+
+        elif category == 'people':
+
+            suitable_zones.extend(zones['field'])
+            suitable_zones.extend(zones['building'])
+            suitable_zones.extend(zones['road'])
+            suitable_zones.extend(zones['ground'])
+
+        elif category == 'animals':
+
+            suitable_zones.extend(zones['forest'] * 2)
+            suitable_zones.extend(zones['field'])
+            suitable_zones.extend(zones['ground'])
+
+        elif category == 'fire':
+
+            suitable_zones.extend(zones['forest'] * 2)
+            suitable_zones.extend(zones['field'])
+            suitable_zones.extend(zones['ground'])
+            if len(zones['building']) > 0:
+                suitable_zones.extend(zones['building'][:2])
+
+        elif category == 'smoke':
+
+            suitable_zones.extend(zones['forest'])
+            suitable_zones.extend(zones['field'])
+            suitable_zones.extend(zones['building'])
+            suitable_zones.extend(zones['road'])
+            suitable_zones.extend(zones['ground'])
+
+        elif category == 'trees':
+
+            suitable_zones.extend(zones['forest'])
+            suitable_zones.extend(zones['field'])
+            suitable_zones.extend(zones['ground'])
+
+        elif category == 'aircraft':
+
+            suitable_zones.extend(zones['sky'] * 3)
+            suitable_zones.extend(zones['field'])
+
+        elif category == 'boats':
+
+            suitable_zones.extend(zones['water'])
+
+
+
+
+        if not suitable_zones and category != 'boats':
+            suitable_zones = zones['field']
+
+        return suitable_zones
+
+    def should_avoid_zone(self, category, zone_type):
+        """Проверка, нужно ли избегать определенную зону для объекта"""
+        avoid_rules = {
+            'vehicles': ['sky', 'water'],
+            'people': ['sky', 'water'],
+            'animals': ['sky', 'water', 'road'],
+            'fire': ['sky', 'water'],
+            'smoke': ['water'],
+            'trees': ['sky', 'water', 'road']
+        }
+
+        return zone_type in avoid_rules.get(category, [])
+
+    def calculate_adaptive_scale(self, ground_model, position_y, category, sprite_shape):
+        """Расчет масштаба объекта по его физическому размеру и модели перспективы фона"""
+        min_size_m, max_size_m = OBJECT_SIZES_M.get(category, DEFAULT_OBJECT_SIZE_M)
+        size_m = self.rng.uniform(min_size_m, max_size_m)
+
+        target_size = ground_model.object_size_px(size_m, position_y)
+
+        return target_size / max(sprite_shape[:2])
+
+    def layout_object(self, background, object_path, zone_info, category, ground_model):
+        """Масштаб и положение объекта в зоне без вставки: (пирамида, изображение объекта, bbox) или None"""
+        pyramid = self.sprite_cache.get(object_path)
+        if pyramid is None:
+            return None
+
+
+        h, w = pyramid.shape[:2]
+        scale_factor = self.calculate_adaptive_scale(ground_model, zone_info['center'][1], category, pyramid.shape)
+
+        new_h, new_w = int(h * scale_factor), int(w * scale_factor)
+
+
+        if new_h < self.min_object_size or new_w < self.min_object_size:
+            return None
+
+
+        zone_center_x = (zone_info['x1'] + zone_info['x2']) // 2
+        zone_center_y = (zone_info['y1'] + zone_info['y2']) // 2
+
+
+        offset_x = self.rng.randint(-20, 20)
+        offset_y = self.rng.randint(-20, 20)
+
+        x = max(zone_info['x1'], min(zone_center_x + offset_x - new_w//2, zone_info['x2'] - new_w))
+        y = max(zone_info['y1'], min(zone_center_y + offset_y - new_h//2, zone_info['y2'] - new_h))
+
+
+        bg_h, bg_w = background.shape[:2]
+        if x + new_w > bg_w or y + new_h > bg_h or x < 0 or y < 0:
+            return None
+
+        obj_img = pyramid.resize(new_w, new_h)
+        if category not in EMISSIVE_CATEGORIES:
+            obj_img = harmonize(obj_img, pyramid.color_stats, zone_info.get('color_stats'),
+                                self.harmonization_strength)
+
+        return pyramid, obj_img, {'x': x, 'y': y, 'width': new_w, 'height': new_h}
+
+    def paste_object(self, background, object_path, pyramid, obj_img, bbox, category, forest_cells=None):
+        """Вставка объекта, подготовленного layout_object, вместе с тенью и кронами"""
+        x, y, new_w, new_h = bbox['x'], bbox['y'], bbox['width'], bbox['height']
+
+        shadow = None
+        canopy = None
+        if self.shadows_enabled:
+            if category not in NO_SHADOW_CATEGORIES:
+                mask, pad_x, pad_y = self.shadow_cache.shadow_mask(object_path, pyramid, new_w, new_h)
+                dx, dy = shadow_offset(self.sun_azimuth, self.sun_elevation, max(new_w, new_h), category)
+                shadow = (mask, x - pad_x + round(dx), y - pad_y + round(dy), self.shadow_strength)
+
+            if (forest_cells and category in CANOPY_CATEGORIES
+                    and self.rng.random() < self.canopy_probability):
+                canopy = sample_canopy(background, forest_cells, new_w, new_h, self.rng)
+
+        return composite_object(background, obj_img, x, y, opacity=0.9, shadow=shadow, canopy=canopy)
+
+    def place_object_on_image(self, background, object_path, position, zone_info, category, ground_model,
+                              forest_cells=None):
+        """Улучшенное размещение объекта на изображении с адаптивным масштабированием.
+
+        Если включены тени, объект вставляется вместе с размытой тенью по направлению
+        солнца; если передан forest_cells, объект может частично скрываться кронами.
+        """
+        try:
+            layout = self.layout_object(background, object_path, dict(zone_info, center=position), category,
+                                        ground_model)
+            if layout is None:
+                return background, None
+
+            pyramid, obj_img, bbox = layout
+            self.paste_object(background, object_path, pyramid, obj_img, bbox, category, forest_cells)
+            return background, bbox
+
+        except Exception as e:
+            self.log_message(f"Ошибка размещения объекта: {e}")
+            return background, None
+
+    def generate_single_image(self, background_path, planned_categories=None):
+        """Улучшенная генерация одного изображения с объектами"""
+        try:
+            background = cv2.imread(background_path)
+            if background is None:
+                return None, []
+
+            scene = self.analyze_scene(background, load_scene_metadata(background_path))
+            return self.compose_scene(background, scene, planned_categories)
+
+        except Exception as e:
+            self.log_message(f"Ошибка генерации изображения: {e}")
+            return None, []
+
+    def analyze_scene(self, background, metadata=None):
+        """Ракурс съемки, зоны размещения и модель перспективы для фона"""
+        metadata = metadata or {}
+        viewing_angle = metadata.get('viewing_angle') or self.detect_viewing_angle(background)
+        zones = self.analyze_background(background)
+        attach_zone_color_stats(background, zones)
+        ground_model = GroundSamplingModel.estimate(background.shape, viewing_angle, zones, metadata)
+        return viewing_angle, zones, ground_model
+
+    def compose_scene(self, background, scene=None, planned_categories=None, stats=None):
+        """Размещение объектов на уже загруженном фоне.
+
+        Если передан planned_categories (план планировщика), размещается по одному
+        объекту каждой категории из списка, иначе категории выбираются случайно
+        с учетом весов. Если передан stats (Counter), в него добавляется число
+        запрошенных и размещенных объектов и причины отказов.
+        """
+        if scene is None:
+            scene = self.analyze_scene(background)
+        viewing_angle, zones, ground_model = scene
+        if stats is None:
+            stats = Counter()
+
+        cell_zones = {id(cell): zone for zone, cells in zones.items() for cell in cells}
+
+
+        annotations = []
+
+
+        if planned_categories is None:
+            num_objects = self.rng.randint(1, self.max_objects)
+        else:
+            num_objects = len(planned_categories)
+
+
+        placed_objects = []
+        stats['requested'] += num_objects
+
+        for object_index in range(num_objects):
+
+            if planned_categories is None:
+                available_categories = [cat for cat, objects in self.asset_objects.items()
+                                        if objects and self.category_weights.get(cat, 1.0) > 0]
+                if not available_categories:
+                    break
+
+                weights = [self.category_weights.get(cat, 1.0) for cat in available_categories]
+                category = self.rng.choices(available_categories, weights)[0]
+            else:
+                category = planned_categories[object_index]
+
+
+            suitable_objects = self.get_suitable_objects_by_angle(category, viewing_angle)
+            if not suitable_objects:
+                stats['no_objects'] += 1
+                continue
+
+            object_path = self.rng.choice(suitable_objects)
+
+
+            suitable_zones = self.get_suitable_zones(category, zones)
+            if not suitable_zones:
+                stats['no_zone'] += 1
+                continue
+
+
+            placement_attempts = 0
+            max_placement_attempts = 5
+            rejection = 'rejected_placement'
+
+            while placement_attempts < max_placement_attempts:
+
+                zone = self.rng.choice(suitable_zones)
+                zone_type = cell_zones.get(id(zone))
+
+
+                try:
+                    layout = self.layout_object(background, object_path, zone, category, ground_model)
+                except Exception as e:
+                    self.log_message(f"Ошибка размещения объекта: {e}")
+                    layout = None
+
+                if layout is None:
+                    rejection = 'rejected_placement'
+                elif any(self.check_overlap(layout[2], placed_bbox) for placed_bbox in placed_objects):
+                    # Объект не вставляется: иначе на кадре остался бы объект без разметки
+                    rejection = 'rejected_overlap'
+                else:
+                    pyramid, obj_img, bbox = layout
+                    forest_cells = zones['forest'] if zone_type == 'forest' else None
+                    try:
+                        self.paste_object(background, object_path, pyramid, obj_img, bbox, category, forest_cells)
+                    except Exception as e:
+                        self.log_message(f"Ошибка размещения объекта: {e}")
+                        break
+                    annotations.append({
+                        'category': category,
+                        'bbox': bbox,
+                        'object_path': object_path,
+                        'viewing_angle': viewing_angle,
+                        'zone': zone_type
+                    })
+                    placed_objects.append(bbox)
+                    break
+
+                placement_attempts += 1
+
+            if placement_attempts == max_placement_attempts:
+                stats[rejection] += 1
+
+        stats['placed'] += len(annotations)
+        return background, annotations
+
+    def check_overlap(self, bbox1, bbox2, threshold=0.3):
+        """Проверка перекрытия двух bounding box"""
+        x1_min, y1_min = bbox1['x'], bbox1['y']
+        x1_max, y1_max = x1_min + bbox1['width'], y1_min + bbox1['height']
+
+        x2_min, y2_min = bbox2['x'], bbox2['y']
+        x2_max, y2_max = x2_min + bbox2['width'], y2_min + bbox2['height']
+
+
+        intersection_x_min = max(x1_min, x2_min)
+        intersection_y_min = max(y1_min, y2_min)
+        intersection_x_max = min(x1_max, x2_max)
+        intersection_y_max = min(y1_max, y2_max)
+
+        if intersection_x_min >= intersection_x_max or intersection_y_min >= intersection_y_max:
+            return False
+
+
+        intersection_area = (intersection_x_max - intersection_x_min) * (intersection_y_max - intersection_y_min)
+
+
+        area1 = bbox1['width'] * bbox1['height']
+        area2 = bbox2['width'] * bbox2['height']
+
+
+        overlap_ratio = intersection_area / min(area1, area2)
+
+        return overlap_ratio > threshold
+
+    def save_yolo_annotation(self, label_path, annotations, image_shape, categories):
+        """Сохранение разметки в формате YOLO"""
+        height, width = image_shape[:2]
+
+        with open(label_path, 'w') as f:
+            for ann in annotations:
+                category = ann['category']
+                bbox = ann['bbox']
+
+
+                class_id = categories.index(category)
+
+
+                x_center = (bbox['x'] + bbox['width'] / 2) / width
+                y_center = (bbox['y'] + bbox['height'] / 2) / height
+                norm_width = bbox['width'] / width
+                norm_height = bbox['height'] / height
+
+                f.write(f"{class_id} {x_center:.6f} {y_center:.6f} {norm_width:.6f} {norm_height:.6f}\n")
+
+    def generate_and_save(self, index, background_path, images_path, labels_path, categories,
+                          planned_categories=None):
+        """Генерация одного изображения и запись его вместе с разметкой на диск.
+
+        Возвращает имя файла и список категорий размещенных объектов.
+        """
+        result_image, annotations = self.generate_single_image(background_path, planned_categories)
+        if result_image is None:
+            return None
+
+        image_filename = f"synthetic_{index:04d}.jpg"
+        cv2.imwrite(str(images_path / image_filename), result_image)
+
+        label_path = labels_path / f"synthetic_{index:04d}.txt"
+        if annotations:
+            self.save_yolo_annotation(label_path, annotations, result_image.shape, categories)
+        else:
+            label_path.touch()
+
+        return image_filename, [ann['category'] for ann in annotations]
@@ -0,0 +1,122 @@
+import cv2
+import numpy as np
+
+
+# dHash считается по уменьшенной копии кадра (HASH_SIZE + 1) x HASH_SIZE: 64 бита
+HASH_SIZE = 8
+
+# Сетка сигнатуры расположения объектов: бит на ячейку, в которую попал центр объекта
+LAYOUT_GRID = 8
+
+# Таблица числа единичных битов в байте (для numpy без bitwise_count)
+_POPCOUNT_TABLE = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def popcount(values):
+    """Число единичных битов в каждом элементе массива uint64"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+def dhash(image):
+    """Разностный хэш (dHash) кадра BGR: 64-битное целое.
+
+    Перед INTER_AREA кадр прореживается с шагом, кратным размеру хэша,
+    поэтому стоимость не зависит от разрешения.
+    """
+    height, width = image.shape[:2]
+    step = max(1, min(height, width) // (HASH_SIZE * 8))
+    small = cv2.resize(np.ascontiguousarray(image[::step, ::step, :3]), (HASH_SIZE + 1, HASH_SIZE),
+                       interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+    bits = gray[:, 1:] > gray[:, :-1]
+    return int(np.packbits(bits.ravel()).view('>u8')[0])
+
+
+def layout_hash(annotations, image_shape):
+    """Сигнатура расположения объектов: биты ячеек сетки LAYOUT_GRID x LAYOUT_GRID с центрами рамок"""
+    height, width = image_shape[:2]
+    signature = 0
+    for ann in annotations:
+        bbox = ann['bbox']
+        column = min(int((bbox['x'] + bbox['width'] / 2) * LAYOUT_GRID / width), LAYOUT_GRID - 1)
+        row = min(int((bbox['y'] + bbox['height'] / 2) * LAYOUT_GRID / height), LAYOUT_GRID - 1)
+        signature |= 1 << (row * LAYOUT_GRID + column)
+    return signature
+
+
+class PerceptualHashIndex:
+    """Индекс пар (хэш кадра, сигнатура расположения) в компактных массивах uint64.
+
+    Поиск — расстояние Хэмминга до всех записей сразу (XOR и подсчет битов
+    векторно). Если задан max_entries, хранятся только последние записи
+    (кольцевой буфер), иначе массивы растут удвоением.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        capacity = max_entries or 1024
+        self._frames = np.zeros(capacity, dtype=np.uint64)
+        self._layouts = np.zeros(capacity, dtype=np.uint64)
+        self._count = 0
+        self._next = 0
+
+    def __len__(self):
+        return self._count
+
+    def find(self, frame_hash, layout, frame_radius, layout_radius):
+        """True, если в индексе есть запись в пределах обоих радиусов"""
+        if self._count == 0:
+            return False
+        frames = self._frames[:self._count]
+        layouts = self._layouts[:self._count]
+        close = popcount(frames ^ np.uint64(frame_hash)) <= frame_radius
+        close &= popcount(layouts ^ np.uint64(layout)) <= layout_radius
+        return bool(close.any())
+
+    def add(self, frame_hash, layout):
+        if self.max_entries is None and self._count == len(self._frames):
+            self._frames = np.concatenate([self._frames, np.zeros_like(self._frames)])
+            self._layouts = np.concatenate([self._layouts, np.zeros_like(self._layouts)])
+
+        if self.max_entries is None:
+            position = self._count
+            self._count += 1
+        else:
+            # Кольцевой буфер: новая запись вытесняет самую старую
+            position = self._next
+            self._next = (position + 1) % self.max_entries
+            self._count = min(self._count + 1, self.max_entries)
+
+        self._frames[position] = frame_hash
+        self._layouts[position] = layout
+
+
+class FrameFilter:
+    """Отбраковка бесполезных кадров до кодирования и записи.
+
+    Кадр отклоняется как ``'low_content'``, если на нем меньше min_objects
+    объектов (все запланированные объекты отброшены — кадр повторяет фон),
+    и как ``'duplicate'``, если уже принят кадр с близким dHash (тот же фон)
+    и почти тем же расположением объектов. Сам по себе повтор фона не
+    считается дубликатом: фоны выбираются с возвращением.
+    """
+
+    def __init__(self, min_objects=1, frame_radius=6, layout_radius=1, max_entries=None):
+        self.min_objects = min_objects
+        self.frame_radius = frame_radius
+        self.layout_radius = layout_radius
+        self.index = PerceptualHashIndex(max_entries)
+
+    def check(self, frame_hash, image_shape, annotations):
+        """Причина отбраковки кадра или None; принятый кадр добавляется в индекс"""
+        if len(annotations) < self.min_objects:
+            return 'low_content'
+
+        layout = layout_hash(annotations, image_shape)
+        if self.index.find(frame_hash, layout, self.frame_radius, self.layout_radius):
+            return 'duplicate'
+
+        self.index.add(frame_hash, layout)
+        return None
@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+
+
+# Вес подстройки каналов Lab: яркость подгоняется к фону сильнее, чем цветность,
+# чтобы объект не терял собственный цвет (красная машина не должна стать зеленой)
+CHANNEL_WEIGHTS = np.array([1.0, 0.35, 0.35], dtype=np.float32)
+
+# Пределы коэффициента контраста канала
+GAIN_LIMITS = (0.5, 2.0)
+
+# Категории, которые светятся сами и не подстраиваются под освещение фона
+EMISSIVE_CATEGORIES = {'fire'}
+
+# Статистика зон считается по прореженной копии кадра с такой длинной стороной
+STATS_ANALYSIS_SIZE = 384
+
+
+def lab_stats(image, mask=None):
+    """Среднее и СКО каналов Lab изображения BGR (по маске, если она задана)"""
+    lab = cv2.cvtColor(np.ascontiguousarray(image[:, :, :3]), cv2.COLOR_BGR2LAB)
+    mean, std = cv2.meanStdDev(lab, mask=mask)
+    return mean.ravel().astype(np.float32), std.ravel().astype(np.float32)
+
+
+def sprite_color_stats(image):
+    """Статистика объекта по непрозрачным пикселям; None, если их нет"""
+    mask = None
+    if image.shape[2] == 4:
+        mask = (image[:, :, 3] > 127).view(np.uint8)
+        if not mask.any():
+            return None
+    return lab_stats(image, mask)
+
+
+def attach_zone_color_stats(image, zones):
+    """Статистика Lab каждой зоны фона, записываемая в ячейки как ``color_stats``.
+
+    Кадр прореживается до ~STATS_ANALYSIS_SIZE пикселей по длинной стороне,
+    суммы и суммы квадратов каналов по ячейкам берутся из интегральных
+    изображений, затем объединяются по зонам с весом площади ячеек.
+    Возвращает словарь ``{зона: (среднее, СКО)}``.
+    """
+    height, width = image.shape[:2]
+    step = max(1, max(height, width) // STATS_ANALYSIS_SIZE)
+    lab = cv2.cvtColor(np.ascontiguousarray(image[::step, ::step]), cv2.COLOR_BGR2LAB)
+    sums, squares = cv2.integral2(lab, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+
+    zone_stats = {}
+    for zone, cells in zones.items():
+        if not cells:
+            continue
+
+        total = np.zeros(3)
+        total_sq = np.zeros(3)
+        area = 0
+        for cell in cells:
+            x1, y1 = -(-cell['x1'] // step), -(-cell['y1'] // step)
+            x2, y2 = -(-cell['x2'] // step), -(-cell['y2'] // step)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            total += sums[y2, x2] - sums[y1, x2] - sums[y2, x1] + sums[y1, x1]
+            total_sq += squares[y2, x2] - squares[y1, x2] - squares[y2, x1] + squares[y1, x1]
+            area += (x2 - x1) * (y2 - y1)
+
+        if area == 0:
+            continue
+
+        mean = total / area
+        std = np.sqrt(np.maximum(total_sq / area - mean * mean, 0.0))
+        stats = (mean.astype(np.float32), std.astype(np.float32))
+        zone_stats[zone] = stats
+        for cell in cells:
+            cell['color_stats'] = stats
+
+    return zone_stats
+
+
+def harmonize(image, source_stats, target_stats, strength=0.5):
+    """Подстройка цвета объекта к зоне фона аффинным преобразованием каждого канала Lab.
+
+    Среднее и СКО канала объекта смещаются к статистике зоны на долю
+    strength * CHANNEL_WEIGHTS; альфа-канал не меняется.
+    """
+    if strength <= 0 or source_stats is None or target_stats is None:
+        return image
+
+    source_mean, source_std = source_stats
+    target_mean, target_std = target_stats
+    weights = strength * CHANNEL_WEIGHTS
+
+    ratio = np.clip(target_std / np.maximum(source_std, 1.0), *GAIN_LIMITS)
+    gain = 1.0 + weights * (ratio - 1.0)
+    offset = source_mean + weights * (target_mean - source_mean) - gain * source_mean
+
+    lab = cv2.cvtColor(np.ascontiguousarray(image[:, :, :3]), cv2.COLOR_BGR2LAB).astype(np.float32)
+    lab = lab * gain + offset
+    color = cv2.cvtColor(np.clip(lab, 0, 255).astype(np.uint8), cv2.COLOR_LAB2BGR)
+
+    if image.shape[2] == 4:
+        return np.dstack([color, image[:, :, 3]])
+    return color
@@ -1,13 +1,18 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-import cv2
-import numpy as np
 from PIL import Image, ImageTk
-import json
+import queue
 import random
 from pathlib import Path
 
+from engine import DEFAULT_CATEGORIES, SceneGenerator
+from frame_filter import FrameFilter
+from preview import PreviewRenderer
+from procedural import ProceduralBackgroundGenerator
+from scene_index import SceneIndex
+from worker import GenerationWorker, default_worker_count
+
 class SyntheticDataGenerator:
     def __init__(self, root):
         self.root = root
@@ -23,9 +28,17 @@ class SyntheticDataGenerator:
         self.background_images = []
         self.asset_objects = {}
         self.current_preview = None
+        self.preview_samples = []
+        self.preview_request_id = None
+        self.preview_refresh_job = None
+        
+        self.engine = SceneGenerator(self.asset_objects)
+        self.worker = GenerationWorker(self.engine)
+        self.preview_renderer = PreviewRenderer(self.worker.events)
         
         self.setup_ui()
         self.load_default_assets()
+        self.poll_worker_events()
     
     def setup_ui(self):
         """Создание пользовательского интерфейса"""
@@ -67,19 +80,89 @@ class SyntheticDataGenerator:
         ttk.Spinbox(settings_frame, from_=1, to=1000, textvariable=self.num_images, width=10).grid(row=1, column=1)
         
         
+        ttk.Label(settings_frame, text="Процессов генерации:").grid(row=2, column=0, sticky=tk.W)
+        self.num_workers = tk.IntVar(value=default_worker_count())
+        ttk.Spinbox(settings_frame, from_=1, to=os.cpu_count() or 1, textvariable=self.num_workers, width=10).grid(row=2, column=1)
+        
+        
+        self.balance_classes = tk.BooleanVar(value=True)
+        ttk.Checkbutton(settings_frame, text="Балансировать классы по весам", variable=self.balance_classes).grid(row=6, column=0, columnspan=2, sticky=tk.W)
+        
+        self.procedural_backgrounds = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="Процедурные фоны (без чтения с диска)", variable=self.procedural_backgrounds).grid(row=7, column=0, columnspan=2, sticky=tk.W)
+        
+        ttk.Label(settings_frame, text="Гармонизация цвета (0-1):").grid(row=8, column=0, sticky=tk.W)
+        self.harmonization_strength = tk.DoubleVar(value=0.5)
+        ttk.Spinbox(settings_frame, from_=0, to=1, increment=0.1, textvariable=self.harmonization_strength, width=10).grid(row=8, column=1)
+        
+        self.shadows_enabled = tk.BooleanVar(value=True)
+        ttk.Checkbutton(settings_frame, text="Тени и перекрытие кронами", variable=self.shadows_enabled).grid(row=9, column=0, columnspan=2, sticky=tk.W)
+        
+        ttk.Label(settings_frame, text="Азимут солнца (°):").grid(row=10, column=0, sticky=tk.W)
+        self.sun_azimuth = tk.DoubleVar(value=135.0)
+        ttk.Spinbox(settings_frame, from_=0, to=359, increment=15, textvariable=self.sun_azimuth, width=10).grid(row=10, column=1)
+        
+        ttk.Label(settings_frame, text="Высота солнца (°):").grid(row=11, column=0, sticky=tk.W)
+        self.sun_elevation = tk.DoubleVar(value=45.0)
+        ttk.Spinbox(settings_frame, from_=10, to=90, increment=5, textvariable=self.sun_elevation, width=10).grid(row=11, column=1)
+        
+        self.filter_frames = tk.BooleanVar(value=True)
+        ttk.Checkbutton(settings_frame, text="Отбраковывать пустые кадры и дубликаты", variable=self.filter_frames).grid(row=12, column=0, columnspan=2, sticky=tk.W)
+        
+        
         controls_frame = ttk.Frame(settings_frame)
-        controls_frame.grid(row=2, column=0, columnspan=2, pady=10)
+        controls_frame.grid(row=3, column=0, columnspan=2, pady=10)
         
         ttk.Button(controls_frame, text="Загрузить изображения", command=self.load_background_images).pack(side=tk.LEFT, padx=5)
         ttk.Button(controls_frame, text="Предварительный просмотр", command=self.preview_generation).pack(side=tk.LEFT, padx=5)
         ttk.Button(controls_frame, text="Генерировать датасет", command=self.generate_dataset).pack(side=tk.LEFT, padx=5)
         
         
+        run_frame = ttk.Frame(settings_frame)
+        run_frame.grid(row=4, column=0, columnspan=2, pady=5)
+        
+        self.pause_button = ttk.Button(run_frame, text="Пауза", command=self.toggle_pause, state=tk.DISABLED)
+        self.pause_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(run_frame, text="Отмена", command=self.cancel_generation, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        
+        self.throughput_label = ttk.Label(run_frame, text="")
+        self.throughput_label.pack(side=tk.LEFT, padx=5)
+        
+        
+        weights_frame = ttk.LabelFrame(settings_frame, text="Веса категорий", padding="5")
+        weights_frame.grid(row=5, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
+        
+        self.category_weights = {}
+        for index, category in enumerate(DEFAULT_CATEGORIES):
+            row, column = divmod(index, 2)
+            weight = tk.DoubleVar(value=1.0)
+            ttk.Label(weights_frame, text=f"{category}:").grid(row=row, column=column * 2, sticky=tk.W)
+            ttk.Spinbox(weights_frame, from_=0, to=10, increment=0.5, textvariable=weight, width=5).grid(row=row, column=column * 2 + 1, padx=5)
+            weight.trace_add('write', self.schedule_preview_refresh)
+            self.category_weights[category] = weight
+        
+        self.max_objects.trace_add('write', self.schedule_preview_refresh)
+        self.harmonization_strength.trace_add('write', self.schedule_preview_refresh)
+        for variable in (self.shadows_enabled, self.sun_azimuth, self.sun_elevation):
+            variable.trace_add('write', self.schedule_preview_refresh)
+        
+        
         preview_frame = ttk.LabelFrame(main_frame, text="Предварительный просмотр", padding="10")
         preview_frame.grid(row=1, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), pady=5, padx=5)
         
-        self.preview_label = ttk.Label(preview_frame, text="Выберите изображения для предварительного просмотра")
-        self.preview_label.pack(expand=True)
+        preview_controls = ttk.Frame(preview_frame)
+        preview_controls.pack(fill=tk.X)
+        ttk.Label(preview_controls, text="Образцов в галерее:").pack(side=tk.LEFT)
+        self.num_preview_samples = tk.IntVar(value=4)
+        ttk.Spinbox(preview_controls, from_=1, to=9, textvariable=self.num_preview_samples, width=5).pack(side=tk.LEFT, padx=5)
+        
+        self.preview_gallery = ttk.Frame(preview_frame)
+        self.preview_gallery.pack(expand=True)
+        
+        self.preview_label = ttk.Label(self.preview_gallery, text="Выберите изображения для предварительного просмотра")
+        self.preview_label.grid(row=0, column=0)
+        self.preview_tiles = []
         
         
         self.progress = ttk.Progressbar(main_frame, mode='determinate')
@@ -105,7 +188,6 @@ class SyntheticDataGenerator:
         """Добавление сообщения в лог"""
         self.log_text.insert(tk.END, f"{message}\n")
         self.log_text.see(tk.END)
-        self.root.update()
     
     def select_background_folder(self):
         """Выбор папки с фоновыми изображениями"""
@@ -141,6 +223,8 @@ class SyntheticDataGenerator:
             'aircraft': [],    
             'boats': []        
         }
+        self.engine.asset_objects = self.asset_objects
+        self.preview_renderer.clear()
         
         self.log_message("Инициализированы категории объектов:")
         self.log_message("- vehicles: наземный транспорт")
@@ -183,6 +267,9 @@ class SyntheticDataGenerator:
         
         for category in self.asset_objects:
             self.asset_objects[category] = []
+        self.engine.sprite_cache.clear()
+        self.engine.sprite_cache.atlas = None
+        self.preview_renderer.clear()
         
         
         for category in self.asset_objects.keys():
@@ -202,449 +289,8 @@ class SyntheticDataGenerator:
             messagebox.showwarning("Предупреждение", 
                                  "Не найдено объектов. Создайте папки: vehicles, people, animals, fire, smoke, trees")
     
-    def analyze_background(self, image):
-        """Улучшенный анализ фона для определения зон размещения"""
-        height, width = image.shape[:2]
-        
-        
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        
-        zones = {
-            'sky': [],       
-            'road': [],      
-            'forest': [],    
-            'field': [],     
-            'water': [],     
-            'building': [],  
-            'ground': [],    
-            'snow': []       
-        }
-        
-        
-        grid_size = 12
-        cell_w = width // grid_size
-        cell_h = height // grid_size
-        
-        for i in range(grid_size):
-            for j in range(grid_size):
-                x1, y1 = j * cell_w, i * cell_h
-                x2, y2 = min((j + 1) * cell_w, width), min((i + 1) * cell_h, height)
-                
-                
-                cell = hsv[y1:y2, x1:x2]
-                mean_color = np.mean(cell, axis=(0, 1))
-                
-                
-                h, s, v = mean_color
-                
-                cell_info = {
-                    'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2, 
-                    'center': ((x1+x2)//2, (y1+y2)//2),
-                    'position_ratio': i / grid_size  
-                }
-                
-                
-                
-                
-                if i < grid_size // 3 and (90 <= h <= 130 or (s < 40 and v > 150)):
-                    zones['sky'].append(cell_info)
-                
-                
-                elif s < 30 and v > 200:
-                    zones['snow'].append(cell_info)
-                
-                
-                elif v < 80 and s < 60:
-                    zones['road'].append(cell_info)
-                
-                
-                elif 35 <= h <= 85 and s > 60 and v < 180:
-                    zones['forest'].append(cell_info)
-                
-                
-                elif (35 <= h <= 85 and 20 <= s <= 60) or (15 <= h <= 35 and s > 30):
-                    zones['field'].append(cell_info)
-                
-                
-                elif 100 <= h <= 130 and s > 40:
-                    zones['water'].append(cell_info)
-                
-                
-                elif s < 40 and 80 <= v <= 180:
-                    zones['building'].append(cell_info)
-                
-                
-                elif 5 <= h <= 25 and s > 30 and v < 120:
-                    zones['ground'].append(cell_info)
-                
-                
-                else:
-                    zones['field'].append(cell_info)
-        
-        
-        zone_counts = {zone: len(cells) for zone, cells in zones.items() if cells}
-        self.log_message(f"Анализ сцены: {zone_counts}")
-        
-        return zones
-        
-    def detect_viewing_angle(self, image):
-        """Определение ракурса съемки (вид сверху, сбоку, под углом)"""
-        height, width = image.shape[:2]
-        
-        
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        
-        edges = cv2.Canny(gray, 50, 150)
-        lines = cv2.HoughLines(edges, 1, np.pi/180, threshold=100)
-        
-        horizontal_lines = 0
-        vertical_lines = 0
-        
-        if lines is not None:
-            for rho, theta in lines[:, 0]:
-                angle = theta * 180 / np.pi
-                if 80 <= angle <= 100 or 260 <= angle <= 280:  
-                    horizontal_lines += 1
-                elif 170 <= angle <= 190 or 350 <= angle <= 10:  
-                    vertical_lines += 1
-        
-        
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        top_third = hsv[:height//3, :]
-        bottom_third = hsv[2*height//3:, :]
-        
-        
-        sky_mask_top = cv2.inRange(top_third, (90, 0, 150), (130, 255, 255))
-        sky_ratio_top = np.sum(sky_mask_top > 0) / sky_mask_top.size
-        
-        
-        ground_mask_bottom = cv2.inRange(bottom_third, (15, 30, 30), (85, 255, 200))
-        ground_ratio_bottom = np.sum(ground_mask_bottom > 0) / ground_mask_bottom.size
-        
-        
-        if sky_ratio_top < 0.1 and ground_ratio_bottom < 0.3:
-            return "top_down"  
-        elif sky_ratio_top > 0.4 and horizontal_lines > 2:
-            return "side_view"  
-        else:
-            return "angled"     
-    
-    def get_suitable_objects_by_angle(self, category, viewing_angle):
-        """Фильтрация объектов по ракурсу съемки"""
-        objects = self.asset_objects.get(category, [])
-        if not objects:
-            return []
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        return objects
-    
-    def get_suitable_zones(self, category, zones):
-        """Определение подходящих зон для размещения объектов с учетом реалистичности"""
-        suitable_zones = []
-        
-        if category == 'vehicles':
-            
-            suitable_zones.extend(zones['road'] * 3)  
-            suitable_zones.extend(zones['building'])
-            suitable_zones.extend(zones['field'][:len(zones['field'])//3])  
-        
-        elif category == 'people':
-            
-            suitable_zones.extend(zones['field'])
-            suitable_zones.extend(zones['building'])
-            suitable_zones.extend(zones['road'])
-            suitable_zones.extend(zones['ground'])
-        
-        elif category == 'animals':
-            
-            suitable_zones.extend(zones['forest'] * 2)  
-            suitable_zones.extend(zones['field'])
-            suitable_zones.extend(zones['ground'])
-        
-        elif category == 'fire':
-            
-            suitable_zones.extend(zones['forest'] * 2)
-            suitable_zones.extend(zones['field'])
-            suitable_zones.extend(zones['ground'])
-            if len(zones['building']) > 0:
-                suitable_zones.extend(zones['building'][:2])  
-        
-        elif category == 'smoke':
-            
-            suitable_zones.extend(zones['forest'])
-            suitable_zones.extend(zones['field'])
-            suitable_zones.extend(zones['building'])
-            suitable_zones.extend(zones['road'])
-            suitable_zones.extend(zones['ground'])
-        
-        elif category == 'trees':
-            
-            suitable_zones.extend(zones['forest'])
-            suitable_zones.extend(zones['field'])
-            suitable_zones.extend(zones['ground'])
-        
-        elif category == 'aircraft':
-            
-            suitable_zones.extend(zones['sky'] * 3)  
-            suitable_zones.extend(zones['field'])
-        
-        elif category == 'boats':
-            
-            suitable_zones.extend(zones['water'])
-        
-        
-        
-        
-        if not suitable_zones and category != 'boats':
-            suitable_zones = zones['field']
-        
-        return suitable_zones
-    
-    def should_avoid_zone(self, category, zone_type):
-        """Проверка, нужно ли избегать определенную зону для объекта"""
-        avoid_rules = {
-            'vehicles': ['sky', 'water'],
-            'people': ['sky', 'water'],
-            'animals': ['sky', 'water', 'road'],
-            'fire': ['sky', 'water'],
-            'smoke': ['water'],  
-            'trees': ['sky', 'water', 'road']
-        }
-        
-        return zone_type in avoid_rules.get(category, [])
-    
-    def calculate_adaptive_scale(self, background_shape, zone_info, category, viewing_angle):
-        """Расчет адаптивного масштаба объекта"""
-        height, width = background_shape[:2]
-        
-        
-        base_sizes = {
-            'vehicles': {'min': 40, 'max': 120},
-            'people': {'min': 20, 'max': 60},
-            'animals': {'min': 30, 'max': 80},
-            'trees': {'min': 60, 'max': 200},
-            'fire': {'min': 30, 'max': 100},
-            'smoke': {'min': 50, 'max': 150},
-            'aircraft': {'min': 80, 'max': 300},
-            'boats': {'min': 50, 'max': 150}
-        }
-        
-        base_size = base_sizes.get(category, {'min': 30, 'max': 100})
-        
-        
-        scale_factor = min(width, height) / 1000.0
-        min_size = int(base_size['min'] * scale_factor)
-        max_size = int(base_size['max'] * scale_factor)
-        
-        
-        if viewing_angle == "top_down":
-            
-            min_size = int(min_size * 0.7)
-            max_size = int(max_size * 0.8)
-        elif viewing_angle == "side_view":
-            
-            min_size = int(min_size * 0.9)
-            max_size = int(max_size * 1.1)
-        
-        
-        position_y_ratio = zone_info.get('position_ratio', 0.5)
-        
-        if viewing_angle != "top_down":
-            
-            distance_scale = 1.0 - (position_y_ratio * 0.4)  
-            min_size = int(min_size * distance_scale)
-            max_size = int(max_size * distance_scale)
-        
-        
-        target_size = random.randint(min_size, max_size)
-        
-        
-        return target_size / 200.0
-    
-    def place_object_on_image(self, background, object_path, position, zone_info, category, viewing_angle):
-        """Улучшенное размещение объекта на изображении с адаптивным масштабированием"""
-        try:
-            
-            obj_img = cv2.imread(object_path, cv2.IMREAD_UNCHANGED)
-            if obj_img is None:
-                return background, None
-            
-            
-            scale_factor = self.calculate_adaptive_scale(background.shape, zone_info, category, viewing_angle)
-            
-            
-            h, w = obj_img.shape[:2]
-            new_h, new_w = int(h * scale_factor), int(w * scale_factor)
-            
-            
-            if new_h < 10 or new_w < 10:
-                return background, None
-            
-            obj_img = cv2.resize(obj_img, (new_w, new_h))
-            
-            
-            x, y = position
-            
-            
-            zone_center_x = (zone_info['x1'] + zone_info['x2']) // 2
-            zone_center_y = (zone_info['y1'] + zone_info['y2']) // 2
-            
-            
-            offset_x = random.randint(-20, 20)
-            offset_y = random.randint(-20, 20)
-            
-            x = max(zone_info['x1'], min(zone_center_x + offset_x - new_w//2, zone_info['x2'] - new_w))
-            y = max(zone_info['y1'], min(zone_center_y + offset_y - new_h//2, zone_info['y2'] - new_h))
-            
-            
-            bg_h, bg_w = background.shape[:2]
-            if x + new_w > bg_w or y + new_h > bg_h or x < 0 or y < 0:
-                return background, None
-            
-            
-            if obj_img.shape[2] == 4:  
-                alpha = obj_img[:, :, 3] / 255.0
-                for c in range(3):
-                    background[y:y+new_h, x:x+new_w, c] = (
-                        alpha * obj_img[:, :, c] + 
-                        (1 - alpha) * background[y:y+new_h, x:x+new_w, c]
-                    )
-            else:  
-                blend_factor = 0.9  
-                background[y:y+new_h, x:x+new_w] = (
-                    blend_factor * obj_img[:, :, :3] + 
-                    (1 - blend_factor) * background[y:y+new_h, x:x+new_w]
-                )
-            
-            
-            bbox = {'x': x, 'y': y, 'width': new_w, 'height': new_h}
-            return background, bbox
-            
-        except Exception as e:
-            self.log_message(f"Ошибка размещения объекта: {e}")
-            return background, None
-    
-    def generate_single_image(self, background_path):
-        """Улучшенная генерация одного изображения с объектами"""
-        try:
-            
-            background = cv2.imread(background_path)
-            if background is None:
-                return None, []
-            
-            
-            viewing_angle = self.detect_viewing_angle(background)
-            
-            
-            zones = self.analyze_background(background)
-            
-            
-            annotations = []
-            
-            
-            num_objects = random.randint(1, self.max_objects.get())
-            
-            
-            placed_objects = []
-            
-            for _ in range(num_objects):
-                
-                available_categories = [cat for cat, objects in self.asset_objects.items() if objects]
-                if not available_categories:
-                    break
-                
-                category = random.choice(available_categories)
-                
-                
-                suitable_objects = self.get_suitable_objects_by_angle(category, viewing_angle)
-                if not suitable_objects:
-                    continue
-                
-                object_path = random.choice(suitable_objects)
-                
-                
-                suitable_zones = self.get_suitable_zones(category, zones)
-                if not suitable_zones:
-                    continue
-                
-                
-                placement_attempts = 0
-                max_placement_attempts = 5
-                
-                while placement_attempts < max_placement_attempts:
-                    
-                    zone = random.choice(suitable_zones)
-                    
-                    
-                    background, bbox = self.place_object_on_image(
-                        background, object_path, zone['center'], zone, category, viewing_angle
-                    )
-                    
-                    if bbox:
-                        
-                        overlap = False
-                        for placed_bbox in placed_objects:
-                            if self.check_overlap(bbox, placed_bbox):
-                                overlap = True
-                                break
-                        
-                        if not overlap:
-                            annotations.append({
-                                'category': category,
-                                'bbox': bbox,
-                                'object_path': object_path,
-                                'viewing_angle': viewing_angle
-                            })
-                            placed_objects.append(bbox)
-                            break
-                    
-                    placement_attempts += 1
-            
-            return background, annotations
-            
-        except Exception as e:
-            self.log_message(f"Ошибка генерации изображения: {e}")
-            return None, []
-    
-    def check_overlap(self, bbox1, bbox2, threshold=0.3):
-        """Проверка перекрытия двух bounding box"""
-        x1_min, y1_min = bbox1['x'], bbox1['y']
-        x1_max, y1_max = x1_min + bbox1['width'], y1_min + bbox1['height']
-        
-        x2_min, y2_min = bbox2['x'], bbox2['y']
-        x2_max, y2_max = x2_min + bbox2['width'], y2_min + bbox2['height']
-        
-        
-        intersection_x_min = max(x1_min, x2_min)
-        intersection_y_min = max(y1_min, y2_min)
-        intersection_x_max = min(x1_max, x2_max)
-        intersection_y_max = min(y1_max, y2_max)
-        
-        if intersection_x_min >= intersection_x_max or intersection_y_min >= intersection_y_max:
-            return False
-        
-        
-        intersection_area = (intersection_x_max - intersection_x_min) * (intersection_y_max - intersection_y_min)
-        
-        
-        area1 = bbox1['width'] * bbox1['height']
-        area2 = bbox2['width'] * bbox2['height']
-        
-        
-        overlap_ratio = intersection_area / min(area1, area2)
-        
-        return overlap_ratio > threshold
-    
     def preview_generation(self):
-        """Предварительный просмотр генерации"""
+        """Предварительный просмотр генерации: галерея из нескольких образцов"""
         if not self.background_images:
             messagebox.showerror("Ошибка", "Сначала загрузите фоновые изображения")
             return
@@ -653,47 +299,85 @@ class SyntheticDataGenerator:
             messagebox.showerror("Ошибка", "Не загружены объекты для размещения")
             return
         
-        
-        background_path = random.choice(self.background_images)
-        self.log_message(f"Генерация превью для: {os.path.basename(background_path)}")
-        
-        
-        result_image, annotations = self.generate_single_image(background_path)
-        
-        if result_image is not None:
-            
-            self.show_preview(result_image, annotations)
-            self.log_message(f"Размещено объектов: {len(annotations)}")
-        else:
-            messagebox.showerror("Ошибка", "Не удалось сгенерировать превью")
+        try:
+            num_samples = max(1, self.num_preview_samples.get())
+        except tk.TclError:
+            num_samples = 4
+        
+        self.preview_samples = [
+            (random.choice(self.background_images), random.getrandbits(32))
+            for _ in range(num_samples)
+        ]
+        self.log_message(f"Генерация превью для {num_samples} фонов")
+        
+        self.create_preview_tiles(num_samples)
+        self.refresh_preview_gallery()
     
-    def show_preview(self, image, annotations):
-        """Отображение превью изображения"""
-        
-        preview_img = image.copy()
-        for ann in annotations:
-            bbox = ann['bbox']
-            x, y, w, h = bbox['x'], bbox['y'], bbox['width'], bbox['height']
-            cv2.rectangle(preview_img, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            cv2.putText(preview_img, ann['category'], (x, y - 10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-        
-        
-        preview_img = cv2.cvtColor(preview_img, cv2.COLOR_BGR2RGB)
-        preview_img = Image.fromarray(preview_img)
+    def apply_generation_settings(self):
+        """Передача настроек интерфейса в движок генерации"""
+        try:
+            self.engine.max_objects = max(1, self.max_objects.get())
+            self.engine.harmonization_strength = min(1.0, max(0.0, self.harmonization_strength.get()))
+            self.engine.shadows_enabled = self.shadows_enabled.get()
+            self.engine.sun_azimuth = self.sun_azimuth.get() % 360
+            self.engine.sun_elevation = min(90.0, max(10.0, self.sun_elevation.get()))
+            self.engine.category_weights = {
+                category: max(0.0, weight.get()) for category, weight in self.category_weights.items()
+            }
+        except tk.TclError:
+            return False
+        return True
+    
+    def schedule_preview_refresh(self, *args):
+        """Отложенное обновление галереи после изменения настроек"""
+        if not self.preview_samples:
+            return
         
+        if self.preview_refresh_job is not None:
+            self.root.after_cancel(self.preview_refresh_job)
+        self.preview_refresh_job = self.root.after(150, self.refresh_preview_gallery)
+    
+    def refresh_preview_gallery(self):
+        """Перерисовка галереи превью с текущими настройками"""
+        self.preview_refresh_job = None
+        if not self.preview_samples or not self.apply_generation_settings():
+            return
         
-        display_size = (400, 300)
-        preview_img.thumbnail(display_size, Image.Resampling.LANCZOS)
+        self.preview_request_id = self.preview_renderer.render(self.engine, self.preview_samples)
+    
+    def create_preview_tiles(self, num_samples):
+        """Создание ячеек галереи превью"""
+        for tile in self.preview_tiles:
+            tile.destroy()
+        self.preview_label.grid_remove()
+        
+        columns = 2 if num_samples <= 4 else 3
+        self.preview_tiles = []
+        for index in range(num_samples):
+            row, column = divmod(index, columns)
+            tile = ttk.Label(self.preview_gallery, text="...", compound=tk.TOP)
+            tile.grid(row=row, column=column, padx=2, pady=2)
+            self.preview_tiles.append(tile)
+    
+    def show_preview(self, slot, image, num_annotations):
+        """Отображение готовой миниатюры в ячейке галереи"""
+        if slot >= len(self.preview_tiles):
+            return
         
+        tile = self.preview_tiles[slot]
+        if image is None:
+            tile.configure(image="", text="Ошибка превью")
+            tile.image = None
+            return
         
-        photo = ImageTk.PhotoImage(preview_img)
-        self.preview_label.configure(image=photo, text="")
-        self.preview_label.image = photo  
+        photo = ImageTk.PhotoImage(Image.fromarray(image))
+        tile.configure(image=photo, text=f"Объектов: {num_annotations}")
+        tile.image = photo  
     
     def generate_dataset(self):
         """Генерация полного датасета"""
-        if not self.background_images:
+        procedural = ProceduralBackgroundGenerator() if self.procedural_backgrounds.get() else None
+        if not self.background_images and procedural is None:
             messagebox.showerror("Ошибка", "Сначала загрузите фоновые изображения")
             return
         
@@ -705,6 +389,10 @@ class SyntheticDataGenerator:
             messagebox.showerror("Ошибка", "Не загружены объекты для размещения")
             return
         
+        if self.worker.is_running():
+            messagebox.showwarning("Предупреждение", "Дождитесь завершения текущей задачи")
+            return
+        
         output_path = Path(self.output_folder.get())
         images_path = output_path / "images"
         labels_path = output_path / "labels"
@@ -714,83 +402,95 @@ class SyntheticDataGenerator:
         labels_path.mkdir(parents=True, exist_ok=True)
         
         num_to_generate = self.num_images.get()
+        num_workers = self.num_workers.get()
         self.progress['maximum'] = num_to_generate
+        self.progress['value'] = 0
+        self.throughput_label.configure(text="")
         
-        self.log_message(f"Начинается генерация {num_to_generate} изображений...")
+        self.log_message(f"Начинается генерация {num_to_generate} изображений ({num_workers} процессов)...")
         
         
         categories = list(self.asset_objects.keys())
+        self.output_path = output_path
+        self.categories = categories
+        
+        self.apply_generation_settings()
+        scene_index = SceneIndex(str(output_path / "scene_index.json")) if self.balance_classes.get() else None
+        self.worker.start_dataset(self.background_images, images_path, labels_path,
+                                  categories, num_to_generate, num_workers, scene_index,
+                                  str(output_path / "assets_atlas.bin"), procedural,
+                                  str(output_path / "dataset_report.json"),
+                                  FrameFilter() if self.filter_frames.get() else None)
+        self.set_generation_controls(running=True)
+    
+    def toggle_pause(self):
+        """Пауза и продолжение генерации"""
+        if not self.worker.is_running():
+            return
         
-        successful_generations = 0
-        attempts = 0
-        max_attempts = num_to_generate * 3  
-        
-        while successful_generations < num_to_generate and attempts < max_attempts:
-            
-            background_path = random.choice(self.background_images)
-            
-            
-            result_image, annotations = self.generate_single_image(background_path)
-            
-            
-            if result_image is not None:
-                
-                image_filename = f"synthetic_{successful_generations:04d}.jpg"
-                image_path = images_path / image_filename
-                cv2.imwrite(str(image_path), result_image)
+        if self.worker.is_paused():
+            self.worker.resume()
+            self.pause_button.configure(text="Пауза")
+            self.log_message("Генерация продолжена")
+        else:
+            self.worker.pause()
+            self.pause_button.configure(text="Продолжить")
+            self.log_message("Генерация приостановлена")
+    
+    def cancel_generation(self):
+        """Отмена генерации"""
+        if self.worker.is_running():
+            self.worker.cancel()
+            self.log_message("Отмена генерации...")
+    
+    def set_generation_controls(self, running):
+        """Переключение доступности кнопок управления генерацией"""
+        state = tk.NORMAL if running else tk.DISABLED
+        self.pause_button.configure(state=state, text="Пауза")
+        self.cancel_button.configure(state=state)
+    
+    def poll_worker_events(self):
+        """Обработка событий фонового генератора в потоке интерфейса"""
+        try:
+            while True:
+                kind, data = self.worker.events.get_nowait()
                 
+                if kind == 'log':
+                    self.log_message(data)
                 
-                label_filename = f"synthetic_{successful_generations:04d}.txt"
-                label_path = labels_path / label_filename
+                elif kind == 'progress':
+                    done, total, rate = data
+                    self.progress['value'] = done
+                    self.throughput_label.configure(text=f"{done}/{total} | {rate:.2f} изобр./с")
                 
-                if annotations:
-                    self.save_yolo_annotation(label_path, annotations, result_image.shape, categories)
-                else:
-                    
-                    label_path.touch()
+                elif kind == 'gallery':
+                    request_id, slot, image, num_annotations = data
+                    if request_id == self.preview_request_id:
+                        self.show_preview(slot, image, num_annotations)
                 
-                successful_generations += 1
-                if annotations:
-                    self.log_message(f"Сгенерировано: {image_filename} с {len(annotations)} объектами")
-                else:
-                    self.log_message(f"Сгенерировано: {image_filename} (чистый фон)")
-            
-            attempts += 1
-            
-            
-            self.progress['value'] = successful_generations
-            self.root.update()
-        
-        
-        classes_file = output_path / "classes.txt"
+                elif kind == 'done':
+                    self.on_generation_finished(*data)
+        except queue.Empty:
+            pass
+        
+        self.root.after(100, self.poll_worker_events)
+    
+    def on_generation_finished(self, successful_generations, num_to_generate, cancelled):
+        """Завершение генерации датасета"""
+        self.set_generation_controls(running=False)
+        
+        classes_file = self.output_path / "classes.txt"
         with open(classes_file, 'w') as f:
-            for category in categories:
+            for category in self.categories:
                 f.write(f"{category}\n")
         
-        self.log_message(f"Генерация завершена! Успешно: {successful_generations}/{num_to_generate}")
-        self.log_message(f"Файлы сохранены в: {output_path}")
+        if cancelled:
+            self.log_message(f"Генерация отменена. Успешно: {successful_generations}/{num_to_generate}")
+        else:
+            self.log_message(f"Генерация завершена! Успешно: {successful_generations}/{num_to_generate}")
+        self.log_message(f"Файлы сохранены в: {self.output_path}")
         
         messagebox.showinfo("Готово", f"Датасет сгенерирован!\nУспешно: {successful_generations} изображений")
-    
-    def save_yolo_annotation(self, label_path, annotations, image_shape, categories):
-        """Сохранение разметки в формате YOLO"""
-        height, width = image_shape[:2]
-        
-        with open(label_path, 'w') as f:
-            for ann in annotations:
-                category = ann['category']
-                bbox = ann['bbox']
-                
-                
-                class_id = categories.index(category)
-                
-                
-                x_center = (bbox['x'] + bbox['width'] / 2) / width
-                y_center = (bbox['y'] + bbox['height'] / 2) / height
-                norm_width = bbox['width'] / width
-                norm_height = bbox['height'] / height
-                
-                f.write(f"{class_id} {x_center:.6f} {y_center:.6f} {norm_width:.6f} {norm_height:.6f}\n")
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,151 @@
+import json
+import os
+import re
+
+import numpy as np
+
+
+OBJECT_SIZES_M = {
+    'vehicles': (3.5, 6.0),
+    'people': (0.5, 1.8),
+    'animals': (0.8, 2.5),
+    'trees': (3.0, 12.0),
+    'fire': (1.0, 6.0),
+    'smoke': (3.0, 15.0),
+    'aircraft': (8.0, 35.0),
+    'boats': (4.0, 15.0)
+}
+
+DEFAULT_OBJECT_SIZE_M = (1.0, 5.0)
+
+DEFAULT_FRAME_WIDTH_M = 100.0
+
+VIRTUAL_HORIZON = {
+    'top_down': None,
+    'angled': -1.0,
+    'side_view': 0.3
+}
+
+# Наклон подвеса камеры в XMP (DJI: drone-dji:GimbalPitchDegree, Parrot: Camera:Pitch),
+# как в виде атрибута, так и в виде элемента
+GIMBAL_PITCH_PATTERN = re.compile(
+    rb'(?:GimbalPitchDegree|Camera:Pitch)\s*(?:=\s*"|>)\s*([+-]?\d+(?:\.\d+)?)'
+)
+
+XMP_SEARCH_BYTES = 256 * 1024
+
+
+class GroundSamplingModel:
+    """Модель «метров на пиксель» для каждой строки кадра.
+
+    Земля считается плоской: для камеры с наклоном размер пикселя на земле
+    растет обратно пропорционально расстоянию строки до линии горизонта,
+    ``gsd(y) = gsd_bottom * (H - horizon_y) / (y - horizon_y)``. Для вида сверху
+    горизонта нет и размер пикселя постоянен. Таблица строится один раз
+    на фон, поэтому масштаб объекта считается одним обращением к массиву.
+    """
+
+    def __init__(self, height, gsd_bottom, horizon_y=None, far_limit=0.05):
+        self.height = height
+        self.gsd_bottom = gsd_bottom
+        self.horizon_y = horizon_y
+
+        rows = np.arange(height, dtype=np.float32) + 0.5
+        if horizon_y is None:
+            self.lut = np.full(height, gsd_bottom, dtype=np.float32)
+        else:
+            nearest_row = horizon_y + max(far_limit * height, 1.0)
+            distance = np.maximum(rows - horizon_y, nearest_row - horizon_y)
+            self.lut = (gsd_bottom * (height - horizon_y) / distance).astype(np.float32)
+
+    def metres_per_pixel(self, y):
+        """Размер пикселя на земле (м) для строки y"""
+        return float(self.lut[min(max(int(y), 0), self.height - 1)])
+
+    def object_size_px(self, size_m, y):
+        """Размер объекта в пикселях при его физическом размере size_m на строке y"""
+        return size_m / self.metres_per_pixel(y)
+
+    @classmethod
+    def estimate(cls, image_shape, viewing_angle, zones=None, metadata=None):
+        """Построение модели по метаданным фона или по результату анализа сцены"""
+        height, width = image_shape[:2]
+        metadata = metadata or {}
+
+        gsd = metadata.get('gsd')
+        if gsd is None:
+            gsd = metadata.get('frame_width_m', DEFAULT_FRAME_WIDTH_M) / width
+
+        if 'horizon_y' in metadata:
+            horizon = metadata['horizon_y']
+            horizon_y = None if horizon is None else horizon * height
+        elif viewing_angle == 'top_down':
+            horizon_y = None
+        elif zones and zones.get('sky'):
+            horizon_y = float(max(cell['y2'] for cell in zones['sky']))
+        else:
+            horizon_y = VIRTUAL_HORIZON.get(viewing_angle, -1.0) * height
+
+        return cls(height, gsd, horizon_y)
+
+
+def read_gimbal_pitch(image_path):
+    """Наклон подвеса камеры в градусах из XMP-блока изображения или None"""
+    try:
+        with open(image_path, 'rb') as f:
+            header = f.read(XMP_SEARCH_BYTES)
+    except OSError:
+        return None
+
+    match = GIMBAL_PITCH_PATTERN.search(header)
+    return float(match.group(1)) if match else None
+
+
+def viewing_angle_from_pitch(pitch):
+    """Ракурс по наклону камеры: -90° — надир, 0° — горизонт"""
+    pitch = abs(pitch)
+    if pitch >= 70:
+        return 'top_down'
+    if pitch <= 15:
+        return 'side_view'
+    return 'angled'
+
+
+def _read_sidecar(background_path):
+    metadata_path = os.path.splitext(background_path)[0] + '.json'
+    if not os.path.exists(metadata_path):
+        return {}
+
+    try:
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    return metadata if isinstance(metadata, dict) else {}
+
+
+def load_scene_metadata(background_path, pixel_scale=1.0):
+    """Чтение метаданных фона из JSON рядом с изображением (``<имя фона>.json``).
+
+    Поддерживаемые поля: ``gsd`` — метров на пиксель у нижнего края кадра,
+    ``frame_width_m`` — ширина кадра у нижнего края в метрах,
+    ``horizon_y`` — положение горизонта в долях высоты (может быть отрицательным
+    или null для вида сверху), ``viewing_angle`` — известный ракурс,
+    ``gimbal_pitch`` — наклон камеры в градусах. Если ракурс не задан, наклон
+    берется из JSON или из XMP самого изображения и ракурс выводится из него.
+    ``pixel_scale`` пересчитывает ``gsd`` для уменьшенной копии фона.
+    """
+    metadata = _read_sidecar(background_path)
+
+    if not metadata.get('viewing_angle'):
+        pitch = metadata.get('gimbal_pitch')
+        if pitch is None:
+            pitch = read_gimbal_pitch(background_path)
+        if pitch is not None:
+            metadata['gimbal_pitch'] = pitch
+            metadata['viewing_angle'] = viewing_angle_from_pitch(pitch)
+
+    if metadata.get('gsd') is not None:
+        metadata['gsd'] = metadata['gsd'] / pixel_scale
+    return metadata
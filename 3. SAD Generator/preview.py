@@ -0,0 +1,150 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+from PIL import Image
+
+from perspective import load_scene_metadata
+
+
+class LRUCache:
+    """Простой потокобезопасный LRU-кэш ограниченного размера"""
+
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class PreviewRenderer:
+    """Галерея превью: несколько образцов, собранных сразу в уменьшенном разрешении.
+
+    Фоны декодируются в уменьшенном виде один раз и хранятся вместе с результатом
+    анализа сцены, поэтому при смене настроек перерисовывается только размещение
+    объектов. Готовые миниатюры кэшируются по фону, зерну и настройкам движка.
+    Результаты отправляются в очередь событий как
+    ``('gallery', (номер запроса, слот, RGB-миниатюра, число объектов))``.
+    """
+
+    def __init__(self, events, tile_size=(260, 195), max_workers=4):
+        self.events = events
+        self.tile_size = tile_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.backgrounds = LRUCache(64)
+        self.thumbnails = LRUCache(256)
+        self._request_id = 0
+        self._lock = threading.Lock()
+
+    def render(self, engine, samples):
+        """Асинхронная отрисовка галереи для списка пар (путь к фону, зерно)"""
+        with self._lock:
+            self._request_id += 1
+            request_id = self._request_id
+
+        engine = engine.with_seed(None)
+        engine.category_weights = dict(engine.category_weights)
+        settings_key = (engine.max_objects, engine.harmonization_strength,
+                        engine.shadows_enabled, engine.sun_azimuth, engine.sun_elevation,
+                        tuple(sorted(engine.category_weights.items())))
+        for slot, (background_path, seed) in enumerate(samples):
+            self.executor.submit(self._render_tile, request_id, slot, engine, background_path, seed, settings_key)
+
+        return request_id
+
+    def is_current(self, request_id):
+        """Проверка, что результат относится к последнему запросу"""
+        return request_id == self._request_id
+
+    def _render_tile(self, request_id, slot, engine, background_path, seed, settings_key):
+        if not self.is_current(request_id):
+            return
+
+        cache_key = (background_path, seed, settings_key)
+        tile = self.thumbnails.get(cache_key)
+
+        if tile is None:
+            try:
+                tile = self._compose_tile(engine, background_path, seed)
+            except Exception as e:
+                self.events.put(('log', f"Ошибка генерации превью: {e}"))
+                tile = None
+            if tile is not None:
+                self.thumbnails.put(cache_key, tile)
+
+        if tile is None:
+            self.events.put(('gallery', (request_id, slot, None, 0)))
+        else:
+            self.events.put(('gallery', (request_id, slot) + tile))
+
+    def _compose_tile(self, engine, background_path, seed):
+        background = self._load_background(engine, background_path)
+        if background is None:
+            return None
+
+        thumbnail, scene, ratio = background
+        preview_engine = engine.with_seed(seed)
+        preview_engine.min_object_size = max(2, int(round(engine.min_object_size * ratio)))
+
+        image, annotations = preview_engine.compose_scene(thumbnail.copy(), scene)
+
+        for ann in annotations:
+            bbox = ann['bbox']
+            x, y, w, h = bbox['x'], bbox['y'], bbox['width'], bbox['height']
+            cv2.rectangle(image, (x, y), (x + w, y + h), (0, 255, 0), 1)
+            cv2.putText(image, ann['category'], (x, max(8, y - 3)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.3, (0, 255, 0), 1)
+
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB), len(annotations)
+
+    def _load_background(self, engine, background_path):
+        """Уменьшенный фон с результатом анализа сцены (кэшируется)"""
+        cached = self.backgrounds.get(background_path)
+        if cached is not None:
+            return cached
+
+        tile_w, tile_h = self.tile_size
+        image = cv2.imread(background_path, cv2.IMREAD_REDUCED_COLOR_4)
+        if image is None or image.shape[1] < tile_w or image.shape[0] < tile_h:
+            image = cv2.imread(background_path)
+        if image is None:
+            return None
+
+        with Image.open(background_path) as header:
+            full_w = header.size[0]
+
+        scale = min(tile_w / image.shape[1], tile_h / image.shape[0], 1.0)
+        thumbnail = cv2.resize(image, (max(1, int(image.shape[1] * scale)), max(1, int(image.shape[0] * scale))),
+                               interpolation=cv2.INTER_AREA)
+
+        ratio = thumbnail.shape[1] / full_w
+        scene = engine.analyze_scene(thumbnail, load_scene_metadata(background_path, ratio))
+        cached = (thumbnail, scene, ratio)
+        self.backgrounds.put(background_path, cached)
+        return cached
+
+    def clear(self):
+        """Сброс кэшей, например после смены набора объектов"""
+        self.backgrounds.clear()
+        self.thumbnails.clear()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,199 @@
+import cv2
+import numpy as np
+
+
+# Слои процедурного фона: (зона, цвет BGR, амплитуда текстуры, масштаб текстуры в пикселях).
+# Несколько оттенков поля дают мозаику сельхозучастков.
+TERRAIN_LAYERS = [
+    ('field', (70, 150, 120), 18, 6),
+    ('field', (60, 130, 150), 18, 6),
+    ('field', (90, 160, 100), 14, 4),
+    ('forest', (40, 85, 35), 30, 3),
+    ('ground', (70, 100, 130), 16, 5),
+    ('water', (120, 85, 40), 6, 24),
+    ('road', (80, 80, 80), 8, 2),
+    ('building', (150, 150, 155), 20, 8),
+]
+
+FIELD_LAYERS = [index for index, layer in enumerate(TERRAIN_LAYERS) if layer[0] == 'field']
+FOREST, GROUND, WATER, ROAD, BUILDING = (
+    [layer[0] for layer in TERRAIN_LAYERS].index(zone)
+    for zone in ('forest', 'ground', 'water', 'road', 'building')
+)
+
+# Доля дороги в ячейке, при которой ячейка считается дорогой
+ROAD_CELL_SHARE = 0.15
+
+
+def fractal_noise(rng, height, width, scale, octaves=4, persistence=0.5):
+    """Фрактальный шум в диапазоне [0, 1]: сумма октав случайных сеток, растянутых INTER_CUBIC"""
+    noise = np.zeros((height, width), dtype=np.float32)
+    amplitude = 1.0
+    total = 0.0
+    for _ in range(octaves):
+        grid_h = max(2, int(height / scale) + 2)
+        grid_w = max(2, int(width / scale) + 2)
+        grid = rng.random((grid_h, grid_w), dtype=np.float32)
+        noise += amplitude * cv2.resize(grid, (width, height), interpolation=cv2.INTER_CUBIC)
+        total += amplitude
+        amplitude *= persistence
+        scale /= 2
+        if scale < 1:
+            break
+
+    noise /= total
+    cv2.normalize(noise, noise, 0.0, 1.0, cv2.NORM_MINMAX)
+    return noise
+
+
+class ProceduralBackgroundGenerator:
+    """Синтез аэрофотоподобных фонов (поля, лес, вода, дороги, постройки) без чтения с диска.
+
+    Карта местности строится по фрактальному шуму на сетке в 1/4 разрешения,
+    дороги и постройки рисуются поверх, цвет берется из заранее подготовленных
+    текстур слоев, которые больше кадра и выбираются со случайным смещением
+    без копирования. Вместе с кадром возвращается карта зон и зоны сетки
+    в формате ``SceneGenerator.analyze_background``, так что анализ фона
+    не нужен. Кадры — вид сверху.
+    """
+
+    def __init__(self, width=1280, height=960, frame_width_m=120.0, grid_size=12, seed=None):
+        self.width = width
+        self.height = height
+        self.frame_width_m = frame_width_m
+        self.grid_size = grid_size
+        self.seed = seed
+        self._textures = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_textures'] = None
+        return state
+
+    @property
+    def shape(self):
+        return (self.height, self.width, 3)
+
+    @property
+    def metadata(self):
+        """Метаданные кадра для GroundSamplingModel"""
+        return {'viewing_angle': 'top_down', 'frame_width_m': self.frame_width_m, 'horizon_y': None}
+
+    @property
+    def textures(self):
+        """Текстуры слоев размером (H + 256, W + 256), строятся один раз на процесс"""
+        if self._textures is None:
+            rng = np.random.default_rng(self.seed)
+            tex_h, tex_w = self.height + 256, self.width + 256
+            self._textures = []
+            for zone, color, amplitude, scale in TERRAIN_LAYERS:
+                detail = fractal_noise(rng, tex_h, tex_w, scale * 4, octaves=3) - 0.5
+                texture = np.empty((tex_h, tex_w, 3), dtype=np.uint8)
+                for channel, base in enumerate(color):
+                    texture[:, :, channel] = np.clip(base + 2 * amplitude * detail, 0, 255)
+                self._textures.append(texture)
+        return self._textures
+
+    def _terrain_map(self, rng):
+        """Карта слоев в 1/4 разрешения по шуму влажности, растительности и участков"""
+        low_h, low_w = self.height // 4, self.width // 4
+        moisture = fractal_noise(rng, low_h, low_w, low_w / 2)
+        vegetation = fractal_noise(rng, low_h, low_w, low_w / 3)
+
+        parcels = rng.integers(0, len(FIELD_LAYERS), size=(rng.integers(3, 7), rng.integers(3, 7)), dtype=np.uint8)
+        terrain = cv2.resize(np.array(FIELD_LAYERS, dtype=np.uint8)[parcels], (low_w, low_h),
+                             interpolation=cv2.INTER_NEAREST)
+
+        terrain[vegetation > rng.uniform(0.55, 0.75)] = FOREST
+        terrain[vegetation < rng.uniform(0.1, 0.25)] = GROUND
+        terrain[moisture < rng.uniform(0.0, 0.25)] = WATER
+
+        return cv2.resize(terrain, (self.width, self.height), interpolation=cv2.INTER_NEAREST)
+
+    def _draw_roads(self, rng, terrain):
+        """Дороги — ломаные через кадр, вдоль них — прямоугольники построек"""
+        for _ in range(rng.integers(1, 4)):
+            thickness = int(rng.integers(8, 20))
+            if rng.random() < 0.5:
+                xs = np.linspace(0, self.width, 6)
+                ys = rng.uniform(0, self.height) + np.cumsum(rng.normal(0, self.height * 0.06, 6))
+            else:
+                ys = np.linspace(0, self.height, 6)
+                xs = rng.uniform(0, self.width) + np.cumsum(rng.normal(0, self.width * 0.06, 6))
+            points = np.stack([xs, ys], axis=1).astype(np.int32)
+            cv2.polylines(terrain, [points], False, ROAD, thickness)
+
+            for _ in range(rng.integers(0, 6)):
+                x, y = points[rng.integers(0, len(points))]
+                w, h = rng.integers(15, 50, size=2)
+                x += int(rng.integers(thickness, 3 * thickness)) * (1 if rng.random() < 0.5 else -1)
+                cv2.rectangle(terrain, (int(x), int(y)), (int(x + w), int(y + h)), BUILDING, -1)
+
+    def zones_from_map(self, terrain):
+        """Зоны сетки по карте слоев: зона ячейки — преобладающий слой
+        (дорога — уже при доле ROAD_CELL_SHARE), центр — средняя точка этого слоя в ячейке"""
+        zones = {zone: [] for zone in dict.fromkeys(layer[0] for layer in TERRAIN_LAYERS)}
+        zones.setdefault('sky', [])
+        zones.setdefault('snow', [])
+
+        grid_size = self.grid_size
+        cell_w = self.width // grid_size
+        cell_h = self.height // grid_size
+        num_layers = len(TERRAIN_LAYERS)
+
+        sample = terrain[:cell_h * grid_size:4, :cell_w * grid_size:4]
+        ys, xs = np.mgrid[0:sample.shape[0], 0:sample.shape[1]]
+        cell_index = (ys * 4 // cell_h) * grid_size + xs * 4 // cell_w
+        bins = (cell_index * num_layers + sample).ravel()
+        size = grid_size * grid_size * num_layers
+
+        counts = np.bincount(bins, minlength=size).reshape(grid_size * grid_size, num_layers)
+        sum_x = np.bincount(bins, weights=xs.ravel() * 4, minlength=size).reshape(counts.shape)
+        sum_y = np.bincount(bins, weights=ys.ravel() * 4, minlength=size).reshape(counts.shape)
+
+        for cell, layer_counts in enumerate(counts):
+            i, j = divmod(cell, grid_size)
+            if layer_counts[ROAD] >= ROAD_CELL_SHARE * layer_counts.sum():
+                layer = ROAD
+            else:
+                layer = int(np.argmax(layer_counts))
+
+            x1, y1 = j * cell_w, i * cell_h
+            x2, y2 = min((j + 1) * cell_w, self.width), min((i + 1) * cell_h, self.height)
+            center = (int(sum_x[cell, layer] / layer_counts[layer]), int(sum_y[cell, layer] / layer_counts[layer]))
+
+            zones[TERRAIN_LAYERS[layer][0]].append({
+                'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+                'center': center,
+                'position_ratio': i / grid_size
+            })
+
+        return zones
+
+    def zone_capacity(self):
+        """Зоны, которые могут встретиться на процедурном фоне (для планировщика классов)"""
+        return {layer[0]: self.grid_size * self.grid_size for layer in TERRAIN_LAYERS}
+
+    def generate(self, seed=None, out=None):
+        """Новый фон: (изображение BGR, карта слоев uint8, зоны сетки).
+
+        Если передан out (например, слот общей памяти), изображение пишется в него.
+        """
+        rng = np.random.default_rng(seed)
+        textures = self.textures
+
+        terrain = self._terrain_map(rng)
+        self._draw_roads(rng, terrain)
+
+        if out is None:
+            out = np.empty(self.shape, dtype=np.uint8)
+
+        dy, dx = rng.integers(0, 256, size=2)
+        for layer, texture in enumerate(textures):
+            mask = (terrain == layer).view(np.uint8)
+            if mask.any():
+                cv2.copyTo(texture[dy:dy + self.height, dx:dx + self.width], mask, out)
+
+        cv2.convertScaleAbs(out, out, alpha=rng.uniform(0.85, 1.15), beta=rng.uniform(-10, 10))
+
+        return out, terrain, self.zones_from_map(terrain)
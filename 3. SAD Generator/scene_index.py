@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from engine import ZONE_TYPES, cell_mean_hsv, classify_viewing_angles, classify_zone_cells, zone_counts_from_labels
+from perspective import load_scene_metadata
+
+
+class SceneIndex:
+    """Индекс фонов: число ячеек каждой зоны и ракурс для каждого файла.
+
+    Индекс строится по уменьшенным копиям фонов, сохраняется в JSON и при
+    повторном запуске пересчитывает только новые или измененные файлы.
+    Фоны обрабатываются пакетами: в пуле потоков каждый файл только
+    декодируется в уменьшенном виде и сводится к средним HSV ячеек и признакам
+    ракурса, а зоны и ракурсы всего пакета классифицируются одним вызовом
+    над массивами.
+    """
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if index_path and os.path.exists(index_path):
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        if not self.index_path:
+            return
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def _signature(path):
+        stat = os.stat(path)
+        return [stat.st_mtime, stat.st_size]
+
+    def is_current(self, path):
+        entry = self.entries.get(path)
+        try:
+            return entry is not None and entry['signature'] == self._signature(path)
+        except OSError:
+            return False
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    def scene_features(self, engine, path):
+        """Признаки одного фона по уменьшенной копии: средние HSV ячеек и признаки ракурса"""
+        image = cv2.imread(path, cv2.IMREAD_REDUCED_COLOR_4)
+        if image is None:
+            return None
+
+        viewing_angle = load_scene_metadata(path).get('viewing_angle')
+        return {
+            'signature': self._signature(path),
+            'cells': cell_mean_hsv(image),
+            'viewing_angle': viewing_angle,
+            'angle_features': None if viewing_angle else engine.viewing_angle_features(image)
+        }
+
+    @staticmethod
+    def classify_batch(features):
+        """Записи индекса для пакета признаков (классификация одним вызовом на пакет)"""
+        labels = classify_zone_cells(np.stack([item['cells'] for item in features]))
+        counts = zone_counts_from_labels(labels)
+
+        angle_features = np.array([item['angle_features'] or (0.0, 0.0, 0.0) for item in features],
+                                  dtype=np.float32)
+        angles = classify_viewing_angles(*angle_features.T)
+
+        entries = []
+        for item, zone_counts, angle in zip(features, counts, angles):
+            entries.append({
+                'signature': item['signature'],
+                'viewing_angle': item['viewing_angle'] or str(angle),
+                'zones': {zone: int(count) for zone, count in zip(ZONE_TYPES, zone_counts)}
+            })
+        return entries
+
+    def analyze(self, engine, path):
+        """Анализ одного фона по уменьшенной копии"""
+        features = self.scene_features(engine, path)
+        return self.classify_batch([features])[0] if features is not None else None
+
+    def build(self, engine, paths, max_workers=4, cancel_event=None, progress_callback=None, batch_size=256):
+        """Добавление в индекс всех фонов, которых в нем нет или которые изменились"""
+        missing = [path for path in paths if not self.is_current(path)]
+
+        def features(path):
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            return self.scene_features(engine, path)
+
+        done = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for start in range(0, len(missing), batch_size):
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+
+                batch = missing[start:start + batch_size]
+                analyzed = [(path, item) for path, item in zip(batch, executor.map(features, batch))
+                            if item is not None]
+                if analyzed:
+                    entries = self.classify_batch([item for _, item in analyzed])
+                    with self._lock:
+                        for (path, _), entry in zip(analyzed, entries):
+                            self.entries[path] = entry
+
+                done += len(batch)
+                if progress_callback:
+                    progress_callback(done, len(missing))
+
+        if missing:
+            self.save()
+        return len(missing)
+
+    def capabilities(self, engine, path):
+        """Категории, для которых на фоне есть подходящие зоны"""
+        entry = self.entries.get(path)
+        if entry is None:
+            return set()
+        return engine.placeable_categories(entry['zones'])
@@ -0,0 +1,74 @@
+import random
+from collections import Counter
+
+
+class BalancedScheduler:
+    """Планировщик, выравнивающий распределение классов по всему датасету.
+
+    Для каждого изображения заранее выбираются фон и список категорий:
+    сначала категория с наибольшим дефицитом относительно целевой доли,
+    затем фон, на котором ее можно разместить, затем остальные объекты
+    из категорий, допустимых на этом фоне, также по дефициту. Учитываются
+    и уже размещенные объекты, и запланированные, но еще не готовые.
+    """
+
+    def __init__(self, target_weights, background_capabilities, max_objects, rng=None):
+        self.rng = rng or random.Random()
+        self.max_objects = max_objects
+
+        self.backgrounds_by_category = {}
+        for path, categories in background_capabilities.items():
+            for category in categories:
+                self.backgrounds_by_category.setdefault(category, []).append(path)
+
+        weights = {category: weight for category, weight in target_weights.items()
+                   if weight > 0 and category in self.backgrounds_by_category}
+        total_weight = sum(weights.values())
+        self.target_shares = {category: weight / total_weight for category, weight in weights.items()}
+        self.unreachable = sorted(category for category, weight in target_weights.items()
+                                  if weight > 0 and category not in self.target_shares)
+
+        self.background_capabilities = background_capabilities
+        self.placed = Counter()
+        self.pending = Counter()
+
+    def is_empty(self):
+        return not self.target_shares
+
+    def _deficits(self, categories):
+        counts = self.placed + self.pending
+        total = sum(counts[category] for category in self.target_shares) + 1
+        return {category: self.target_shares[category] * total - counts[category] for category in categories}
+
+    def _most_needed(self, categories):
+        deficits = self._deficits(categories)
+        best = max(deficits.values())
+        candidates = [category for category, deficit in deficits.items() if deficit == best]
+        return self.rng.choice(candidates)
+
+    def next_plan(self):
+        """План следующего изображения: (путь к фону, список категорий)"""
+        lead_category = self._most_needed(self.target_shares)
+        background_path = self.rng.choice(self.backgrounds_by_category[lead_category])
+
+        allowed = [category for category in self.target_shares
+                   if category in self.background_capabilities[background_path]]
+
+        categories = [lead_category]
+        self.pending[lead_category] += 1
+        for _ in range(self.rng.randint(1, self.max_objects) - 1):
+            category = self._most_needed(allowed)
+            categories.append(category)
+            self.pending[category] += 1
+
+        return background_path, categories
+
+    def complete(self, planned_categories, placed_categories):
+        """Учет результата: запланированное снимается, размещенное засчитывается"""
+        self.pending.subtract(planned_categories)
+        self.pending = +self.pending
+        self.placed.update(placed_categories)
+
+    def summary(self):
+        """Фактическое число объектов каждого класса"""
+        return {category: self.placed[category] for category in self.target_shares}
@@ -0,0 +1,192 @@
+import math
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+
+# Высота объекта относительно его размера в кадре: определяет длину тени
+OBJECT_HEIGHT_RATIO = {
+    'vehicles': 0.35,
+    'people': 1.5,
+    'animals': 0.6,
+    'trees': 1.0,
+    'boats': 0.25
+}
+
+DEFAULT_HEIGHT_RATIO = 0.4
+
+# Категории без тени: огонь светится сам, дым полупрозрачен, самолет далеко от земли
+NO_SHADOW_CATEGORIES = {'fire', 'smoke', 'aircraft'}
+
+# Категории, которые могут частично скрываться кронами деревьев
+CANOPY_CATEGORIES = {'people', 'animals', 'vehicles'}
+
+# Размытие тени (сигма) в долях размера объекта
+SHADOW_SOFTNESS = 0.04
+
+# Непрозрачность крон при перекрытии объекта
+CANOPY_OPACITY = 0.9
+
+
+@lru_cache(maxsize=64)
+def blur_kernel(sigma):
+    """Одномерное гауссово ядро для сепарабельного размытия (кэшируется по сигме)"""
+    ksize = 2 * int(math.ceil(3 * sigma)) + 1
+    return cv2.getGaussianKernel(ksize, sigma, cv2.CV_32F)
+
+
+def scale_bucket(size):
+    """Номер полуоктавной корзины масштаба для размера size (пикселей)"""
+    return int(round(2 * math.log2(max(size, 1))))
+
+
+def shadow_offset(sun_azimuth, sun_elevation, size_px, category):
+    """Смещение тени (dx, dy) в пикселях.
+
+    Азимут солнца отсчитывается по часовой стрелке от верхнего края кадра,
+    тень падает в противоположную сторону; длина пропорциональна высоте
+    объекта и котангенсу высоты солнца и ограничена полутора размерами объекта.
+    """
+    height = size_px * OBJECT_HEIGHT_RATIO.get(category, DEFAULT_HEIGHT_RATIO)
+    length = min(height / math.tan(math.radians(max(sun_elevation, 5.0))), 1.5 * size_px)
+    azimuth = math.radians(sun_azimuth)
+    return -length * math.sin(azimuth), length * math.cos(azimuth)
+
+
+class ShadowCache:
+    """Потокобезопасный LRU-кэш размытых масок тени по корзинам масштаба.
+
+    Маска строится один раз для объекта и полуоктавной корзины масштаба:
+    альфа-канал уровня пирамиды нужного размера дополняется полями
+    и размывается сепарабельным гауссовым ядром из кэша. При вставке
+    готовая маска только масштабируется до фактического размера объекта.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._masks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bucket_mask(self, object_path, pyramid, bucket):
+        key = (object_path, bucket)
+        with self._lock:
+            entry = self._masks.get(key)
+            if entry is not None:
+                self._masks.move_to_end(key)
+                return entry
+
+        h, w = pyramid.shape[:2]
+        long_side = 2 ** (bucket / 2)
+        scale = long_side / max(h, w)
+        bucket_w, bucket_h = max(1, round(w * scale)), max(1, round(h * scale))
+
+        level = pyramid.resize(bucket_w, bucket_h)
+        if level.shape[2] == 4:
+            alpha = level[:, :, 3].astype(np.float32) / 255.0
+        else:
+            alpha = np.ones((bucket_h, bucket_w), dtype=np.float32)
+
+        sigma = round(SHADOW_SOFTNESS * long_side + 0.5, 1)
+        kernel = blur_kernel(sigma)
+        pad = len(kernel) // 2
+        canvas = cv2.copyMakeBorder(alpha, pad, pad, pad, pad, cv2.BORDER_CONSTANT, value=0)
+        canvas = cv2.sepFilter2D(canvas, -1, kernel, kernel)
+
+        entry = (canvas, pad, bucket_w, bucket_h)
+        with self._lock:
+            self._masks[key] = entry
+            while len(self._masks) > self.max_entries:
+                self._masks.popitem(last=False)
+        return entry
+
+    def shadow_mask(self, object_path, pyramid, new_w, new_h):
+        """Размытая маска тени для объекта размером new_w x new_h: (маска, поле по x, поле по y)"""
+        canvas, pad, bucket_w, bucket_h = self._bucket_mask(object_path, pyramid, scale_bucket(max(new_w, new_h)))
+        pad_x = round(pad * new_w / bucket_w)
+        pad_y = round(pad * new_h / bucket_h)
+        mask = cv2.resize(canvas, (new_w + 2 * pad_x, new_h + 2 * pad_y), interpolation=cv2.INTER_LINEAR)
+        return mask, pad_x, pad_y
+
+    def clear(self):
+        with self._lock:
+            self._masks.clear()
+
+
+def sample_canopy(background, forest_cells, width, height, rng):
+    """Кроны деревьев из случайной лесной ячейки фона: (цвет, маска) размером width x height.
+
+    Маска покрывает светлые пятна листвы внутри лесных пикселей, более темные
+    просветы между кронами остаются открытыми, поэтому объект скрывается частично.
+    """
+    cell = rng.choice(forest_cells)
+    bg_h, bg_w = background.shape[:2]
+    if width > bg_w or height > bg_h:
+        return None
+
+    cx = rng.randint(cell['x1'], max(cell['x1'], cell['x2'] - 1))
+    cy = rng.randint(cell['y1'], max(cell['y1'], cell['y2'] - 1))
+    x = min(max(cx - width // 2, 0), bg_w - width)
+    y = min(max(cy - height // 2, 0), bg_h - height)
+    patch = background[y:y + height, x:x + width]
+
+    hsv = cv2.cvtColor(patch, cv2.COLOR_BGR2HSV)
+    forest = cv2.inRange(hsv, (35, 60, 0), (85, 255, 180)).astype(np.float32) / 255.0
+
+    # Кроны — светлые пятна листвы относительно локальной средней яркости
+    value = hsv[:, :, 2].astype(np.float32)
+    local_kernel = blur_kernel(3.0)
+    detail = value - cv2.sepFilter2D(value, -1, local_kernel, local_kernel)
+    foliage = np.clip(detail / (detail.std() + 1e-3) * 0.5 + 0.5, 0.0, 1.0)
+
+    kernel = blur_kernel(1.0)
+    mask = cv2.sepFilter2D(forest * foliage, -1, kernel, kernel) * CANOPY_OPACITY
+    return patch.astype(np.float32), mask
+
+
+def composite_object(background, obj_img, x, y, opacity=0.9, shadow=None, canopy=None):
+    """Вставка объекта вместе с тенью и перекрытием кронами за один проход по области вставки.
+
+    shadow — ``(маска, x, y, сила)``: размытая маска и ее левый верхний угол
+    в координатах кадра; canopy — ``(цвет, маска)`` размером с объект.
+    Объект должен целиком помещаться в кадр, тень обрезается по его границам.
+    """
+    h, w = obj_img.shape[:2]
+    bg_h, bg_w = background.shape[:2]
+
+    x1, y1, x2, y2 = x, y, x + w, y + h
+    if shadow is not None:
+        mask, sx, sy, strength = shadow
+        x1, y1 = max(min(x1, sx), 0), max(min(y1, sy), 0)
+        x2, y2 = min(max(x2, sx + mask.shape[1]), bg_w), min(max(y2, sy + mask.shape[0]), bg_h)
+
+    roi = background[y1:y2, x1:x2].astype(np.float32)
+
+    if shadow is not None:
+        shade = np.ones(roi.shape[:2], dtype=np.float32)
+        mx1, my1 = max(sx, x1), max(sy, y1)
+        mx2, my2 = min(sx + mask.shape[1], x2), min(sy + mask.shape[0], y2)
+        if mx2 > mx1 and my2 > my1:
+            shade[my1 - y1:my2 - y1, mx1 - x1:mx2 - x1] -= strength * mask[my1 - sy:my2 - sy, mx1 - sx:mx2 - sx]
+        roi *= shade[:, :, None]
+
+    if obj_img.shape[2] == 4:
+        alpha = obj_img[:, :, 3:4].astype(np.float32) / 255.0
+    else:
+        alpha = np.full((h, w, 1), opacity, dtype=np.float32)
+
+    color = obj_img[:, :, :3].astype(np.float32)
+    if canopy is not None:
+        canopy_color, canopy_mask = canopy
+        canopy_mask = canopy_mask[:, :, None]
+        color = color * (1 - canopy_mask) + canopy_color * canopy_mask
+
+    ox, oy = x - x1, y - y1
+    target = roi[oy:oy + h, ox:ox + w]
+    target *= 1 - alpha
+    target += alpha * color
+
+    background[y1:y2, x1:x2] = roi + 0.5
+    return background
@@ -0,0 +1,212 @@
+import queue
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from frame_filter import dhash
+from harmonization import attach_zone_color_stats
+from perspective import GroundSamplingModel, load_scene_metadata
+
+
+class SharedFrameSlots:
+    """Набор слотов кадров в одном блоке ``multiprocessing.shared_memory``.
+
+    Слот — участок фиксированного размера, в котором кадр декодируется,
+    дополняется объектами и кодируется в JPEG. Между процессами передается
+    только номер слота и форма кадра.
+    """
+
+    def __init__(self, num_slots, slot_bytes, name=None):
+        self.num_slots = num_slots
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(1, num_slots * slot_bytes))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def view(self, slot, shape):
+        """Массив формы shape поверх слота (без копирования)"""
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def fits(self, shape):
+        return int(np.prod(shape)) <= self.slot_bytes
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def decode_into_slot(background_path, slots, slot):
+    """Декодирование фона сразу в слот; None, если файл не читается или не помещается"""
+    with Image.open(background_path) as header:
+        width, height = header.size
+
+    shape = (height, width, 3)
+    if not slots.fits(shape):
+        return None
+
+    view = slots.view(slot, shape)
+    try:
+        image = cv2.imread(background_path, view, cv2.IMREAD_COLOR)
+    except (cv2.error, TypeError):
+        image = cv2.imread(background_path)
+    if image is None:
+        return None
+
+    if not np.shares_memory(image, view):
+        if not slots.fits(image.shape):
+            return None
+        view = slots.view(slot, image.shape)
+        np.copyto(view, image)
+
+    return view
+
+
+_process_engine = None
+_process_slots = None
+_process_procedural = None
+_process_log = []
+
+
+def _init_process(engine, slots_name, num_slots, slot_bytes, procedural=None):
+    """Инициализация процесса пула: копия движка и подключение к общей памяти"""
+    global _process_engine, _process_slots, _process_procedural
+    np.random.seed()
+    _process_engine = engine
+    _process_engine.rng.seed()
+    _process_engine.log_callback = _process_log.append
+    _process_slots = SharedFrameSlots(num_slots, slot_bytes, name=slots_name)
+    _process_procedural = procedural
+
+
+def _take_log():
+    messages = list(_process_log)
+    _process_log.clear()
+    return messages
+
+
+def _compose_task(slot, background_path, planned_categories):
+    """Декодирование фона в слот и размещение объектов прямо в нем"""
+    try:
+        background = decode_into_slot(background_path, _process_slots, slot)
+        if background is None:
+            return None, _take_log()
+
+        scene = _process_engine.analyze_scene(background, load_scene_metadata(background_path))
+        placement = Counter()
+        background, annotations = _process_engine.compose_scene(background, scene, planned_categories, placement)
+        if background is None:
+            return None, _take_log()
+        return (background.shape, annotations, dict(placement), dhash(background)), _take_log()
+    except Exception as e:
+        _process_log.append(f"Ошибка генерации изображения: {e}")
+        return None, _take_log()
+
+
+def _synthesize_task(slot, seed, planned_categories):
+    """Синтез процедурного фона в слоте и размещение объектов по его карте зон"""
+    try:
+        view = _process_slots.view(slot, _process_procedural.shape)
+        background, _, zones = _process_procedural.generate(seed, out=view)
+        attach_zone_color_stats(background, zones)
+
+        ground_model = GroundSamplingModel.estimate(background.shape, 'top_down', zones,
+                                                    _process_procedural.metadata)
+        placement = Counter()
+        background, annotations = _process_engine.compose_scene(background, ('top_down', zones, ground_model),
+                                                                planned_categories, placement)
+        if background is None:
+            return None, _take_log()
+        return (background.shape, annotations, dict(placement), dhash(background)), _take_log()
+    except Exception as e:
+        _process_log.append(f"Ошибка генерации изображения: {e}")
+        return None, _take_log()
+
+
+def _encode_task(slot, shape, image_path, quality):
+    """Кодирование кадра из слота в JPEG"""
+    frame = _process_slots.view(slot, shape)
+    return cv2.imwrite(image_path, frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+
+
+def max_frame_bytes(background_paths):
+    """Размер слота, достаточный для самого большого фона (по заголовкам файлов)"""
+    largest = 0
+    for path in background_paths:
+        try:
+            with Image.open(path) as header:
+                width, height = header.size
+        except OSError:
+            continue
+        largest = max(largest, width * height * 3)
+    return largest
+
+
+class CompositingPool:
+    """Пул процессов для сборки кадров в общей памяти.
+
+    ``compose`` декодирует фон в свободный слот и размещает объекты на месте,
+    ``frame`` дает доступ к готовому кадру в текущем процессе без копирования,
+    ``encode`` кодирует кадр из того же слота в рабочем процессе,
+    ``release`` возвращает слот в пул. Через границы процессов проходят только
+    номера слотов, формы кадров и записи разметки.
+
+    Если передан procedural (``procedural.ProceduralBackgroundGenerator``),
+    ``synthesize`` создает фон прямо в слоте вместо чтения файла.
+    """
+
+    def __init__(self, engine, num_workers, num_slots, slot_bytes, procedural=None):
+        self.slots = SharedFrameSlots(num_slots, slot_bytes)
+        self.free_slots = queue.Queue()
+        for slot in range(num_slots):
+            self.free_slots.put(slot)
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=num_workers, initializer=_init_process,
+            initargs=(engine, self.slots.name, num_slots, slot_bytes, procedural)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def acquire_slot(self, block=True, timeout=None):
+        """Свободный слот или None, если он не освободился"""
+        try:
+            return self.free_slots.get(block, timeout)
+        except queue.Empty:
+            return None
+
+    def release(self, slot):
+        self.free_slots.put(slot)
+
+    def compose(self, slot, background_path, planned_categories=None):
+        """Future с результатом ``((форма кадра, разметка, итоги размещения, dHash кадра) или None, сообщения лога)``"""
+        return self.executor.submit(_compose_task, slot, background_path, planned_categories)
+
+    def synthesize(self, slot, seed, planned_categories=None):
+        """Как compose, но фон синтезируется процедурно из seed"""
+        return self.executor.submit(_synthesize_task, slot, seed, planned_categories)
+
+    def encode(self, slot, shape, image_path, quality=95):
+        """Future с результатом записи JPEG"""
+        return self.executor.submit(_encode_task, slot, shape, str(image_path), quality)
+
+    def frame(self, slot, shape):
+        return self.slots.view(slot, shape)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.slots.close()
@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+
+from harmonization import sprite_color_stats
+
+
+def load_sprite(object_path):
+    """Чтение объекта: серые изображения приводятся к BGR, у PNG с прозрачностью
+    обрезаются полностью прозрачные поля"""
+    image = cv2.imread(object_path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+    if image.shape[2] == 4:
+        x, y, w, h = cv2.boundingRect(image[:, :, 3])
+        if w == 0 or h == 0:
+            return None
+        image = image[y:y+h, x:x+w]
+
+    return image
+
+
+class SpritePyramid:
+    """Набор уменьшенных копий объекта (mipmap) для быстрого и качественного масштабирования.
+
+    Каждый следующий уровень вдвое меньше предыдущего и строится с INTER_AREA,
+    поэтому масштабирование начинается с ближайшего уровня, который не меньше
+    целевого размера, и не дает алиасинга при сильном уменьшении.
+    ``color_stats`` — среднее и СКО Lab объекта для гармонизации цвета,
+    считается один раз по уровню около 64 пикселей.
+    """
+
+    def __init__(self, image, min_size=8):
+        self.levels = [image]
+        while True:
+            h, w = self.levels[-1].shape[:2]
+            if min(h, w) // 2 < min_size:
+                break
+            self.levels.append(cv2.resize(self.levels[-1], (w // 2, h // 2), interpolation=cv2.INTER_AREA))
+        self.color_stats = sprite_color_stats(self.level_for(64, 64))
+
+    @classmethod
+    def from_levels(cls, levels, color_stats=None):
+        """Пирамида из готовых уровней и статистики цвета (например, из атласа)"""
+        pyramid = cls.__new__(cls)
+        pyramid.levels = levels
+        pyramid.color_stats = color_stats
+        return pyramid
+
+    @property
+    def shape(self):
+        """Размер исходного изображения"""
+        return self.levels[0].shape
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels)
+
+    def level_for(self, new_w, new_h):
+        """Наименьший уровень, который не меньше запрошенного размера"""
+        for level in reversed(self.levels):
+            h, w = level.shape[:2]
+            if w >= new_w and h >= new_h:
+                return level
+        return self.levels[0]
+
+    def resize(self, new_w, new_h):
+        """Масштабирование до (new_w, new_h) с ближайшего подходящего уровня"""
+        level = self.level_for(new_w, new_h)
+        h, w = level.shape[:2]
+        if (w, h) == (new_w, new_h):
+            return level.copy()
+
+        interpolation = cv2.INTER_AREA if w >= new_w and h >= new_h else cv2.INTER_LINEAR
+        return cv2.resize(level, (new_w, new_h), interpolation=interpolation)
+
+
+class SpriteCache:
+    """Потокобезопасный LRU-кэш пирамид объектов, ограниченный по объему памяти.
+
+    Если подключен атлас (``atlas.AssetAtlas``), пирамиды берутся из него без
+    копирования и декодирования, а кэш используется только для объектов,
+    которых в атласе нет.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, atlas=None):
+        self.max_bytes = max_bytes
+        self.atlas = atlas
+        self._pyramids = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, object_path):
+        """Пирамида для файла объекта; None, если файл не читается"""
+        if self.atlas is not None:
+            pyramid = self.atlas.get(object_path)
+            if pyramid is not None:
+                return pyramid
+
+        with self._lock:
+            pyramid = self._pyramids.get(object_path)
+            if pyramid is not None:
+                self._pyramids.move_to_end(object_path)
+                return pyramid
+
+        image = load_sprite(object_path)
+        if image is None:
+            return None
+
+        pyramid = SpritePyramid(image)
+        self.put(object_path, pyramid)
+        return pyramid
+
+    def put(self, object_path, pyramid):
+        with self._lock:
+            previous = self._pyramids.pop(object_path, None)
+            if previous is not None:
+                self._total_bytes -= previous.nbytes
+
+            self._pyramids[object_path] = pyramid
+            self._total_bytes += pyramid.nbytes
+
+            while self._total_bytes > self.max_bytes and len(self._pyramids) > 1:
+                _, evicted = self._pyramids.popitem(last=False)
+                self._total_bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._pyramids.clear()
+            self._total_bytes = 0
@@ -0,0 +1,178 @@
+import random
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+
+from dataset_stats import DatasetStatistics
+from shared_frames import CompositingPool, max_frame_bytes
+from worker import default_worker_count
+
+try:
+    from torch.utils.data import IterableDataset
+except ImportError:
+    IterableDataset = object
+
+
+class SyntheticStream:
+    """Бесконечный (или ограниченный num_items) поток пакетов ``(изображения, разметка)``.
+
+    Кадры собираются в пуле процессов в слотах общей памяти и копируются
+    в массив потребителя один раз, без кодирования в JPEG и записи на диск.
+    Число кадров в работе ограничено prefetch: пока потребитель обрабатывает
+    пакет, пул готовит следующие, но не больше prefetch штук.
+
+    Изображения — массивы BGR uint8, разметка кадра — список словарей
+    ``{'category', 'class_id', 'bbox', 'object_path', 'viewing_angle', 'zone'}``.
+    Если stack=True и все кадры пакета одного размера, пакет изображений
+    возвращается одним массивом (N, H, W, 3). Статистика выданных кадров
+    накапливается в ``statistics`` (``dataset_stats.DatasetStatistics``).
+    Если передан frame_filter (``frame_filter.FrameFilter``), пустые кадры
+    и почти-дубликаты не выдаются; для бесконечного потока у фильтра
+    следует задать max_entries.
+    """
+
+    def __init__(self, engine, background_images=None, batch_size=8, num_workers=None, prefetch=None,
+                 procedural=None, scheduler=None, num_items=None, categories=None, stack=False,
+                 frame_filter=None):
+        self.background_images = list(background_images or [])
+        if not self.background_images and procedural is None:
+            raise ValueError("Нужны фоновые изображения или процедурный генератор фонов")
+
+        self.engine = engine
+        self.batch_size = batch_size
+        self.num_workers = num_workers or default_worker_count()
+        self.prefetch = prefetch or 2 * batch_size
+        self.procedural = procedural
+        self.scheduler = scheduler
+        self.num_items = num_items
+        self.categories = list(categories or engine.asset_objects.keys())
+        self.stack = stack
+        self.frame_filter = frame_filter
+        self.statistics = DatasetStatistics(self.categories)
+
+    def _slot_bytes(self):
+        if self.procedural is not None:
+            return self.procedural.width * self.procedural.height * 3
+        return max_frame_bytes(self.background_images)
+
+    def _submit(self, pool, slot):
+        planned_categories = None
+        background_path = None
+        if self.scheduler is not None:
+            background_path, planned_categories = self.scheduler.next_plan()
+        elif self.procedural is None:
+            background_path = random.choice(self.background_images)
+
+        if self.procedural is not None:
+            return pool.synthesize(slot, self.engine.rng.getrandbits(63), planned_categories), planned_categories
+        return pool.compose(slot, background_path, planned_categories), planned_categories
+
+    def _check_failures(self, failures):
+        """Остановка потока после 3 * prefetch неудачных кадров подряд"""
+        if failures >= 3 * self.prefetch:
+            raise RuntimeError(f"Не удалось сгенерировать {failures} изображений подряд")
+
+    def _make_batch(self, images, annotations):
+        if self.stack and len({image.shape for image in images}) == 1:
+            return np.stack(images), annotations
+        return images, annotations
+
+    def __iter__(self):
+        slot_bytes = self._slot_bytes()
+        if slot_bytes == 0:
+            raise RuntimeError("Не удалось прочитать ни одного фона")
+
+        pool = CompositingPool(self.engine, self.num_workers, self.prefetch, slot_bytes, self.procedural)
+        in_flight = {}
+        produced = 0
+        failures = 0  # неудачные кадры подряд
+        images, annotations = [], []
+
+        try:
+            while self.num_items is None or produced < self.num_items:
+                while self.num_items is None or produced + len(in_flight) < self.num_items:
+                    slot = pool.acquire_slot(block=False)
+                    if slot is None:
+                        break
+                    future, planned_categories = self._submit(pool, slot)
+                    in_flight[future] = (slot, planned_categories)
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    slot, planned_categories = in_flight.pop(future)
+                    try:
+                        result, messages = future.result()
+                    except Exception as e:
+                        result, messages = None, [f"Ошибка рабочего процесса: {e}"]
+
+                    for message in messages:
+                        self.engine.log_message(message)
+
+                    if result is None:
+                        pool.release(slot)
+                        if self.scheduler is not None:
+                            self.scheduler.complete(planned_categories, [])
+                        self.statistics.add_failure('generation')
+                        failures += 1
+                        self._check_failures(failures)
+                        continue
+
+                    shape, frame_annotations, placement, frame_hash = result
+                    if self.frame_filter is not None:
+                        rejection = self.frame_filter.check(frame_hash, shape, frame_annotations)
+                        if rejection is not None:
+                            pool.release(slot)
+                            if self.scheduler is not None:
+                                self.scheduler.complete(planned_categories, [])
+                            self.statistics.add_rejection(rejection)
+                            failures += 1
+                            self._check_failures(failures)
+                            continue
+
+                    images.append(pool.frame(slot, shape).copy())
+                    pool.release(slot)
+                    self.statistics.add_image(shape, frame_annotations, placement)
+
+                    for annotation in frame_annotations:
+                        annotation['class_id'] = self.categories.index(annotation['category'])
+                    annotations.append(frame_annotations)
+                    if self.scheduler is not None:
+                        self.scheduler.complete(planned_categories,
+                                                [annotation['category'] for annotation in frame_annotations])
+
+                    produced += 1
+                    failures = 0
+                    if len(images) == self.batch_size:
+                        yield self._make_batch(images, annotations)
+                        images, annotations = [], []
+
+            if images:
+                yield self._make_batch(images, annotations)
+        finally:
+            for future in in_flight:
+                future.cancel()
+            pool.close()
+
+
+class SyntheticIterableDataset(IterableDataset):
+    """Поток синтетических кадров по одному в стиле ``torch.utils.data.IterableDataset``.
+
+    Кадры собирает собственный пул процессов SyntheticStream, поэтому
+    DataLoader следует создавать с num_workers=0 и своей функцией collate
+    (разметка кадров имеет разную длину). Без установленного torch класс
+    остается обычным итерируемым объектом.
+    """
+
+    def __init__(self, engine, background_images=None, transform=None, **stream_options):
+        super().__init__()
+        stream_options.pop('batch_size', None)
+        stream_options.pop('stack', None)
+        self.stream = SyntheticStream(engine, background_images, batch_size=1, **stream_options)
+        self.transform = transform
+
+    def __iter__(self):
+        for images, annotations in self.stream:
+            image, image_annotations = images[0], annotations[0]
+            if self.transform is not None:
+                image, image_annotations = self.transform(image, image_annotations)
+            yield image, image_annotations
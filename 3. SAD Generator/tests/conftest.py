@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули генератора лежат в корне папки и импортируются без пакета
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
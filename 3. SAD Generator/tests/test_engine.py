@@ -0,0 +1,26 @@
+import cv2
+import numpy as np
+
+from engine import cell_mean_hsv
+
+
+def test_cell_mean_hsv_matches_per_cell_mean():
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, size=(50, 75, 3), dtype=np.uint8)
+
+    result = cell_mean_hsv(image, grid_size=5)
+
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV).astype(np.float64)
+    expected = hsv.reshape(5, 10, 5, 15, 3).mean(axis=(1, 3))
+    assert result.shape == (5, 5, 3)
+    np.testing.assert_allclose(result, expected, rtol=1e-5)
+
+
+def test_cell_mean_hsv_handles_image_smaller_than_grid():
+    image = np.zeros((4, 30, 3), dtype=np.uint8)
+    image[:, :, 2] = 200
+
+    result = cell_mean_hsv(image, grid_size=12)
+
+    assert result.shape == (12, 12, 3)
+    np.testing.assert_allclose(result[..., 2], 200)
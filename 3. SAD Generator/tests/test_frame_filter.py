@@ -0,0 +1,51 @@
+import numpy as np
+
+from frame_filter import FrameFilter, PerceptualHashIndex, popcount
+
+
+def _hash(value):
+    # Хэши, далекие друг от друга по Хэммингу: разные байты в каждой половине
+    return (value * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+
+
+def test_popcount_matches_python():
+    values = np.array([0, 1, 0xFF, 0xFFFFFFFFFFFFFFFF, 0x8000000000000001], dtype=np.uint64)
+    assert popcount(values).tolist() == [bin(int(v)).count('1') for v in values]
+
+
+def test_unbounded_index_keeps_entries_after_growth():
+    index = PerceptualHashIndex()
+    total = 3000  # больше начальной емкости (1024), два удвоения
+    for value in range(1, total + 1):
+        index.add(_hash(value), value)
+
+    assert len(index) == total
+    for value in (1, 2, 1024, 1025, 2048, total):
+        assert index.find(_hash(value), value, frame_radius=0, layout_radius=0)
+    # Незаполненные ячейки не считаются записями
+    assert not index.find(0, 0, frame_radius=0, layout_radius=0)
+
+
+def test_bounded_index_evicts_oldest():
+    index = PerceptualHashIndex(max_entries=4)
+    for value in range(1, 7):
+        index.add(_hash(value), value)
+
+    assert len(index) == 4
+    assert not index.find(_hash(1), 1, frame_radius=0, layout_radius=0)
+    assert not index.find(_hash(2), 2, frame_radius=0, layout_radius=0)
+    for value in range(3, 7):
+        assert index.find(_hash(value), value, frame_radius=0, layout_radius=0)
+
+
+def test_frame_filter_rejects_duplicates_and_empty_frames():
+    frame_filter = FrameFilter(min_objects=1, frame_radius=6, layout_radius=1)
+    annotations = [{'bbox': {'x': 10, 'y': 10, 'width': 20, 'height': 20}}]
+
+    assert frame_filter.check(_hash(1), (100, 100), []) == 'low_content'
+    assert frame_filter.check(_hash(1), (100, 100), annotations) is None
+    assert frame_filter.check(_hash(1) ^ 0b11, (100, 100), annotations) == 'duplicate'
+
+    # Тот же фон, но объект в другом углу кадра — не дубликат
+    moved = [{'bbox': {'x': 80, 'y': 80, 'width': 10, 'height': 10}}]
+    assert frame_filter.check(_hash(1), (100, 100), moved) is None
@@ -0,0 +1,78 @@
+import random
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+import streaming
+from streaming import SyntheticStream
+
+
+class FakeEngine:
+    asset_objects = {'car': []}
+
+    def __init__(self):
+        self.rng = random.Random(0)
+        self.messages = []
+
+    def log_message(self, message):
+        self.messages.append(message)
+
+
+class FakePool:
+    """Пул без процессов: compose удается только successes первых раз"""
+
+    successes = 1
+
+    def __init__(self, engine, num_workers, num_slots, slot_bytes, procedural=None):
+        self.free_slots = list(range(num_slots))
+        self.composed = 0
+
+    def acquire_slot(self, block=True, timeout=None):
+        return self.free_slots.pop() if self.free_slots else None
+
+    def release(self, slot):
+        self.free_slots.append(slot)
+
+    def compose(self, slot, background_path, planned_categories=None):
+        future = Future()
+        self.composed += 1
+        if self.composed <= self.successes:
+            future.set_result((((4, 4, 3), [], None, 0), []))
+        else:
+            future.set_exception(OSError("фон не найден"))
+        return future
+
+    def frame(self, slot, shape):
+        return np.zeros(shape, dtype=np.uint8)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    monkeypatch.setattr(streaming, 'CompositingPool', FakePool)
+    monkeypatch.setattr(streaming, 'max_frame_bytes', lambda paths: 4 * 4 * 3)
+
+
+def test_stream_stops_after_consecutive_failures(fake_pool):
+    stream = SyntheticStream(FakeEngine(), ['background.jpg'], batch_size=1, num_workers=1, prefetch=2)
+    batches = iter(stream)
+
+    images, annotations = next(batches)
+    assert len(images) == 1
+    with pytest.raises(RuntimeError):
+        next(batches)
+    assert stream.statistics.images == 1
+
+
+def test_stream_yields_all_items(fake_pool, monkeypatch):
+    monkeypatch.setattr(FakePool, 'successes', 5)
+    stream = SyntheticStream(FakeEngine(), ['background.jpg'], batch_size=2, num_workers=1, prefetch=2,
+                             num_items=5, stack=True)
+
+    batches = list(stream)
+
+    assert [len(images) for images, _ in batches] == [2, 2, 1]
+    assert batches[0][0].shape == (2, 4, 4, 3)
@@ -0,0 +1,282 @@
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from atlas import AssetAtlas
+from dataset_stats import DatasetStatistics
+from scheduler import BalancedScheduler
+from shared_frames import CompositingPool, max_frame_bytes
+
+
+# Условный «путь» процедурного фона для планировщика классов
+PROCEDURAL_BACKGROUND = '<procedural>'
+
+
+class GenerationWorker:
+    """Фоновая генерация датасета с передачей событий в UI через очередь.
+
+    События имеют вид ``(тип, данные)``:
+    ``('log', сообщение)``, ``('progress', (готово, всего, изобр./с))``,
+    ``('done', (успешно, всего, отменено))``.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.events = queue.Queue()
+        self.engine.log_callback = lambda message: self._post('log', message)
+        self._thread = None
+        self._cancel_event = threading.Event()
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+
+    def is_running(self):
+        """Проверка, выполняется ли сейчас фоновая задача"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_paused(self):
+        """Проверка, поставлена ли генерация на паузу"""
+        return not self._resume_event.is_set()
+
+    def pause(self):
+        """Приостановка выдачи новых задач"""
+        self._resume_event.clear()
+
+    def resume(self):
+        """Продолжение после паузы"""
+        self._resume_event.set()
+
+    def cancel(self):
+        """Отмена текущей задачи"""
+        self._cancel_event.set()
+        self._resume_event.set()
+
+    def _start(self, target, *args):
+        self._cancel_event.clear()
+        self._resume_event.set()
+        self._thread = threading.Thread(target=target, args=args, daemon=True)
+        self._thread.start()
+
+    def _post(self, kind, data):
+        self.events.put((kind, data))
+
+    def start_dataset(self, background_images, images_path, labels_path, categories, num_to_generate, num_workers,
+                      scene_index=None, atlas_path=None, procedural=None, report_path=None,
+                      frame_filter=None):
+        """Генерация датасета в пуле процессов с кадрами в общей памяти.
+
+        Если передан scene_index, фоны и категории для каждого изображения
+        назначает BalancedScheduler по весам категорий движка. Если передан
+        atlas_path, объекты упаковываются в атлас, общий для всех процессов.
+        Если передан procedural, фоны синтезируются им вместо background_images.
+        Если передан report_path, туда записывается отчет DatasetStatistics.
+        Если передан frame_filter (``frame_filter.FrameFilter``), пустые кадры
+        и почти-дубликаты отбраковываются до кодирования и генерируются заново.
+        """
+        self._start(self._run_dataset, list(background_images), images_path, labels_path,
+                    categories, num_to_generate, max(1, num_workers), scene_index, atlas_path, procedural,
+                    report_path, frame_filter)
+
+    def _prepare_atlas(self, atlas_path):
+        """Открытие или пересборка атласа объектов перед запуском пула"""
+        self._post('log', "Подготовка атласа объектов...")
+        try:
+            atlas = AssetAtlas.open_or_pack(self.engine.asset_objects, atlas_path)
+        except (OSError, ValueError) as e:
+            self._post('log', f"Не удалось подготовить атлас, объекты будут читаться из файлов: {e}")
+            return
+        self.engine.sprite_cache.atlas = atlas
+        self._post('log', f"Атлас объектов: {len(atlas.sprites)} шт., {os.path.getsize(atlas_path) / 2**20:.1f} МБ")
+
+    def _background_capabilities(self, background_images, scene_index, num_workers):
+        """Индексация фонов: категории, допустимые на каждом из них"""
+        self._post('log', "Индексация фонов...")
+        analyzed = scene_index.build(self.engine, background_images, max_workers=num_workers,
+                                     cancel_event=self._cancel_event)
+        self._post('log', f"Проиндексировано новых фонов: {analyzed}")
+
+        return {path: scene_index.capabilities(self.engine, path) for path in background_images}
+
+    def _create_scheduler(self, capabilities):
+        """Создание планировщика классов по допустимым категориям фонов"""
+        target_weights = {category: self.engine.category_weights.get(category, 1.0)
+                          for category, objects in self.engine.asset_objects.items() if objects}
+
+        scheduler = BalancedScheduler(target_weights, capabilities, self.engine.max_objects)
+        if scheduler.unreachable:
+            self._post('log', f"Нет подходящих фонов для категорий: {', '.join(scheduler.unreachable)}")
+        if scheduler.is_empty():
+            self._post('log', "Планировщик не нашел допустимых сочетаний фонов и категорий")
+            return None
+        return scheduler
+
+    def _run_dataset(self, background_images, images_path, labels_path, categories, num_to_generate, num_workers,
+                     scene_index, atlas_path, procedural, report_path, frame_filter):
+        successful_generations = 0
+        try:
+            if atlas_path is not None:
+                self._prepare_atlas(atlas_path)
+
+            scheduler = None
+            if scene_index is not None:
+                if procedural is not None:
+                    capabilities = {PROCEDURAL_BACKGROUND: self.engine.placeable_categories(procedural.zone_capacity())}
+                else:
+                    capabilities = self._background_capabilities(background_images, scene_index, num_workers)
+                scheduler = self._create_scheduler(capabilities)
+                if scheduler is None or self._cancel_event.is_set():
+                    return
+
+            if procedural is not None:
+                slot_bytes = procedural.width * procedural.height * 3
+            else:
+                slot_bytes = max_frame_bytes(background_images)
+            if slot_bytes == 0:
+                self._post('log', "Не удалось прочитать ни одного фона")
+                return
+
+            statistics = DatasetStatistics(categories)
+            attempts = 0
+            max_attempts = num_to_generate * 3
+            next_index = 0
+            retry_indices = []
+            num_slots = num_workers * 2
+            start_time = time.monotonic()
+            paused_time = 0.0
+
+            self._post('log', f"Общая память кадров: {num_slots} x {slot_bytes / 2**20:.1f} МБ")
+
+            with CompositingPool(self.engine, num_workers, num_slots, slot_bytes, procedural) as pool:
+                # future -> (этап, номер изображения, слот, план, данные этапа)
+                in_flight = {}
+
+                while successful_generations < num_to_generate:
+                    if self._cancel_event.is_set():
+                        break
+
+                    if not self._resume_event.is_set():
+                        pause_start = time.monotonic()
+                        self._resume_event.wait()
+                        paused_time += time.monotonic() - pause_start
+                        continue
+
+                    while (attempts < max_attempts
+                           and successful_generations + len(in_flight) < num_to_generate):
+                        slot = pool.acquire_slot(block=False)
+                        if slot is None:
+                            break
+                        if retry_indices:
+                            index = retry_indices.pop()
+                        else:
+                            index = next_index
+                            next_index += 1
+                        planned_categories = None
+                        if scheduler is not None:
+                            background_path, planned_categories = scheduler.next_plan()
+                        elif procedural is None:
+                            background_path = random.choice(background_images)
+
+                        if procedural is not None:
+                            future = pool.synthesize(slot, self.engine.rng.getrandbits(63), planned_categories)
+                        else:
+                            future = pool.compose(slot, background_path, planned_categories)
+                        in_flight[future] = ('compose', index, slot, planned_categories, None)
+                        attempts += 1
+
+                    if not in_flight:
+                        break
+
+                    done, _ = wait(in_flight, timeout=0.2, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, index, slot, planned_categories, stage_data = in_flight.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            self._post('log', f"Ошибка рабочего процесса: {e}")
+                            result = None
+
+                        if stage == 'compose':
+                            if result is not None:
+                                result, messages = result
+                                for message in messages:
+                                    self._post('log', message)
+
+                            if result is None:
+                                pool.release(slot)
+                                if scheduler is not None:
+                                    scheduler.complete(planned_categories, [])
+                                statistics.add_failure('generation')
+                                retry_indices.append(index)
+                                continue
+
+                            shape, annotations, placement, frame_hash = result
+                            rejection = None
+                            if frame_filter is not None:
+                                rejection = frame_filter.check(frame_hash, shape, annotations)
+                            if rejection is not None:
+                                pool.release(slot)
+                                if scheduler is not None:
+                                    scheduler.complete(planned_categories, [])
+                                statistics.add_rejection(rejection)
+                                retry_indices.append(index)
+                                continue
+
+                            image_path = images_path / f"synthetic_{index:04d}.jpg"
+                            encode_future = pool.encode(slot, shape, image_path)
+                            in_flight[encode_future] = ('encode', index, slot, planned_categories, result)
+                            continue
+
+                        pool.release(slot)
+                        shape, annotations, placement, _ = stage_data
+                        placed_categories = [ann['category'] for ann in annotations] if result else []
+                        if scheduler is not None:
+                            scheduler.complete(planned_categories, placed_categories)
+
+                        if not result:
+                            self._post('log', f"Не удалось записать изображение synthetic_{index:04d}.jpg")
+                            statistics.add_failure('write')
+                            retry_indices.append(index)
+                            continue
+
+                        label_path = labels_path / f"synthetic_{index:04d}.txt"
+                        if annotations:
+                            self.engine.save_yolo_annotation(label_path, annotations, shape, categories)
+                        else:
+                            label_path.touch()
+
+                        image_filename = f"synthetic_{index:04d}.jpg"
+                        statistics.add_image(shape, annotations, placement)
+                        successful_generations += 1
+                        if placed_categories:
+                            self._post('log', f"Сгенерировано: {image_filename} с {len(placed_categories)} объектами")
+                        else:
+                            self._post('log', f"Сгенерировано: {image_filename} (чистый фон)")
+
+                        elapsed = time.monotonic() - start_time - paused_time
+                        rate = successful_generations / elapsed if elapsed > 0 else 0.0
+                        self._post('progress', (successful_generations, num_to_generate, rate))
+
+                for future in in_flight:
+                    future.cancel()
+
+            if scheduler is not None:
+                self._post('log', f"Распределение классов: {scheduler.summary()}")
+            self._post('log', statistics.summary())
+            if report_path is not None:
+                try:
+                    statistics.save(report_path)
+                    self._post('log', f"Отчет о датасете: {report_path}")
+                except OSError as e:
+                    self._post('log', f"Не удалось записать отчет о датасете: {e}")
+        except Exception as e:
+            # Ошибка пула, общей памяти или индексации фонов: UI все равно получает done
+            self._post('log', f"Ошибка генерации датасета: {e}")
+        finally:
+            self._post('done', (successful_generations, num_to_generate, self._cancel_event.is_set()))
+
+
+def default_worker_count():
+    """Количество рабочих процессов по умолчанию"""
+    return max(1, (os.cpu_count() or 2) - 1)